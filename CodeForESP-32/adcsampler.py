@@ -0,0 +1,98 @@
+import time
+from array import array
+
+class OversampledADC:
+    """
+    Liest einen oder mehrere ADC-Kanäle mehrfach und filtert das Rauschen.
+
+    Pro Kanal und Messung werden bis zu samples Werte in einen vorab
+    angelegten array('H') Puffer gelesen, dort sortiert und daraus Median
+    bzw. getrimmter Mittelwert berechnet. Eine Messung legt keine neuen
+    Objekte an. Die Dauer wird mit ticks_us gemessen (last_us, max_us)
+    und ist durch samples und budget_us pro Kanal begrenzt.
+    """
+    def __init__(self, adcs, samples=15, trim_percent=20, mode='median', budget_us=0):
+        """
+        adcs: Liste von konfigurierten machine.ADC Objekten (ein Eintrag pro Beet)
+        samples: Anzahl Messungen pro Kanal
+        trim_percent: Anteil in %, der beim getrimmten Mittelwert an jedem Ende verworfen wird
+        mode: 'median' oder 'trimmed'
+        budget_us: Maximale Abtastdauer pro Kanal (0 = unbegrenzt)
+        """
+        self.adcs = adcs
+        self.buf = array('H', [0] * samples)
+        self.values = array('H', [0] * len(adcs))
+        self.trim = samples * trim_percent // 100
+        self.trimmed = mode == 'trimmed'
+        self.budget_us = budget_us
+        self.last_us = 0
+        self.max_us = 0
+
+    def _sample(self, adc):
+        # Liest bis zu len(buf) Werte, Returns: Anzahl gelesener Werte
+        buf = self.buf
+        budget = self.budget_us
+        start = time.ticks_us()
+        n = 0
+        for i in range(len(buf)):
+            buf[i] = adc.read()
+            n += 1
+            if budget and time.ticks_diff(time.ticks_us(), start) >= budget:
+                break
+        return n
+
+    def _sort(self, n):
+        # Insertion Sort in place, für die kleinen Puffer schneller als
+        # ein allgemeines Verfahren und ohne Hilfsspeicher
+        buf = self.buf
+        for i in range(1, n):
+            v = buf[i]
+            j = i - 1
+            while j >= 0 and buf[j] > v:
+                buf[j + 1] = buf[j]
+                j -= 1
+            buf[j + 1] = v
+
+    def median(self, n):
+        """
+        Returns: Median der ersten n (sortierten) Werte im Puffer
+        """
+        buf = self.buf
+        h = n >> 1
+        if n & 1:
+            return buf[h]
+        return (buf[h - 1] + buf[h] + 1) >> 1
+
+    def trimmed_mean(self, n):
+        """
+        Returns: Mittelwert der ersten n (sortierten) Werte ohne die
+        trim kleinsten und größten
+        """
+        buf = self.buf
+        k = min(self.trim, (n - 1) >> 1)
+        total = 0
+        for i in range(k, n - k):
+            total += buf[i]
+        m = n - 2 * k
+        return (total + (m >> 1)) // m
+
+    def read(self):
+        """
+        Misst alle Kanäle
+        Returns: gefilterter Wert von Kanal 0 (weitere Kanäle über value())
+        """
+        start = time.ticks_us()
+        for ch in range(len(self.adcs)):
+            n = self._sample(self.adcs[ch])
+            self._sort(n)
+            self.values[ch] = self.trimmed_mean(n) if self.trimmed else self.median(n)
+        self.last_us = time.ticks_diff(time.ticks_us(), start)
+        if self.last_us > self.max_us:
+            self.max_us = self.last_us
+        return self.values[0]
+
+    def value(self, channel):
+        """
+        Returns: zuletzt gemessener, gefilterter Wert eines Kanals
+        """
+        return self.values[channel]
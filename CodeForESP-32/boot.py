@@ -17,15 +17,28 @@ import ubinascii
 
 # Hardware Control Imports
 from machine import Pin, PWM
+try:
+    import esp32
+except ImportError:
+    esp32 = None
 
 from umqttsimple import MQTTClient
+from fastboot import NetCache, timeline
+import clock
+import log
 
 from mysettings import (
     # MQTT Konfiguration
     MQTT_SERVER,
     MQTT_KEEPALIVE,
+    MQTT_PING_TIMEOUT,
     MQTT_QOS_LEVEL,
     MQTT_RETAIN_MESSAGES,
+    MQTT_INFLIGHT_WINDOW,
+    MQTT_RETRY_TIMEOUT,
+    MQTT_WINDOW_TIMEOUT,
+    MQTT_CLEAN_SESSION,
+    MQTT_PORT,
     
     # Topics
     NOTIFICATION_TOPIC,
@@ -43,9 +56,17 @@ from mysettings import (
     
     # System Einstellungen
     WLAN_TIMEOUT,
+    WLAN_POLL_MS,
+    FAST_BOOT,
+    FASTBOOT_WLAN_TIMEOUT,
+    FASTBOOT_CACHE_FILE,
+    DNS_CACHE_TTL,
     RECONNECT_DELAY,
-    DEBUG_MODE,
+    RECONNECT_MIN_BACKOFF_MS,
+    RECONNECT_MAX_BACKOFF_MS,
+    RECONNECT_ATTEMPTS,
     AUTO_RESTART_ON_ERROR,
+    ASYNC_MODE,
     
     # Nachrichten
     MSG_DEVICE_ONLINE,
@@ -57,25 +78,28 @@ from mysettings import (
 
 from mysecrets import my_SSID as ssid, my_PW as password
 
+timeline.mark(b'imports')
+
 # =====================================================
 # SYSTEM INITIALISIERUNG
 # =====================================================
 
 esp.osdebug(None)
 
+# Puffer für Fehlermeldungen aus Interrupts (Timer in timersampler.py)
+micropython.alloc_emergency_exception_buf(100)
+
 gc.collect()
-print('=== SYSTEM START ===')
-if DEBUG_MODE:
-    print('Debug-Modus: AKTIVIERT')
-    print('Freier Speicher:', gc.mem_free(), 'Bytes')
+log.info('=== SYSTEM START ===')
+log.debug('Debug-Modus: AKTIVIERT')
+log.debug('Freier Speicher: {} Bytes', gc.mem_free())
 
 # =====================================================
 # MQTT CLIENT SETUP
 # =====================================================
 
 myclient_id = ubinascii.hexlify(machine.unique_id())
-if DEBUG_MODE:
-    print('MQTT Client ID:', myclient_id)
+log.debug('MQTT Client ID: {}', myclient_id)
 
 last_message = 0
 
@@ -83,37 +107,116 @@ last_message = 0
 # WLAN VERBINDUNGS-FUNKTIONEN
 # =====================================================
 
+# Kanal/BSSID des Access Points und Broker-Adresse aus dem letzten Start
+net_cache = NetCache(FASTBOOT_CACHE_FILE) if FAST_BOOT else None
+
+def wait_connected(wlan, timeout_ms):
+    """
+    Wartet in Schritten von WLAN_POLL_MS auf die WLAN-Verbindung
+    Returns: True wenn verbunden
+    """
+    start = time.ticks_ms()
+    last_dot = start
+    while not wlan.isconnected():
+        now = time.ticks_ms()
+        if time.ticks_diff(now, start) >= timeout_ms:
+            return False
+        if time.ticks_diff(now, last_dot) >= 1000:
+            log.debug('Warte auf WLAN: {} ms', time.ticks_diff(now, start))
+            last_dot = now
+        time.sleep_ms(WLAN_POLL_MS)
+    return True
+
+def best_access_point(wlan):
+    """
+    Sucht den Access Point mit unserer SSID und dem stärksten Signal
+    Returns: (bssid, channel) oder None
+    """
+    best = None
+    # scan(): (ssid, bssid, channel, RSSI, security, hidden)
+    for ap in wlan.scan():
+        if ap[0] == ssid.encode() and (best is None or ap[3] > best[3]):
+            best = ap
+    return None if best is None else (best[1], best[2])
+
+def connect_access_point(wlan, ap, timeout_ms):
+    """
+    Verbindet mit einem bestimmten Access Point (ohne Suche über alle
+    Kanäle) oder, mit ap = None, mit irgendeinem Access Point der SSID
+    Returns: True wenn verbunden
+    """
+    if ap is None:
+        wlan.connect(ssid, password)
+    else:
+        bssid, channel = ap
+        try:
+            wlan.config(channel=channel)
+        except (ValueError, OSError):
+            # Nicht jede Firmware erlaubt den Kanal im Station-Modus
+            pass
+        wlan.connect(ssid, password, bssid=bssid)
+    return wait_connected(wlan, timeout_ms)
+
 def do_connect():
     """
-    Stellt WLAN-Verbindung her
+    Stellt WLAN-Verbindung her. Mit FAST_BOOT wird zuerst der Access
+    Point aus dem letzten Start direkt angesprochen, erst wenn das nicht
+    klappt, wird gesucht und der Cache erneuert.
     Returns: WLAN-Objekt bei erfolgreicher Verbindung, None bei Fehler
     """
-    if DEBUG_MODE:
-        print('\n=== WLAN VERBINDUNG ===')
+    log.debug('=== WLAN VERBINDUNG ===')
     
     wlan = network.WLAN(network.STA_IF)
     wlan.active(True)
     
     if not wlan.isconnected():
-        print('Verbinde mit Netzwerk:', ssid)
-        wlan.connect(ssid, password)
+        log.info('Verbinde mit Netzwerk: {}', ssid)
+        connected = False
         
-        timeout = 0
-        while not wlan.isconnected() and timeout < WLAN_TIMEOUT:
-            if DEBUG_MODE:
-                print('.', end='')
-            time.sleep(1)
-            timeout += 1
+        if FAST_BOOT:
+            ap = net_cache.ap(ssid)
+            if ap is not None:
+                connected = connect_access_point(wlan, ap, FASTBOOT_WLAN_TIMEOUT * 1000)
+                if not connected:
+                    # Access Point gewechselt oder nicht erreichbar
+                    log.info('Gespeicherter Access Point nicht erreichbar, suche neu')
+                    net_cache.forget_ap()
+                    wlan.disconnect()
+            if not connected:
+                ap = best_access_point(wlan)
+                connected = connect_access_point(wlan, ap, WLAN_TIMEOUT * 1000)
+                if connected and ap is not None:
+                    net_cache.set_ap(ssid, *ap)
+        else:
+            connected = connect_access_point(wlan, None, WLAN_TIMEOUT * 1000)
         
-        if not wlan.isconnected():
-            print('\nFEHLER: WLAN Verbindung nach {}s fehlgeschlagen!'.format(WLAN_TIMEOUT))
+        if not connected:
+            log.error('FEHLER: WLAN Verbindung nach {}s fehlgeschlagen!', WLAN_TIMEOUT)
             return None
     
-    print('\nWLAN erfolgreich verbunden!')
-    if DEBUG_MODE:
-        print('Netzwerk Konfiguration:', wlan.ifconfig())
+    timeline.mark(b'wlan')
+    log.info('WLAN erfolgreich verbunden!')
+    log.debug('Netzwerk Konfiguration: {}', wlan.ifconfig())
+    
+    # RTC für die Zeitstempel stellen (clock.py), ohne NTP bleiben sie
+    # als ungültig markiert
+    if clock.sync():
+        timeline.mark(b'ntp')
     return wlan
 
+def broker_address():
+    """
+    Returns: Adresse des MQTT-Brokers, mit FAST_BOOT die zwischengespeicherte
+    IP-Adresse von MQTT_SERVER (neu aufgelöst nach DNS_CACHE_TTL Sekunden)
+    """
+    if not FAST_BOOT:
+        return MQTT_SERVER
+    try:
+        return net_cache.resolve(MQTT_SERVER, MQTT_PORT, DNS_CACHE_TTL)
+    except OSError as e:
+        log.error('FEHLER bei der Namensauflösung: {}', e)
+        return MQTT_SERVER
+
 # =====================================================
 # HARDWARE CONTROL FUNKTIONEN
 # =====================================================
@@ -123,8 +226,7 @@ def init_hardware():
     Initialisiert alle Hardware-Pins für Aktoren
     Returns: Dictionary mit Hardware-Objekten
     """
-    if DEBUG_MODE:
-        print('\n=== HARDWARE INITIALISIERUNG ===')
+    log.debug('=== HARDWARE INITIALISIERUNG ===')
     
     hardware = {
         'luefter_relais': Pin(LUEFTER_RELAIS_PIN, Pin.OUT),
@@ -137,14 +239,29 @@ def init_hardware():
     hardware['pumpe_relais'].off()
     hardware['luefter_pwm'].duty(LUEFTER_PWM_DUTY_OFF)
     
-    if DEBUG_MODE:
-        print('Hardware initialisiert:')
-        print('- Lüfter Relais Pin:', LUEFTER_RELAIS_PIN)
-        print('- Lüfter PWM Pin:', LUEFTER_PWM_PIN)
-        print('- Pumpe Relais Pin:', PUMPE_RELAIS_PIN)
+    log.debug('Hardware initialisiert:')
+    log.debug('- Lüfter Relais Pin: {}', LUEFTER_RELAIS_PIN)
+    log.debug('- Lüfter PWM Pin: {}', LUEFTER_PWM_PIN)
+    log.debug('- Pumpe Relais Pin: {}', PUMPE_RELAIS_PIN)
     
     return hardware
 
+def hold_relays(hold):
+    """
+    Hält die Relais-Ausgänge auf ihrem Pegel, damit Lüfter und Pumpe den
+    Tiefschlaf (POWER_MODE 'deep') im aktuellen Zustand überdauern. Das
+    PWM-Signal des Lüfters ruht im Tiefschlaf.
+    Args:
+        hold: True vor dem Tiefschlaf, False nach dem Wiederherstellen
+        des Zustands (vorher wirken Schaltbefehle nicht auf die Pins)
+    """
+    for name in ('luefter_relais', 'pumpe_relais'):
+        hardware_devices[name].init(hold=hold)
+    # Pins außerhalb der RTC-Domäne (z.B. GPIO 23) brauchen zusätzlich
+    # den globalen Schalter
+    if esp32 is not None and hasattr(esp32, 'gpio_deep_sleep_hold'):
+        esp32.gpio_deep_sleep_hold(hold)
+
 def control_luefter(command, hardware):
     """
     Steuert den Lüfter basierend auf Befehl
@@ -156,17 +273,17 @@ def control_luefter(command, hardware):
     luefter_pwm = hardware['luefter_pwm']
     
     if command == CMD_ON:
-        print('>>> LÜFTER EINSCHALTEN')
+        log.info('>>> LÜFTER EINSCHALTEN')
         luefter_relais.on()
         luefter_pwm.duty(LUEFTER_PWM_DUTY_ON)
         
     elif command == CMD_OFF:
-        print('>>> LÜFTER AUSSCHALTEN')
+        log.info('>>> LÜFTER AUSSCHALTEN')
         luefter_pwm.duty(LUEFTER_PWM_DUTY_OFF)
         luefter_relais.off()
         
     else:
-        print('Unbekannter Lüfter-Befehl:', command)
+        log.warning('Unbekannter Lüfter-Befehl: {}', command)
 
 def control_pumpe(command, hardware):
     """
@@ -178,15 +295,15 @@ def control_pumpe(command, hardware):
     pumpe_relais = hardware['pumpe_relais']
     
     if command == CMD_ON:
-        print('>>> PUMPE EINSCHALTEN')
+        log.info('>>> PUMPE EINSCHALTEN')
         pumpe_relais.on()
         
     elif command == CMD_OFF:
-        print('>>> PUMPE AUSSCHALTEN')
+        log.info('>>> PUMPE AUSSCHALTEN')
         pumpe_relais.off()
         
     else:
-        print('Unbekannter Pumpen-Befehl:', command)
+        log.warning('Unbekannter Pumpen-Befehl: {}', command)
 
 # =====================================================
 # MQTT CALLBACK FUNKTIONEN
@@ -194,123 +311,299 @@ def control_pumpe(command, hardware):
 
 hardware_devices = None
 
-def sub_cb(topic, msg):
+# Aktor-Regelung aus main.py (controller.EdgeController), None = Befehle
+# direkt ausführen
+controller = None
+
+def on_notification(topic, msg):
     """
-    Callback-Funktion für eingehende MQTT-Nachrichten
-    
-    Args:
-        topic: MQTT Topic der Nachricht
-        msg: Nachrichteninhalt
+    Handler für NOTIFICATION_TOPIC
     """
-    global hardware_devices
-    
-    if DEBUG_MODE:
-        print('MQTT Nachricht empfangen:', topic, msg)
+    log.debug('MQTT Nachricht empfangen: {} {}', topic, msg)
     
+    if msg == CMD_RECEIVED:
+        log.info('Bestätigung: ESP hat Nachricht empfangen')
+
+def on_pumpe(topic, msg):
+    """
+    Handler für PUMPE_TOPIC
+    """
+    log.debug('MQTT Nachricht empfangen: {} {}', topic, msg)
     
-    if topic == NOTIFICATION_TOPIC and msg == CMD_RECEIVED:
-        print('Bestätigung: ESP hat Nachricht empfangen')
-    
-   
-    elif topic == PUMPE_TOPIC:
+    if controller is not None:
+        controller.command(topic, msg)
+    else:
         control_pumpe(msg, hardware_devices)
+
+def on_luefter(topic, msg):
+    """
+    Handler für LUEFTER_TOPIC
+    """
+    log.debug('MQTT Nachricht empfangen: {} {}', topic, msg)
     
-  
-    elif topic == LUEFTER_TOPIC:
+    if controller is not None:
+        controller.command(topic, msg)
+    else:
         control_luefter(msg, hardware_devices)
+
+def sub_cb(topic, msg):
+    """
+    Callback für eingehende MQTT-Nachrichten ohne passende Route
     
-    else:
-        if DEBUG_MODE:
-            print('Unbekanntes Topic:', topic)
+    Args:
+        topic: MQTT Topic der Nachricht
+        msg: Nachrichteninhalt
+    """
+    log.debug('Unbekanntes Topic: {} {}', topic, msg)
+
+# Topic-Filter und zugehörige Handler. Der Client leitet Nachrichten
+# über ein Dictionary (exakte Topics) bzw. einen Trie (+/# Filter) weiter,
+# neue Aktoren brauchen nur einen weiteren Eintrag.
+TOPIC_HANDLERS = (
+    (NOTIFICATION_TOPIC, on_notification),
+    (PUMPE_TOPIC, on_pumpe),
+    (LUEFTER_TOPIC, on_luefter),
+)
 
 # =====================================================
 # MQTT VERBINDUNGS-FUNKTIONEN
 # =====================================================
 
+def publish_online(client):
+    """
+    Meldet das Gerät auf STATUS_TOPIC als online (überschreibt den Last Will)
+    Returns: beim asyncio Client (umqttasync) ein Awaitable
+    """
+    return client.publish(
+        STATUS_TOPIC,
+        str(myclient_id) + MSG_DEVICE_ONLINE,
+        retain=MQTT_RETAIN_MESSAGES,
+        qos=MQTT_QOS_LEVEL
+    )
+
+def create_client(client_class=MQTTClient):
+    """
+    Erzeugt und konfiguriert den MQTT Client (Last Will, Callback)
+    Args:
+        client_class: umqttsimple.MQTTClient oder umqttasync.MQTTClient
+    Returns: MQTT Client Objekt (noch nicht verbunden)
+    """
+    server = broker_address()
+    timeline.mark(b'dns')
+    client = client_class(
+        client_id=myclient_id,
+        server=server,
+        keepalive=MQTT_KEEPALIVE,
+        max_inflight=MQTT_INFLIGHT_WINDOW,
+        retry_ms=MQTT_RETRY_TIMEOUT * 1000,
+        ping_timeout_ms=MQTT_PING_TIMEOUT * 1000,
+        window_timeout_ms=MQTT_WINDOW_TIMEOUT * 1000
+    )
+    
+    client.set_last_will(
+        STATUS_TOPIC,
+        str(myclient_id) + MSG_DEVICE_OFFLINE,
+        retain=MQTT_RETAIN_MESSAGES,
+        qos=MQTT_QOS_LEVEL
+    )
+    
+    client.set_callback(sub_cb)
+    return client
+
+def report_subscriptions(codes):
+    """
+    Gibt das Ergebnis von subscribe_many pro Topic aus
+    Args:
+        codes: SUBACK Rückgabecodes in der Reihenfolge von TOPIC_HANDLERS
+    """
+    for (topic, handler), code in zip(TOPIC_HANDLERS, codes):
+        if code == 0x80:
+            log.error('FEHLER: Topic nicht abonniert: {}', topic)
+        else:
+            log.debug('Topic abonniert: {}', topic)
+
 def connect_and_subscribe():
     """
     Verbindet mit MQTT-Broker und abonniert Topics
     Returns: MQTT Client Objekt
     """
-    if DEBUG_MODE:
-        print('\n=== MQTT VERBINDUNG ===')
+    log.debug('=== MQTT VERBINDUNG ===')
     
     try:
-        client = MQTTClient(
-            client_id=myclient_id,
-            server=MQTT_SERVER,
-            keepalive=MQTT_KEEPALIVE
-        )
-        
-        client.set_last_will(
-            STATUS_TOPIC,
-            str(myclient_id) + MSG_DEVICE_OFFLINE,
-            retain=MQTT_RETAIN_MESSAGES,
-            qos=MQTT_QOS_LEVEL
-        )
-        
-        client.set_callback(sub_cb)
+        client = create_client()
         
-        client.connect()
-        print('Mit MQTT Broker verbunden:', MQTT_SERVER)
+        session_present = client.connect(clean_session=MQTT_CLEAN_SESSION)
+        timeline.mark(b'mqtt')
+        log.info('Mit MQTT Broker verbunden: {}', MQTT_SERVER)
+        log.debug('Session vom Broker übernommen: {}', bool(session_present))
         
 
-        topics_to_subscribe = [NOTIFICATION_TOPIC, PUMPE_TOPIC, LUEFTER_TOPIC]
-        for topic in topics_to_subscribe:
-            client.subscribe(topic)
-            if DEBUG_MODE:
-                print('Topic abonniert:', topic)
+        topics = [(topic, 0, handler) for topic, handler in TOPIC_HANDLERS]
+        if session_present:
+            # Der Broker hat die Abos aus der letzten Sitzung behalten
+            # (z.B. nach dem Tiefschlaf), nur die Handler eintragen
+            client.resume(topics)
+        else:
+            # Alle Topics mit einem SUBSCRIBE-Paket abonnieren (ein Broker-Roundtrip)
+            report_subscriptions(client.subscribe_many(topics))
         
-        client.publish(
-            STATUS_TOPIC,
-            str(myclient_id) + MSG_DEVICE_ONLINE,
-            retain=MQTT_RETAIN_MESSAGES,
-            qos=MQTT_QOS_LEVEL
-        )
+        publish_online(client)
         
-        print('MQTT Setup erfolgreich abgeschlossen')
-        if DEBUG_MODE:
-            print('Client-ID:', myclient_id)
+        log.info('MQTT Setup erfolgreich abgeschlossen')
+        log.debug('Client-ID: {}', myclient_id)
         return client
         
     except Exception as e:
-        print('FEHLER bei MQTT Verbindung:', e)
+        log.error('FEHLER bei MQTT Verbindung: {}', e)
         raise
 
 def restart_and_reconnect():
     """
-    Behandelt Verbindungsabbrüche mit konfigurierbarer Wartezeit
+    Behandelt Verbindungsabbrüche: zuerst schnelle Neuverbindung im
+    laufenden Betrieb mit exponentiellem Backoff, erst danach Wartezeit
+    und optionaler Neustart
+    Returns: True wenn die MQTT-Verbindung wiederhergestellt wurde
     """
-    print('FEHLER: MQTT Verbindung verloren. Neuverbindung in {}s...'.format(RECONNECT_DELAY))
+    global client
+    log.error('FEHLER: MQTT Verbindung verloren. Schnelle Neuverbindung...')
+    
+    try:
+        if do_connect() is None:
+            raise OSError('WLAN nicht verbunden')
+        
+        start = time.ticks_ms()
+        if client is None:
+            client = connect_and_subscribe()
+        else:
+            session_present = client.reconnect(
+                attempts=RECONNECT_ATTEMPTS,
+                min_ms=RECONNECT_MIN_BACKOFF_MS,
+                max_ms=RECONNECT_MAX_BACKOFF_MS
+            )
+            publish_online(client)
+            log.debug('Session vom Broker übernommen: {}', bool(session_present))
+        
+        log.info('MQTT Verbindung wiederhergestellt nach {} ms',
+                 time.ticks_diff(time.ticks_ms(), start))
+        return True
+        
+    except Exception as e:
+        log.error('FEHLER: Schnelle Neuverbindung fehlgeschlagen: {}', e)
+    
+    log.info('Nächster Versuch in {}s...', RECONNECT_DELAY)
     time.sleep(RECONNECT_DELAY)
     
     if AUTO_RESTART_ON_ERROR:
-        print('Automatischer Neustart aktiviert...')
+        log.info('Automatischer Neustart aktiviert...')
         machine.reset()
+    return False
+
+async def connect_and_subscribe_async():
+    """
+    Wie connect_and_subscribe, aber mit dem asyncio MQTT Client (umqttasync).
+    Ist der Broker beim Start nicht erreichbar, wird wie in
+    reconnect_async mit Backoff weiter versucht.
+    Returns: umqttasync.MQTTClient Objekt
+    """
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    from umqttasync import MQTTClient as AsyncMQTTClient
+    
+    log.debug('=== MQTT VERBINDUNG (ASYNCIO) ===')
+    
+    client = create_client(AsyncMQTTClient)
+    client.clean_session = MQTT_CLEAN_SESSION
+    topics = [(topic, 0, handler) for topic, handler in TOPIC_HANDLERS]
+    while True:
+        try:
+            if do_connect() is None:
+                raise OSError('WLAN nicht verbunden')
+            
+            session_present = await client.reconnect(
+                attempts=RECONNECT_ATTEMPTS,
+                min_ms=RECONNECT_MIN_BACKOFF_MS,
+                max_ms=RECONNECT_MAX_BACKOFF_MS
+            )
+            timeline.mark(b'mqtt')
+            log.info('Mit MQTT Broker verbunden: {}', MQTT_SERVER)
+            log.debug('Session vom Broker übernommen: {}', bool(session_present))
+            
+            if session_present:
+                # Der Broker hat die Abos aus der letzten Sitzung behalten
+                client.resume(topics)
+            else:
+                report_subscriptions(await client.subscribe_many(topics))
+            await publish_online(client)
+            
+            log.info('MQTT Setup erfolgreich abgeschlossen')
+            return client
+            
+        except Exception as e:
+            log.error('FEHLER bei MQTT Verbindung: {}', e)
+        
+        log.info('Nächster Versuch in {}s...', RECONNECT_DELAY)
+        await asyncio.sleep(RECONNECT_DELAY)
+
+async def reconnect_async(client):
+    """
+    Schnelle Neuverbindung für den asyncio MQTT Client
+    """
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    
+    while True:
+        try:
+            if do_connect() is None:
+                raise OSError('WLAN nicht verbunden')
+            
+            start = time.ticks_ms()
+            session_present = await client.reconnect(
+                attempts=RECONNECT_ATTEMPTS,
+                min_ms=RECONNECT_MIN_BACKOFF_MS,
+                max_ms=RECONNECT_MAX_BACKOFF_MS
+            )
+            await publish_online(client)
+            log.info('MQTT Verbindung wiederhergestellt nach {} ms',
+                 time.ticks_diff(time.ticks_ms(), start))
+            log.debug('Session vom Broker übernommen: {}', bool(session_present))
+            return
+            
+        except Exception as e:
+            log.error('FEHLER: Schnelle Neuverbindung fehlgeschlagen: {}', e)
+        
+        log.info('Nächster Versuch in {}s...', RECONNECT_DELAY)
+        await asyncio.sleep(RECONNECT_DELAY)
 
 # ==================================
 #           HAUPTPROGRAMM 
 # ==================================
 
-print('\n=== INITIALISIERUNG STARTEN ===')
+log.info('=== INITIALISIERUNG STARTEN ===')
 
 hardware_devices = init_hardware()
+timeline.mark(b'hardware')
 
 # WLAN-Verbindung herstellen
 wlan = do_connect()
 if wlan is None:
-    print('KRITISCHER FEHLER: Keine WLAN-Verbindung möglich')
+    log.error('KRITISCHER FEHLER: Keine WLAN-Verbindung möglich')
     if AUTO_RESTART_ON_ERROR:
         machine.reset()
 
 # MQTT-Verbindung herstellen
-try:
-    client = connect_and_subscribe()
-    print('\n=== SYSTEM BEREIT ===')
-    if DEBUG_MODE:
-        print('Freier Speicher:', gc.mem_free(), 'Bytes')
-        print('Konfiguration geladen aus mysettings.py')
-    
-except OSError as e:
-    print('KRITISCHER FEHLER bei MQTT Setup:', e)
-    restart_and_reconnect()
\ No newline at end of file
+# (im ASYNC_MODE verbindet main.main_async den asyncio Client selbst)
+client = None
+if not ASYNC_MODE:
+    try:
+        client = connect_and_subscribe()
+        log.info('=== SYSTEM BEREIT ===')
+        log.debug('Freier Speicher: {} Bytes', gc.mem_free())
+        log.debug('Konfiguration geladen aus mysettings.py')
+        
+    except OSError as e:
+        log.error('KRITISCHER FEHLER bei MQTT Setup: {}', e)
+        restart_and_reconnect()
\ No newline at end of file
@@ -0,0 +1,61 @@
+import time
+try:
+    import ntptime
+except ImportError:
+    ntptime = None
+
+import log
+from mysettings import NTP_SERVER
+
+# Uhrzeit für Zeitstempel in Binär-Frames und im Offline-Puffer.
+#
+# Ohne NTP beginnt die RTC des ESP-32 beim Einschalten bei 2000-01-01,
+# time.time() zählt dann nur die Sekunden seit dem Einschalten. Werte
+# vor VALID_AFTER (2024-01-01) gelten deshalb als nicht gestellt. Die RTC
+# läuft im Tiefschlaf und bei einem Soft-Reset weiter, eine einmal
+# gestellte Uhr bleibt bis zum Ausschalten gültig.
+
+# 2024-01-01 in der Epoche von time.time() (MicroPython 2000, CPython 1970)
+VALID_AFTER = 757382400 if time.gmtime(0)[0] == 2000 else 1704067200
+
+# NTP war in diesem Start erfolgreich
+synced = False
+
+# Sprung der Uhr beim ersten Stellen (s). Zeitstempel, die vorher
+# genommen wurden (kleiner als VALID_AFTER), stimmen nach Verschieben
+# um offset, siehe OfflineBuffer.shift_times. 0 = nichts zu verschieben.
+offset = 0
+
+def valid():
+    """
+    Returns: True wenn die Uhr gestellt ist
+    """
+    return time.time() >= VALID_AFTER
+
+def now():
+    """
+    Returns: time.time() wenn die Uhr gestellt ist, sonst None
+    """
+    t = time.time()
+    return t if t >= VALID_AFTER else None
+
+def sync():
+    """
+    Stellt die RTC per NTP (NTP_SERVER), einmal pro Start. War die Uhr
+    vorher nicht gestellt, wird der Sprung in offset vermerkt.
+    Returns: True wenn die Uhr danach gestellt ist
+    """
+    global synced, offset
+    if synced or ntptime is None:
+        return valid()
+    before = time.time()
+    try:
+        ntptime.host = NTP_SERVER
+        ntptime.settime()
+        synced = True
+        if before < VALID_AFTER:
+            offset += time.time() - before
+        log.info('Uhr per NTP gestellt: {}', time.time())
+    except (OSError, OverflowError) as e:
+        log.warning('WARNUNG: NTP fehlgeschlagen: {}', e)
+    return valid()
@@ -0,0 +1,118 @@
+import time
+
+from mysettings import CMD_ON, CMD_OFF, CMD_AUTO
+
+def hysteresis(active, value, on, off):
+    """
+    Zweipunktregelung mit Hysterese
+    Args:
+        active: Bisheriger Zustand der Regel
+        value: Messwert (None = Sensorfehler)
+        on, off: Schaltschwellen. Mit on >= off wird oberhalb von on ein-
+        und unterhalb von off ausgeschaltet, mit on < off umgekehrt
+    Returns: neuer Zustand, bei Sensorfehler False
+    """
+    if value is None:
+        return False
+    if on >= off:
+        return value > on or (active and value >= off)
+    return value < on or (active and value <= off)
+
+class Actuator:
+    """
+    Ein Aktor mit Hysterese-Regeln und manueller Übersteuerung per MQTT.
+
+    Der Aktor ist eingeschaltet, solange mindestens eine Regel es
+    verlangt. Ein Befehl CMD_ON/CMD_OFF auf command_topic übersteuert die
+    Regelung für override_ms (0 = bis CMD_AUTO), CMD_AUTO gibt sie sofort
+    zurück. changed bleibt True, bis der Zustand gesendet wurde.
+    """
+    def __init__(self, command_topic, state_topic, switch, rules, override_ms):
+        """
+        command_topic: Topic für Befehle (z.B. LUEFTER_TOPIC)
+        state_topic: Topic für den Zustand
+        switch: Funktion(command), schaltet die Hardware mit CMD_ON/CMD_OFF
+        rules: Liste von (Index in readings, on, off)
+        override_ms: Dauer der manuellen Übersteuerung in ms
+        """
+        self.command_topic = command_topic
+        self.state_topic = state_topic
+        self.switch = switch
+        self.rules = rules
+        self.override_ms = override_ms
+        self.demand = [False] * len(rules)
+        self.on = False
+        self.manual = False
+        self.manual_until = 0
+        self.changed = True
+
+    def _set(self, on):
+        if on != self.on:
+            self.on = on
+            self.switch(CMD_ON if on else CMD_OFF)
+            self.changed = True
+
+    def restore(self, on):
+        """
+        Übernimmt einen gespeicherten Schaltzustand (z.B. nach dem
+        Tiefschlaf) und schaltet die Hardware in jedem Fall neu
+        """
+        self.on = on
+        self.switch(CMD_ON if on else CMD_OFF)
+
+    def command(self, msg, now):
+        """
+        Verarbeitet einen MQTT-Befehl
+        """
+        if msg == CMD_AUTO:
+            if self.manual:
+                self.manual = False
+                self.changed = True
+                self._set(True in self.demand)
+        elif msg == CMD_ON or msg == CMD_OFF:
+            if not self.manual:
+                self.manual = True
+                self.changed = True
+            self.manual_until = time.ticks_add(now, self.override_ms)
+            self._set(msg == CMD_ON)
+        else:
+            # Fehlermeldung für unbekannte Befehle kommt aus switch
+            self.switch(msg)
+
+    def update(self, readings, now):
+        """
+        Wertet die Regeln mit den aktuellen Messwerten aus und schaltet,
+        falls nicht manuell übersteuert
+        """
+        for i in range(len(self.rules)):
+            index, on, off = self.rules[i]
+            self.demand[i] = hysteresis(self.demand[i], readings[index], on, off)
+        if self.manual:
+            if not self.override_ms or time.ticks_diff(now, self.manual_until) < 0:
+                return
+            self.manual = False
+            self.changed = True
+        self._set(True in self.demand)
+
+    def state_message(self):
+        """
+        Returns: Zustand als b'<on|off>:<auto|manual>'
+        """
+        return (CMD_ON if self.on else CMD_OFF) + (b':manual' if self.manual else b':auto')
+
+class EdgeController:
+    """
+    Regelt Lüfter und Pumpe direkt auf dem ESP-32, ohne Umweg über den
+    Broker und auch während eines Verbindungsausfalls
+    """
+    def __init__(self, actuators):
+        self.actuators = actuators
+        self.by_topic = {a.command_topic: a for a in actuators}
+
+    def update(self, readings):
+        now = time.ticks_ms()
+        for actuator in self.actuators:
+            actuator.update(readings, now)
+
+    def command(self, topic, msg):
+        self.by_topic[topic].command(msg, time.ticks_ms())
@@ -0,0 +1,72 @@
+import time
+
+class ReportByException:
+    """
+    Entscheidet pro Messwert, ob er gesendet werden muss.
+
+    Ein Wert wird gesendet, wenn er sich seit dem letzten gesendeten Wert
+    um mehr als max(absolut, relativ * |letzter Wert|) geändert hat, beim
+    Wechsel zwischen gültigem Wert und Sensorfehler (None), oder wenn er
+    max_silence_ms lang nicht gesendet wurde (Heartbeat). Mit
+    max_silence_ms = 0 wird jeder Wert gesendet.
+
+    Die Messwerte werden über eine Bitmaske adressiert (Bit i = Wert i).
+    """
+    def __init__(self, absolute, relative, max_silence_ms, stats_interval_ms=0):
+        self.absolute = absolute
+        self.relative = relative
+        self.max_silence_ms = max_silence_ms
+        self.stats_interval_ms = stats_interval_ms
+        self.all = (1 << len(absolute)) - 1
+        self.last = [None] * len(absolute)
+        self.last_sent = [None] * len(absolute)
+        self.last_stats = time.ticks_ms()
+        self.sent = 0
+        self.suppressed = 0
+
+    def _due(self, i, value, now):
+        last_sent = self.last_sent[i]
+        if last_sent is None or time.ticks_diff(now, last_sent) >= self.max_silence_ms:
+            return True
+        last = self.last[i]
+        if value is None or last is None:
+            return value is not last
+        return abs(value - last) > max(self.absolute[i], self.relative[i] * abs(last))
+
+    def select(self, values, now):
+        """
+        Returns: Bitmaske der Werte, die gesendet werden müssen
+        """
+        mask = 0
+        for i in range(len(values)):
+            if self._due(i, values[i], now):
+                mask |= 1 << i
+        return mask
+
+    def commit(self, values, mask, now):
+        """
+        Merkt sich die gesendeten Werte (nach erfolgreichem Senden) und
+        zählt die übrigen als unterdrückt
+        """
+        for i in range(len(values)):
+            if mask & (1 << i):
+                self.last[i] = values[i]
+                self.last_sent[i] = now
+                self.sent += 1
+            else:
+                self.suppressed += 1
+
+    def stats_due(self, now):
+        """
+        Returns: True wenn die Statistik wieder gesendet werden soll
+        """
+        if self.stats_interval_ms and time.ticks_diff(now, self.last_stats) >= self.stats_interval_ms:
+            self.last_stats = now
+            return True
+        return False
+
+    def stats_message(self):
+        """
+        Returns: Statistik-Nachricht b'sent:<n> suppressed:<n>'
+        """
+        return b'sent:%d suppressed:%d' % (self.sent, self.suppressed)
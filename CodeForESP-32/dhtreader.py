@@ -0,0 +1,92 @@
+import time
+
+# Zustände
+MEASURE = 0     # Messung fällig
+COOLDOWN = 1    # Letzte Messung gültig, warten bis zum nächsten Intervall
+RETRY = 2       # Letzte Messung fehlgeschlagen, neuer Versuch nach Wartezeit
+
+class DHTReader:
+    """
+    Zustandsautomat für den DHT22, der die CPU nie während einer
+    Wartezeit festhält.
+
+    step() wird aus der Hauptschleife (Scheduler) oder einem Task
+    aufgerufen, führt höchstens eine measure() aus und gibt zurück, wann
+    der nächste Aufruf fällig ist. Zwischen zwei Messungen liegen immer
+    mindestens cooldown_ms (der DHT22 verträgt höchstens eine Messung
+    alle 2 s). Nach einem Fehler wird nach retry_ms erneut gemessen, nach
+    retries Fehlversuchen erst wieder im nächsten Intervall.
+    """
+    def __init__(self, sensor, interval_ms, retry_ms=2000, retries=3, cooldown_ms=2000, validate=None):
+        """
+        sensor: dht.DHT22 Objekt
+        interval_ms: Abstand zwischen zwei regulären Messungen
+        validate: Funktion (temperature, humidity) -> bool für Plausibilitätsprüfung
+        """
+        self.sensor = sensor
+        self.interval_ms = max(interval_ms, cooldown_ms)
+        self.retry_ms = max(retry_ms, cooldown_ms)
+        self.retries = retries
+        self.validate = validate
+        self.state = MEASURE
+        self.next_due = time.ticks_ms()
+        self.failures = 0
+        self.errors = 0
+        self.temperature = None
+        self.humidity = None
+        self.stamp = None
+
+    def step(self):
+        """
+        Misst, falls fällig, und plant den nächsten Schritt
+        Returns: Millisekunden bis zum nächsten fälligen Aufruf
+        """
+        now = time.ticks_ms()
+        wait = time.ticks_diff(self.next_due, now)
+        if wait > 0:
+            return wait
+
+        try:
+            self.sensor.measure()
+            temperature = self.sensor.temperature()
+            humidity = self.sensor.humidity()
+            ok = self.validate is None or self.validate(temperature, humidity)
+        except Exception:
+            # dht meldet Zeitüberschreitungen als OSError, Prüfsummenfehler
+            # aber als Exception
+            ok = False
+
+        if ok:
+            self.temperature = temperature
+            self.humidity = humidity
+            self.stamp = now
+            self.failures = 0
+            self.state = COOLDOWN
+            delay = self.interval_ms
+        else:
+            self.errors += 1
+            self.failures += 1
+            if self.failures < self.retries:
+                self.state = RETRY
+                delay = self.retry_ms
+            else:
+                # Aufgeben bis zum nächsten regulären Intervall
+                self.failures = 0
+                self.state = COOLDOWN
+                delay = self.interval_ms
+        self.next_due = time.ticks_add(now, delay)
+        return delay
+
+    def age_ms(self):
+        """
+        Returns: Alter des letzten gültigen Messwerts in ms, None wenn es keinen gibt
+        """
+        if self.stamp is None:
+            return None
+        return time.ticks_diff(time.ticks_ms(), self.stamp)
+
+    def value(self):
+        """
+        Returns: (temperature, humidity, age_ms) des letzten gültigen Messwerts
+        """
+        return self.temperature, self.humidity, self.age_ms()
@@ -0,0 +1,121 @@
+import time
+try:
+    import ujson as json
+except ImportError:
+    import json
+try:
+    import usocket as socket
+except ImportError:
+    import socket
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+import log
+
+class Timeline:
+    """
+    Zeitpunkte der Startphasen in ms seit dem Reset (time.ticks_ms()).
+    Jede Phase wird nur beim ersten Mal eingetragen, spätere
+    Neuverbindungen ändern den Start-Ablauf nicht.
+    """
+    def __init__(self):
+        self.marks = []
+        self.sent = False
+
+    def mark(self, label):
+        """
+        Args:
+            label: Name der Phase als Bytes, z.B. b'wlan'
+        """
+        for entry in self.marks:
+            if entry[0] == label:
+                return
+        self.marks.append((label, time.ticks_ms()))
+
+    def message(self):
+        """
+        Returns: b'<phase>:<ms> <phase>:<ms> ...'
+        """
+        return b' '.join(label + b':%d' % ms for label, ms in self.marks)
+
+    def finish(self, label):
+        """
+        Trägt die letzte Phase ein
+        Returns: Nachricht beim ersten Aufruf, danach None
+        """
+        if self.sent:
+            return None
+        self.sent = True
+        self.mark(label)
+        return self.message()
+
+# Ein Ablauf pro Start, wird von boot.py und main.py gemeinsam benutzt
+timeline = Timeline()
+
+class NetCache:
+    """
+    Im Flash gespeicherte Verbindungsdaten für einen schnellen Start:
+    Kanal und BSSID des Access Points sowie die IP-Adresse des Brokers mit
+    Ablaufzeit. Die Datei wird nur geschrieben, wenn sich etwas ändert.
+    """
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+    def _save(self):
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(self.data, f)
+        except OSError as e:
+            log.warning('WARNUNG: Verbindungs-Cache nicht gespeichert: {}', e)
+
+    def ap(self, ssid):
+        """
+        Returns: (bssid, channel) des zuletzt benutzten Access Points oder None
+        """
+        entry = self.data.get('ap')
+        if entry and entry[0] == ssid:
+            return binascii.unhexlify(entry[1]), entry[2]
+        return None
+
+    def set_ap(self, ssid, bssid, channel):
+        entry = [ssid, binascii.hexlify(bssid).decode(), channel]
+        if self.data.get('ap') != entry:
+            self.data['ap'] = entry
+            self._save()
+
+    def forget_ap(self):
+        if self.data.pop('ap', None) is not None:
+            self._save()
+
+    def resolve(self, host, port, ttl):
+        """
+        Löst host über den Cache auf, nach ttl Sekunden wird neu
+        aufgelöst. Schlägt die Auflösung fehl, wird die alte Adresse
+        weiter benutzt.
+        Returns: IP-Adresse als String
+        """
+        entry = self.data.get('dns')
+        now = int(time.time())
+        # Ohne NTP beginnt die Uhr nach dem Einschalten wieder bei 0, ein
+        # Ablaufzeitpunkt weiter als ttl in der Zukunft gilt als abgelaufen
+        if entry and entry[0] == host and 0 <= entry[2] - now <= ttl:
+            return entry[1]
+        try:
+            addr = socket.getaddrinfo(host, port)[0][-1]
+        except OSError:
+            if entry and entry[0] == host:
+                return entry[1]
+            raise
+        if not isinstance(addr, tuple):
+            # Port ohne Adress-Tupel, Name unverändert weitergeben
+            return host
+        self.data['dns'] = [host, addr[0], now + ttl]
+        self._save()
+        return addr[0]
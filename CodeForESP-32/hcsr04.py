@@ -1,5 +1,6 @@
 import machine, time
 from machine import Pin
+from array import array
 
 __version__ = '0.2.0'
 __author__ = 'Roberto Sánchez'
@@ -12,14 +13,17 @@ class HCSR04:
     The timeouts received listening to echo pin are converted to OSError('Out of range')
     """
     # echo_timeout_us is based in chip range limit (400cm)
-    def __init__(self, trigger_pin, echo_pin, echo_timeout_us=500*2*30):
+    def __init__(self, trigger_pin, echo_pin, echo_timeout_us=500*2*30, max_burst=9):
         """
         trigger_pin: Output pin to send pulses
         echo_pin: Readonly pin to measure the distance. The pin should be protected with 1k resistor
         echo_timeout_us: Timeout in microseconds to listen to echo pin. 
         By default is based in sensor limit range (4m)
+        max_burst: Maximum number of pings per burst (size of the preallocated echo buffer)
         """
         self.echo_timeout_us = echo_timeout_us
+        # Echo times of the current burst in microseconds, -1 = no echo
+        self.burst = array('i', [0] * max_burst)
         # Init trigger pin (out)
         self.trigger = Pin(trigger_pin, mode=Pin.OUT, pull=None)
         self.trigger.value(0)
@@ -74,3 +78,73 @@ class HCSR04:
         cms = (pulse_time / 2) / 29.1
         return cms
 
+    def burst_ping(self, i):
+        """
+        Send one pulse and store the echo time in slot i of the burst buffer
+        (-1 if there was no echo). Never raises on a timeout.
+        """
+        try:
+            pulse_time = self._send_pulse_and_wait()
+        except OSError:
+            pulse_time = -1
+        # Newer MicroPython versions return a negative value instead of raising
+        self.burst[i] = pulse_time if pulse_time > 0 else -1
+
+    def burst_result(self, n, temp_c=20, min_valid=0):
+        """
+        Reduce the first n slots of the burst buffer to a distance in millimeters
+        with integer math only. Missing echoes are dropped, the rest is sorted in
+        place, echoes further than max(10%, 10mm) from the median are dropped as
+        outliers and the median of the remaining ones is returned.
+        temp_c: Air temperature in Celsius for the speed of sound
+        min_valid: Minimum number of usable echoes (default: more than half of n)
+        Returns None if there are not enough usable echoes.
+        """
+        buf = self.burst
+        # Compact the valid echoes to the front and sort them (insertion sort)
+        k = 0
+        for i in range(n):
+            v = buf[i]
+            if v > 0:
+                j = k - 1
+                while j >= 0 and buf[j] > v:
+                    buf[j + 1] = buf[j]
+                    j -= 1
+                buf[j + 1] = v
+                k += 1
+        if not min_valid:
+            min_valid = n // 2 + 1
+        if k < min_valid:
+            return None
+
+        # Speed of sound in 0.1 m/s: 331.3 m/s + 0.606 m/s per degree Celsius,
+        # so 1 us of echo time (there and back) is c10 / 20000 mm
+        c10 = 3313 + 606 * int(temp_c * 10) // 1000
+        med = buf[k >> 1]
+        tol = max(med // 10, 10 * 20000 // c10)
+        lo = 0
+        while buf[lo] < med - tol:
+            lo += 1
+        hi = k - 1
+        while buf[hi] > med + tol:
+            hi -= 1
+        if hi - lo + 1 < min_valid:
+            return None
+        return buf[(lo + hi) >> 1] * c10 // 20000
+
+    def distance_mm_burst(self, count=5, gap_ms=60, temp_c=20):
+        """
+        Fire `count` pings, `gap_ms` apart (the HC-SR04 needs about 60ms between
+        two measurements), and return the median distance in millimeters as an
+        integer, or None if less than half of the pings gave a usable echo.
+        The call takes at most count * max(gap_ms, echo_timeout_us / 1000) ms.
+        """
+        count = min(count, len(self.burst))
+        for i in range(count):
+            start = time.ticks_ms()
+            self.burst_ping(i)
+            if i < count - 1:
+                wait = gap_ms - time.ticks_diff(time.ticks_ms(), start)
+                if wait > 0:
+                    time.sleep_ms(wait)
+        return self.burst_result(count, temp_c)
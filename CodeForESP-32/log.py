@@ -0,0 +1,162 @@
+import time
+try:
+    import uos as os
+except ImportError:
+    import os
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+
+from mysettings import (
+    LOG_LEVEL,
+    LOG_BUFFER_SIZE,
+    LOG_UART_LEVEL,
+    LOG_FILE,
+    LOG_FILE_LEVEL,
+    LOG_FILE_SIZE,
+)
+
+# Leveled Logging in einen vorab angelegten Ringpuffer im RAM.
+#
+# Aufruf immer über das Modul (log.debug(...)), nicht per from-Import:
+# set_level() ersetzt die Funktionen abgeschalteter Stufen durch _off,
+# das nur die festen Parameter entgegennimmt. Ein abgeschalteter Aufruf
+# formatiert also nichts und legt nichts an (keine *args-Tupel). Die
+# Nachricht ist ein str.format-Muster mit bis zu vier Argumenten:
+#
+#     log.info('Verbunden mit {} nach {} ms', server, ms)
+#
+# Ausgaben:
+#   - Ringpuffer (LOG_BUFFER_SIZE Bytes), Inhalt über contents() bzw.
+#     neue Zeilen über drain() (z.B. für ein MQTT Log-Topic)
+#   - UART/REPL per print ab LOG_UART_LEVEL
+#   - Datei im Flash ab LOG_FILE_LEVEL, bei LOG_FILE_SIZE Bytes wird sie
+#     nach LOG_FILE + '.old' verschoben
+
+DEBUG = const(10)
+INFO = const(20)
+WARNING = const(30)
+ERROR = const(40)
+OFF = const(50)
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR, 'off': OFF}
+_PREFIX = {DEBUG: 'D', INFO: 'I', WARNING: 'W', ERROR: 'E'}
+
+class RingBuffer:
+    """
+    Ringpuffer fester Größe für Bytes. total zählt alle je geschriebenen
+    Bytes, ältere als len(buf) sind überschrieben.
+    """
+    def __init__(self, size):
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.total = 0
+
+    def write(self, data):
+        size = len(self.buf)
+        n = len(data)
+        if n > size:
+            data = data[n - size:]
+            self.total += n - size
+            n = size
+        pos = self.total % size
+        first = min(n, size - pos)
+        self.mv[pos:pos + first] = data[:first]
+        if first < n:
+            self.mv[:n - first] = data[first:]
+        self.total += n
+
+    def read(self, start):
+        """
+        Returns: alle noch vorhandenen Bytes ab der Position start (in total gezählt)
+        """
+        size = len(self.buf)
+        start = max(start, self.total - size, 0)
+        n = self.total - start
+        pos = start % size
+        if pos + n <= size:
+            return bytes(self.mv[pos:pos + n])
+        return bytes(self.mv[pos:]) + bytes(self.mv[:pos + n - size])
+
+ring = RingBuffer(LOG_BUFFER_SIZE)
+level = OFF
+uart_level = LEVELS[LOG_UART_LEVEL]
+file_level = LEVELS[LOG_FILE_LEVEL]
+_drained = 0
+
+def _file_write(line):
+    try:
+        try:
+            if os.stat(LOG_FILE)[6] >= LOG_FILE_SIZE:
+                os.rename(LOG_FILE, LOG_FILE + '.old')
+        except OSError:
+            pass
+        with open(LOG_FILE, 'a') as f:
+            f.write(line)
+            f.write('\n')
+    except OSError:
+        pass
+
+def _emit(lvl, msg, a, b, c, d):
+    line = '{} {} {}'.format(_PREFIX[lvl], time.ticks_ms(), msg.format(a, b, c, d))
+    ring.write(line.encode())
+    ring.write(b'\n')
+    if lvl >= uart_level:
+        print(line)
+    if lvl >= file_level:
+        _file_write(line)
+
+def _off(msg, a=None, b=None, c=None, d=None):
+    pass
+
+def _on(lvl):
+    def emit(msg, a=None, b=None, c=None, d=None):
+        _emit(lvl, msg, a, b, c, d)
+    return emit
+
+debug = info = warning = error = _off
+
+def set_level(new_level):
+    """
+    Args:
+        new_level: DEBUG, INFO, WARNING, ERROR, OFF oder der Name aus LEVELS
+    """
+    global level, debug, info, warning, error
+    if isinstance(new_level, str):
+        new_level = LEVELS[new_level]
+    level = new_level
+    debug = _on(DEBUG) if level <= DEBUG else _off
+    info = _on(INFO) if level <= INFO else _off
+    warning = _on(WARNING) if level <= WARNING else _off
+    error = _on(ERROR) if level <= ERROR else _off
+
+def enabled(lvl):
+    """
+    Returns: True wenn die Stufe ausgegeben wird, für teure Argumente:
+    if log.enabled(log.DEBUG): log.debug('...', teure_funktion())
+    """
+    return lvl >= level
+
+def contents():
+    """
+    Returns: gesamter Inhalt des Ringpuffers ab der ältesten vollständigen Zeile
+    """
+    data = ring.read(0)
+    if ring.total > len(ring.buf):
+        data = data[data.find(b'\n') + 1:]
+    return data
+
+def drain():
+    """
+    Returns: seit dem letzten Aufruf hinzugekommene Zeilen, None wenn keine
+    """
+    global _drained
+    if ring.total == _drained:
+        return None
+    data = ring.read(_drained)
+    _drained = ring.total
+    return data
+
+set_level(LOG_LEVEL)
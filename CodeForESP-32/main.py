@@ -5,12 +5,38 @@
 # System Imports
 import time
 import gc
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+try:
+    import uselect as select
+except ImportError:
+    import select
 from machine import ADC, Pin
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
 
 # Sensor Imports
 import dht
 import machine
 from hcsr04 import HCSR04
+from adcsampler import OversampledADC
+from offlinebuffer import OfflineBuffer
+from sensorframe import FrameEncoder, TextField
+from scheduler import Scheduler
+from timersampler import TimerSampler
+from deadband import ReportByException
+from dhtreader import DHTReader
+from controller import Actuator, EdgeController
+from powersave import RTCState, woke_from_deepsleep
+from fastboot import timeline
+import powersave
+import clock
+import log
 
 from mysettings import (
     # Hardware Pins
@@ -18,7 +44,13 @@ from mysettings import (
     ULTRASONIC_TRIGGER_PIN,
     ULTRASONIC_ECHO_PIN,
     ULTRASONIC_TIMEOUT_US,
-    MOISTURE_SENSOR_PIN,
+    ULTRASONIC_BURST_COUNT,
+    ULTRASONIC_BURST_GAP_MS,
+    MOISTURE_SENSOR_PINS,
+    MOISTURE_SAMPLES,
+    MOISTURE_TRIM_PERCENT,
+    MOISTURE_FILTER,
+    MOISTURE_BUDGET_US,
     
     # ADC Einstellungen
     ADC_WIDTH,
@@ -26,16 +58,47 @@ from mysettings import (
     
     # Timing
     MESSAGE_INTERVAL,
+    PUBLISH_INTERVAL,
+    DHT_INTERVAL,
+    DHT_RETRY_DELAY,
+    DHT_MAX_AGE,
+    ULTRASONIC_INTERVAL,
+    MOISTURE_INTERVAL,
+    SAMPLING_MODE,
+    SAMPLING_FIRST_TIMER,
+    EVENT_QUEUE_SIZE,
+    POWER_MODE,
+    POWER_FLUSH_TIMEOUT,
+    
+    # MQTT
+    MQTT_KEEPALIVE,
+    MQTT_PING_TIMEOUT,
+    MQTT_RETRY_TIMEOUT,
+    MQTT_SENSOR_QOS,
+    MQTT_QOS_LEVEL,
+    PAYLOAD_FORMAT,
     
     # MQTT Topics
+    LUEFTER_TOPIC,
+    PUMPE_TOPIC,
+    LUEFTER_STATE_TOPIC,
+    PUMPE_STATE_TOPIC,
     TEMP_TOPIC,
     HUMI_TOPIC,
     DIST_TOPIC,
     MOIST_TOPIC,
+    PACKED_TOPIC,
+    STATS_TOPIC,
+    AWAKE_TOPIC,
+    BOOT_TOPIC,
+    LOG_TOPIC,
+    LOG_MQTT,
     
     # System Einstellungen
     DEBUG_MODE,
     MEMORY_MONITORING,
+    GC_THRESHOLD,
+    ASYNC_MODE,
     
     # Sensor Limits
     TEMP_MIN_LIMIT,
@@ -46,64 +109,152 @@ from mysettings import (
     DIST_MAX_LIMIT,
     SENSOR_RETRY_COUNT,
     
-    # Feuchtigkeits-Schwellwerte
-    MOISTURE_DRY_THRESHOLD,
-    MOISTURE_WET_THRESHOLD,
-    
     # Fehler-Nachrichten
     ERROR_MSG_TEMP,
     ERROR_MSG_HUMI,
     ERROR_MSG_DIST,
     ERROR_MSG_MOIST,
     
+    # Report-by-Exception
+    TEMP_DEADBAND_ABS,
+    TEMP_DEADBAND_REL,
+    HUMI_DEADBAND_ABS,
+    HUMI_DEADBAND_REL,
+    DIST_DEADBAND_ABS,
+    DIST_DEADBAND_REL,
+    MOIST_DEADBAND_ABS,
+    MOIST_DEADBAND_REL,
+    REPORT_MAX_SILENCE,
+    STATS_INTERVAL,
+    
+    # Aktor-Regelung
+    EDGE_CONTROL,
+    FAN_TEMP_ON,
+    FAN_TEMP_OFF,
+    FAN_HUMI_ON,
+    FAN_HUMI_OFF,
+    PUMP_MOIST_ON,
+    PUMP_MOIST_OFF,
+    MANUAL_OVERRIDE_TIME,
+    
+    # Offline-Puffer
+    BACKLOG_TOPIC,
+    OFFLINE_BUFFER_SIZE,
+    OFFLINE_SPILL_FILE,
+    OFFLINE_SPILL_SIZE,
+    BACKLOG_BATCH_SIZE,
+    BACKLOG_MAX_BATCHES,
+    
     # Backwards Compatibility
     message_interval
 )
 
+# Messwerte, die während eines Verbindungsausfalls nicht gesendet werden
+# konnten (Speicherbedarf fest begrenzt, siehe offlinebuffer.py). Vor dem
+# Stellen der Uhr sind die Zeitstempel Sekunden seit dem Einschalten, sie
+# werden mit fix_offline_times() nachträglich umgerechnet.
+offline_buffer = OfflineBuffer(OFFLINE_BUFFER_SIZE, OFFLINE_SPILL_FILE, OFFLINE_SPILL_SIZE)
+
+# Binärformat für PAYLOAD_FORMAT = 'packed' (siehe sensorframe.py)
+frame_encoder = FrameEncoder()
+
+# Text-Nachrichten für Temperatur, Luftfeuchtigkeit, Entfernung,
+# Bodenfeuchtigkeit, jeweils mit eigenem Puffer und mit gestellter Uhr
+# mit Zeitstempel (siehe sensorframe.py)
+text_fields = (
+    TextField(b'temp:', 1, b'', ERROR_MSG_TEMP),
+    TextField(b'humi:', 1, b'', ERROR_MSG_HUMI),
+    TextField(b'distance:', 1, b' cm', ERROR_MSG_DIST),
+    TextField(b'moist:', 0, b'', ERROR_MSG_MOIST),
+)
+
+# Nachrichten (topic, msg, qos, retain) für publish_many. Sie werden
+# einmal angelegt und pro Zyklus nur neu befüllt, ebenso die Listen
+# fester Länge (0 bis 5 Nachrichten), die an publish_many gehen. Neue
+# Objekte entstehen dann nur noch durch Log-Ausgaben (LOG_LEVEL 'debug').
+sensor_msgs = [[topic, b'', MQTT_SENSOR_QOS, False]
+               for topic in (TEMP_TOPIC, HUMI_TOPIC, DIST_TOPIC, MOIST_TOPIC)]
+packed_msg = [PACKED_TOPIC, frame_encoder.buf, MQTT_SENSOR_QOS, False]
+stats_msg = [STATS_TOPIC, b'', 0, False]
+cycle_msgs = [[None] * n for n in range(6)]
+
+# Messwerte des laufenden Sendevorgangs. Timer-Messungen können readings
+# noch während publish_many ändern, gemerkt wird aber, was gesendet wurde.
+cycle_values = [None] * 4
+
+# Heap-Belegung nach der letzten Sammlung (siehe collect_garbage)
+heap_base = 0
+
+# Totbänder für Temperatur, Luftfeuchtigkeit, Entfernung, Bodenfeuchtigkeit
+report_filter = ReportByException(
+    (TEMP_DEADBAND_ABS, HUMI_DEADBAND_ABS, DIST_DEADBAND_ABS, MOIST_DEADBAND_ABS),
+    (TEMP_DEADBAND_REL, HUMI_DEADBAND_REL, DIST_DEADBAND_REL, MOIST_DEADBAND_REL),
+    REPORT_MAX_SILENCE * 1000,
+    STATS_INTERVAL * 1000
+)
+
 # =====================================================
 # SENSOR INITIALISIERUNG
 # =====================================================
 
+# Plätze der Sensor-Objekte in der Liste aus init_sensors()
+SENSOR_DHT = const(0)
+SENSOR_ULTRASONIC = const(1)
+SENSOR_MOISTURE = const(2)
+
 def init_sensors():
     """
     Initialisiert alle Sensoren mit Parametern aus mysettings.py
-    Returns: Dictionary mit Sensor-Objekten
+    Returns: Liste mit Sensor-Objekten (Index SENSOR_*)
     """
-    if DEBUG_MODE:
-        print('\n=== SENSOR INITIALISIERUNG ===')
+    log.debug('=== SENSOR INITIALISIERUNG ===')
     
-    sensors = {}
+    sensors = [None] * 3
     
     try:
         # ===== DHT22 =====
-        if DEBUG_MODE:
-            print('Initialisiere DHT22 Sensor (Pin {})...'.format(DHT22PIN))
-        sensors['dht'] = dht.DHT22(machine.Pin(DHT22PIN))
+        log.debug('Initialisiere DHT22 Sensor (Pin {})...', DHT22PIN)
+        sensors[SENSOR_DHT] = DHTReader(
+            dht.DHT22(machine.Pin(DHT22PIN)),
+            interval_ms=DHT_INTERVAL * 1000,
+            retry_ms=DHT_RETRY_DELAY * 1000,
+            retries=SENSOR_RETRY_COUNT,
+            validate=_valid_dht
+        )
         
         # ===== HC-SR04 =====
-        if DEBUG_MODE:
-            print('Initialisiere HC-SR04 (Trigger: {}, Echo: {})...'.format(
-                ULTRASONIC_TRIGGER_PIN, ULTRASONIC_ECHO_PIN))
-        sensors['ultrasonic'] = HCSR04(
+        log.debug('Initialisiere HC-SR04 (Trigger: {}, Echo: {})...',
+                  ULTRASONIC_TRIGGER_PIN, ULTRASONIC_ECHO_PIN)
+        sensors[SENSOR_ULTRASONIC] = HCSR04(
             trigger_pin=ULTRASONIC_TRIGGER_PIN,
             echo_pin=ULTRASONIC_ECHO_PIN,
             echo_timeout_us=ULTRASONIC_TIMEOUT_US
         )
         
         # ===== BODENFEUCHTIGKEITSSENSOR =====
-        if DEBUG_MODE:
-            print('Initialisiere Bodenfeuchtigkeitssensor (Pin {})...'.format(MOISTURE_SENSOR_PIN))
+        log.debug('Initialisiere Bodenfeuchtigkeitssensor (Pins {}, {}x {})...',
+                  MOISTURE_SENSOR_PINS, MOISTURE_SAMPLES, MOISTURE_FILTER)
         
-        moisture_adc = ADC(Pin(MOISTURE_SENSOR_PIN))
-        moisture_adc.width(ADC_WIDTH)
-        moisture_adc.atten(ADC_ATTENUATION)
-        sensors['moisture'] = moisture_adc
+        moisture_adcs = []
+        for pin in MOISTURE_SENSOR_PINS:
+            moisture_adc = ADC(Pin(pin))
+            moisture_adc.width(ADC_WIDTH)
+            moisture_adc.atten(ADC_ATTENUATION)
+            moisture_adcs.append(moisture_adc)
+        # Mehrfachmessung mit Median/getrimmtem Mittelwert gegen ADC-Rauschen
+        sensors[SENSOR_MOISTURE] = OversampledADC(
+            moisture_adcs,
+            samples=MOISTURE_SAMPLES,
+            trim_percent=MOISTURE_TRIM_PERCENT,
+            mode=MOISTURE_FILTER,
+            budget_us=MOISTURE_BUDGET_US
+        )
         
-        print('Alle Sensoren erfolgreich initialisiert!')
+        log.info('Alle Sensoren erfolgreich initialisiert!')
         return sensors
         
     except Exception as e:
-        print('FEHLER bei Sensor-Initialisierung:', e)
+        log.error('FEHLER bei Sensor-Initialisierung: {}', e)
         return None
 
 # =====================================================
@@ -124,135 +275,524 @@ def validate_sensor_value(value, min_limit, max_limit, sensor_name):
         return False
     
     if value < min_limit or value > max_limit:
-        if DEBUG_MODE:
-            print('WARNUNG: {} Wert außerhalb Limits: {} (erlaubt: {}-{})'.format(
-                sensor_name, value, min_limit, max_limit))
+        log.debug('WARNUNG: {} Wert außerhalb Limits: {} (erlaubt: {}-{})',
+                  sensor_name, value, min_limit, max_limit)
         return False
     
     return True
 
+def _valid_dht(temperature, humidity):
+    """
+    Plausibilitätsprüfung einer DHT22-Messung (für DHTReader)
+    """
+    temp_valid = validate_sensor_value(temperature, TEMP_MIN_LIMIT, TEMP_MAX_LIMIT, "Temperatur")
+    humi_valid = validate_sensor_value(humidity, HUMI_MIN_LIMIT, HUMI_MAX_LIMIT, "Luftfeuchtigkeit")
+    return temp_valid and humi_valid
+
 def read_temperature_humidity(sensors):
     """
-    Liest Temperatur und Luftfeuchtigkeit vom DHT22 mit Wiederholungsversuchen
+    Liefert den letzten gültigen DHT22-Messwert. Ist eine Messung fällig,
+    wird sie ausgeführt, gewartet wird nie (Wiederholungen plant der
+    DHTReader selbst ein, siehe dhtreader.py)
     Args:
-        sensors: Dictionary mit Sensor-Objekten
-    Returns: (temperature, humidity) oder (None, None) bei Fehler
+        sensors: Liste mit Sensor-Objekten (init_sensors)
+    Returns: (temperature, humidity, delay_ms), Temperatur und
+    Luftfeuchtigkeit sind None wenn kein Wert jünger als DHT_MAX_AGE
+    vorliegt. delay_ms ist die Zeit bis zum nächsten fälligen Schritt
+    des DHTReader (None ohne Sensor)
     """
-    dht_sensor = sensors.get('dht')
-    if not dht_sensor:
-        return None, None
+    reader = sensors[SENSOR_DHT]
+    if reader is None:
+        return None, None, None
     
-    for attempt in range(SENSOR_RETRY_COUNT):
-        try:
-            dht_sensor.measure()
-            temperature = dht_sensor.temperature()
-            humidity = dht_sensor.humidity()
-            
-            temp_valid = validate_sensor_value(temperature, TEMP_MIN_LIMIT, TEMP_MAX_LIMIT, "Temperatur")
-            humi_valid = validate_sensor_value(humidity, HUMI_MIN_LIMIT, HUMI_MAX_LIMIT, "Luftfeuchtigkeit")
-            
-            if temp_valid and humi_valid:
-                return temperature, humidity
-            
-        except Exception as e:
-            if DEBUG_MODE:
-                print('DHT22 Versuch {}/{} fehlgeschlagen: {}'.format(attempt + 1, SENSOR_RETRY_COUNT, e))
-            time.sleep(0.5) 
+    delay_ms = reader.step()
+    temperature, humidity, age = reader.value()
+    if age is None or age > DHT_MAX_AGE * 1000:
+        log.debug('FEHLER: Kein aktueller DHT22-Wert (Alter: {} ms, Fehler: {})', age, reader.errors)
+        return None, None, delay_ms
+    return temperature, humidity, delay_ms
+
+def _distance_from_burst(distance_mm):
+    """
+    Prüft das Ergebnis einer Burst-Messung
+    Args:
+        distance_mm: Median in mm oder None (zu wenige gültige Echos)
+    Returns: Entfernung in cm wenn plausibel, sonst None
+    """
+    if distance_mm is None:
+        log.error('FEHLER: Ultraschallsensor liefert zu wenige gültige Echos')
+        return None
     
-    print('FEHLER: DHT22 nach {} Versuchen nicht lesbar'.format(SENSOR_RETRY_COUNT))
-    return None, None
+    distance = distance_mm / 10
+    if validate_sensor_value(distance, DIST_MIN_LIMIT, DIST_MAX_LIMIT, "Entfernung"):
+        return distance
+    return None
 
-def read_distance(sensors):
+def read_distance(sensors, temperature=None):
     """
-    Liest Entfernung vom Ultraschallsensor mit Wiederholungsversuchen
+    Liest Entfernung vom Ultraschallsensor als Burst von
+    ULTRASONIC_BURST_COUNT Messungen (Median, Ausreißer verworfen).
+    Die Dauer ist fest begrenzt, es gibt keine Wiederholungsschleife mehr.
     Args:
-        sensors: Dictionary mit Sensor-Objekten
+        sensors: Liste mit Sensor-Objekten (init_sensors)
+        temperature: Letzte Lufttemperatur in °C für die Schallgeschwindigkeit
     Returns: Entfernung in cm oder None bei Fehler
     """
-    ultrasonic_sensor = sensors.get('ultrasonic')
-    if not ultrasonic_sensor:
+    ultrasonic_sensor = sensors[SENSOR_ULTRASONIC]
+    if ultrasonic_sensor is None:
         return None
     
-    for attempt in range(SENSOR_RETRY_COUNT):
-        try:
-            distance = ultrasonic_sensor.distance_cm()
-            
-            if validate_sensor_value(distance, DIST_MIN_LIMIT, DIST_MAX_LIMIT, "Entfernung"):
-                return distance
-                
-        except Exception as e:
-            if DEBUG_MODE:
-                print('Ultraschall Versuch {}/{} fehlgeschlagen: {}'.format(attempt + 1, SENSOR_RETRY_COUNT, e))
-            time.sleep(0.1)
+    try:
+        distance_mm = ultrasonic_sensor.distance_mm_burst(
+            ULTRASONIC_BURST_COUNT, ULTRASONIC_BURST_GAP_MS,
+            20 if temperature is None else temperature)
+    except Exception as e:
+        log.error('FEHLER beim Lesen des Ultraschallsensors: {}', e)
+        return None
     
-    print('FEHLER: Ultraschallsensor nach {} Versuchen nicht lesbar'.format(SENSOR_RETRY_COUNT))
-    return None
+    return _distance_from_burst(distance_mm)
+
+async def read_distance_async(sensors, temperature=None):
+    """
+    Wie read_distance, gibt die CPU aber in den Pausen zwischen den
+    Einzelmessungen an andere Tasks ab
+    """
+    ultrasonic_sensor = sensors[SENSOR_ULTRASONIC]
+    if ultrasonic_sensor is None:
+        return None
+    
+    count = min(ULTRASONIC_BURST_COUNT, len(ultrasonic_sensor.burst))
+    try:
+        for i in range(count):
+            start = time.ticks_ms()
+            ultrasonic_sensor.burst_ping(i)
+            if i < count - 1:
+                wait = ULTRASONIC_BURST_GAP_MS - time.ticks_diff(time.ticks_ms(), start)
+                await asyncio.sleep(max(wait, 0) / 1000)
+        distance_mm = ultrasonic_sensor.burst_result(count, 20 if temperature is None else temperature)
+    except Exception as e:
+        log.error('FEHLER beim Lesen des Ultraschallsensors: {}', e)
+        return None
+    
+    return _distance_from_burst(distance_mm)
 
 def read_soil_moisture(sensors):
     """
-    Liest Bodenfeuchtigkeit vom analogen Sensor
+    Liest Bodenfeuchtigkeit vom analogen Sensor (gefiltert aus
+    MOISTURE_SAMPLES Einzelmessungen, siehe adcsampler.py)
     Args:
-        sensors: Dictionary mit Sensor-Objekten
-    Returns: Roher ADC-Wert (0-4095) oder None bei Fehler
+        sensors: Liste mit Sensor-Objekten (init_sensors)
+    Returns: ADC-Wert (0-4095) des ersten Kanals oder None bei Fehler
     """
-    moisture_sensor = sensors.get('moisture')
-    if not moisture_sensor:
+    moisture_sensor = sensors[SENSOR_MOISTURE]
+    if moisture_sensor is None:
         return None
     
     try:
         moisture = moisture_sensor.read()
-        
-        if DEBUG_MODE:
-            if moisture > MOISTURE_DRY_THRESHOLD:
-                status = "TROCKEN"
-            elif moisture < MOISTURE_WET_THRESHOLD:
-                status = "SEHR FEUCHT"
-            else:
-                status = "FEUCHT"
-            #print('Bodenfeuchtigkeit: {} ADC ({})'.format(moisture, status))
-        
+        log.debug('Bodenfeuchtigkeit: {} ADC, Messdauer {} us (max. {} us)',
+                  moisture, moisture_sensor.last_us, moisture_sensor.max_us)
         return moisture
         
     except Exception as e:
-        print('FEHLER beim Lesen des Feuchtigkeitssensors:', e)
+        log.error('FEHLER beim Lesen des Feuchtigkeitssensors: {}', e)
         return None
 
-def publish_sensor_data(client, temp, humi, dist, moist):
+def log_sensor_data(readings):
+    """
+    Schreibt die Messwerte als eine Zeile ins Log (None = Sensorfehler)
+    """
+    log.debug('Temperatur: {} / Luftfeuchtigkeit: {} / Entfernung: {} / Bodenfeuchtigkeit: {}',
+              readings[0], readings[1], readings[2], readings[3])
+
+# Anzahl gesetzter Bits für jede Maske über die vier Messwerte
+MASK_BITS = (0, 1, 1, 2, 1, 2, 2, 3, 1, 2, 2, 3, 2, 3, 3, 4)
+
+def build_sensor_messages(readings, mask, msgs):
+    """
+    Trägt die MQTT-Nachrichten für die Sensordaten in msgs ein. Die
+    Nachrichten sind vorab angelegt, nur ihr Inhalt wird neu geschrieben.
+    
+    Args:
+        readings: [Temperatur, Luftfeuchtigkeit, Entfernung, Bodenfeuchtigkeit]
+        mask: Bitmaske der zu sendenden Werte (Bit 0 = temp ... Bit 3 = moist),
+              im Binärformat wird immer der ganze Frame gesendet
+        msgs: Liste, die ab Index 0 befüllt wird
+    Returns: Anzahl eingetragener Nachrichten
+    """
+    log_sensor_data(readings)
+    ts = clock.now()
+    
+    if PAYLOAD_FORMAT == 'packed':
+        # Ein Frame mit allen Werten statt vier Text-Nachrichten
+        frame_encoder.encode(ts, readings[0], readings[1], readings[2], readings[3])
+        log.debug('Sensordaten (packed #{})', frame_encoder.seq - 1 & 0xffff)
+        msgs[0] = packed_msg
+        return 1
+    
+    n = 0
+    for i in range(4):
+        if mask & (1 << i):
+            msg = sensor_msgs[i]
+            msg[1] = text_fields[i].encode(readings[i], ts)
+            msgs[n] = msg
+            n += 1
+    return n
+
+def build_cycle_messages(readings):
+    """
+    Wählt per Report-by-Exception die zu sendenden Werte aus und hängt
+    bei Bedarf die Statistik (gesendet/unterdrückt) an
+    Returns: (Nachrichten für publish_many, Bitmaske der Werte, Zeitpunkt).
+    Die Nachrichten und cycle_values gelten nur bis zum nächsten Aufruf.
+    """
+    for i in range(4):
+        cycle_values[i] = readings[i]
+    readings = cycle_values
+    
+    now = time.ticks_ms()
+    mask = report_filter.select(readings, now)
+    if mask and PAYLOAD_FORMAT == 'packed':
+        # Ein Frame enthält ohnehin alle Werte
+        mask = report_filter.all
+    stats = report_filter.stats_due(now)
+    
+    count = 1 if mask and PAYLOAD_FORMAT == 'packed' else MASK_BITS[mask]
+    msgs = cycle_msgs[count + 1 if stats else count]
+    if mask:
+        build_sensor_messages(readings, mask, msgs)
+    if stats:
+        stats_msg[1] = report_filter.stats_message()
+        msgs[count] = stats_msg
+    return msgs, mask, now
+
+def report_suppressed(mask):
+    """
+    Gibt aus, welche Werte innerhalb ihres Totbands lagen
+    """
+    if mask != report_filter.all and log.enabled(log.DEBUG):
+        names = ('Temperatur', 'Luftfeuchtigkeit', 'Entfernung', 'Bodenfeuchtigkeit')
+        log.debug('Unverändert, nicht gesendet: {}', ', '.join(
+            names[i] for i in range(4) if not mask & (1 << i)))
+
+def log_rtt_stats(client):
+    """
+    Schreibt die Broker-Roundtrip-Statistik der Keepalive-Pings ins Log
+    """
+    if not log.enabled(log.DEBUG):
+        return
+    stats = client.rtt_stats()
+    if stats is not None:
+        log.debug('Broker RTT: min {} / mittel {} / max {} ms ({} Pings)', *stats)
+
+def fix_offline_times():
+    """
+    Rechnet Zeitstempel im Offline-Puffer, die vor dem Stellen der Uhr
+    genommen wurden, in echte Zeit um (einmal nach clock.sync())
+    Returns: True wenn der Rückstau gesendet werden kann (Uhr gestellt)
+    """
+    if clock.offset:
+        offline_buffer.shift_times(clock.VALID_AFTER, clock.offset)
+        clock.offset = 0
+    return clock.valid()
+
+def publish_sensor_data(client, readings):
     """
     Sendet alle Sensordaten via MQTT mit konfigurierbaren Topics
     
     Args:
         client: MQTT Client Objekt
-        temp: Temperatur in °C
-        humi: Luftfeuchtigkeit in %
-        dist: Entfernung in cm
-        moist: Bodenfeuchtigkeit (ADC-Wert)
+        readings: [Temperatur in °C, Luftfeuchtigkeit in %, Entfernung in cm,
+                   Bodenfeuchtigkeit (ADC-Wert)], None = Sensorfehler
     """
+    msgs, mask, now = build_cycle_messages(readings)
+    if msgs:
+        try:
+            # Alle Nachrichten in einem Paketpuffer mit einem Schreibvorgang senden
+            client.publish_many(msgs)
+            
+            log.debug('Daten erfolgreich an MQTT Topics gesendet')
+            log_rtt_stats(client)
+            
+        except Exception as e:
+            log.error('FEHLER beim Senden der MQTT-Daten: {}', e)
+            offline_buffer.push(time.time(), cycle_values[0], cycle_values[1],
+                                cycle_values[2], cycle_values[3])
+            return
+    
+    report_filter.commit(cycle_values, mask, now)
+    report_suppressed(mask)
+    
+    # Ablauf des Starts einmal nach dem ersten Sendevorgang melden
+    boot_msg = timeline.finish(b'publish')
+    if boot_msg is not None:
+        try:
+            client.publish(BOOT_TOPIC, boot_msg, qos=MQTT_SENSOR_QOS)
+            log.debug('Start-Ablauf (ms seit Reset): {}', boot_msg)
+        except Exception as e:
+            log.error('FEHLER beim Senden des Start-Ablaufs: {}', e)
+    
+    # Rückstau aus dem Offline-Puffer nachliefern (ratenbegrenzt), erst
+    # mit gestellter Uhr
+    if len(offline_buffer) and fix_offline_times():
+        try:
+            sent = offline_buffer.drain(client, BACKLOG_TOPIC, BACKLOG_BATCH_SIZE,
+                                        BACKLOG_MAX_BATCHES, MQTT_SENSOR_QOS)
+            log.info('Offline-Puffer: {} Messungen nachgeliefert, {} ausstehend',
+                     sent, len(offline_buffer))
+        except Exception as e:
+            log.error('FEHLER beim Nachliefern des Offline-Puffers: {}', e)
+    
+    # Neue Log-Zeilen aus dem Ringpuffer mitsenden
+    lines = log.drain() if LOG_MQTT else None
+    if lines is not None:
+        try:
+            client.publish(LOG_TOPIC, lines)
+        except Exception as e:
+            log.error('FEHLER beim Senden des Logs: {}', e)
+
+async def publish_sensor_data_async(client, readings):
+    """
+    Wie publish_sensor_data, für den asyncio MQTT Client (umqttasync)
+    """
+    msgs, mask, now = build_cycle_messages(readings)
+    if msgs:
+        try:
+            await client.publish_many(msgs)
+            
+            log.debug('Daten erfolgreich an MQTT Topics gesendet')
+            log_rtt_stats(client)
+            
+        except Exception as e:
+            log.error('FEHLER beim Senden der MQTT-Daten: {}', e)
+            offline_buffer.push(time.time(), cycle_values[0], cycle_values[1],
+                                cycle_values[2], cycle_values[3])
+            return
+    
+    report_filter.commit(cycle_values, mask, now)
+    report_suppressed(mask)
+    
+    boot_msg = timeline.finish(b'publish')
+    if boot_msg is not None:
+        try:
+            await client.publish(BOOT_TOPIC, boot_msg, qos=MQTT_SENSOR_QOS)
+        except Exception as e:
+            log.error('FEHLER beim Senden des Start-Ablaufs: {}', e)
+    
+    # Rückstau aus dem Offline-Puffer nachliefern (ratenbegrenzt)
     try:
-        temp_msg = b'temp:%.1f' % temp if temp is not None else ERROR_MSG_TEMP
-        humi_msg = b'humi:%.1f' % humi if humi is not None else ERROR_MSG_HUMI
-        dist_msg = b'distance:%.1f cm' % dist if dist is not None else ERROR_MSG_DIST
-        moist_msg = b'moist:%d' % moist if moist is not None else ERROR_MSG_MOIST
+        for _ in range(BACKLOG_MAX_BATCHES if fix_offline_times() else 0):
+            batch = offline_buffer.next_batch(BACKLOG_BATCH_SIZE)
+            if batch is None:
+                break
+            await client.publish(BACKLOG_TOPIC, batch[0], qos=MQTT_SENSOR_QOS)
+            offline_buffer.drop(batch[1])
+    except Exception as e:
+        log.error('FEHLER beim Nachliefern des Offline-Puffers: {}', e)
+    
+    lines = log.drain() if LOG_MQTT else None
+    if lines is not None:
+        try:
+            await client.publish(LOG_TOPIC, lines)
+        except Exception as e:
+            log.error('FEHLER beim Senden des Logs: {}', e)
+
+# =====================================================
+# AKTOR-REGELUNG
+# =====================================================
+
+# Regelung von Lüfter und Pumpe (siehe controller.py), None wenn
+# EDGE_CONTROL aus ist
+controller = None
+
+def init_controller(boot):
+    """
+    Erzeugt die Regelung für die Aktoren aus boot.py und leitet die
+    MQTT-Befehle für Lüfter und Pumpe an sie weiter
+    Args:
+        boot: boot Modul (Hardware und Steuerfunktionen)
+    """
+    global controller
+    if not EDGE_CONTROL:
+        return
+    
+    hardware = boot.hardware_devices
+    override_ms = MANUAL_OVERRIDE_TIME * 1000
+    controller = EdgeController((
+        # Index in readings: 0 Temperatur, 1 Luftfeuchtigkeit, 3 Bodenfeuchtigkeit
+        Actuator(LUEFTER_TOPIC, LUEFTER_STATE_TOPIC,
+                 lambda command: boot.control_luefter(command, hardware),
+                 ((0, FAN_TEMP_ON, FAN_TEMP_OFF), (1, FAN_HUMI_ON, FAN_HUMI_OFF)),
+                 override_ms),
+        Actuator(PUMPE_TOPIC, PUMPE_STATE_TOPIC,
+                 lambda command: boot.control_pumpe(command, hardware),
+                 ((3, PUMP_MOIST_ON, PUMP_MOIST_OFF),),
+                 override_ms),
+    ))
+    boot.controller = controller
+
+def update_actuators(readings):
+    """
+    Schaltet die Aktoren nach den aktuellen Messwerten (ohne MQTT)
+    """
+    if controller is not None:
+        controller.update(readings)
+
+def publish_actuator_states(client):
+    """
+    Sendet geänderte Aktor-Zustände (retained)
+    Raises: OSError bei Verbindungsfehler, der Zustand wird dann beim
+    nächsten Aufruf erneut gesendet
+    """
+    if controller is None:
+        return
+    for actuator in controller.actuators:
+        if actuator.changed:
+            client.publish(actuator.state_topic, actuator.state_message(),
+                           retain=True, qos=MQTT_QOS_LEVEL)
+            actuator.changed = False
+
+async def publish_actuator_states_async(client):
+    """
+    Wie publish_actuator_states, für den asyncio MQTT Client (umqttasync)
+    """
+    if controller is None:
+        return
+    try:
+        for actuator in controller.actuators:
+            if actuator.changed:
+                await client.publish(actuator.state_topic, actuator.state_message(),
+                                     retain=True, qos=MQTT_QOS_LEVEL)
+                actuator.changed = False
+    except Exception as e:
+        log.error('FEHLER beim Senden der Aktor-Zustände: {}', e)
+
+# =====================================================
+# SPEICHERVERWALTUNG
+# =====================================================
+
+def init_heap():
+    """
+    Räumt nach der Initialisierung auf und setzt die Sammel-Schwelle:
+    nach GC_THRESHOLD neu angelegten Bytes sammelt MicroPython, statt erst
+    bei vollem Heap mit einer langen Pause an beliebiger Stelle
+    """
+    global heap_base
+    gc.collect()
+    if GC_THRESHOLD > 0:
+        gc.threshold(GC_THRESHOLD)
+    heap_base = gc.mem_alloc()
+
+def collect_garbage():
+    """
+    Sammelt nach dem Senden, wenn keine Messung läuft. Mit
+    MEMORY_MONITORING wird gemeldet, wie viele Bytes seit der letzten
+    Sammlung angelegt wurden (zu wenig, falls GC_THRESHOLD dazwischen
+    eine Sammlung ausgelöst hat)
+    """
+    global heap_base
+    allocated = gc.mem_alloc() - heap_base
+    gc.collect()
+    heap_base = gc.mem_alloc()
+    if MEMORY_MONITORING:
+        log.info('Heap: {} Bytes seit der letzten Sammlung angelegt, {} Bytes frei',
+                 allocated, gc.mem_free())
+
+# =====================================================
+# ENERGIESPARBETRIEB
+# =====================================================
+
+def run_power_save(boot, sensors):
+    """
+    Energiesparbetrieb (POWER_MODE 'light' oder 'deep'): pro Zyklus
+    einmal messen, senden, auf die Bestätigungen warten und bis zum Ende
+    von PUBLISH_INTERVAL schlafen. Die Wachzeit eines Zyklus wird im
+    nächsten Zyklus auf AWAKE_TOPIC gesendet, beim Tiefschlaf
+    einschließlich Start, WLAN- und MQTT-Verbindung. Im Tiefschlaf halten
+    die Relais ihren Pegel, die Regelung samt manueller Übersteuerung wird
+    im RTC-Speicher fortgeführt.
+    Args:
+        boot: boot Modul (MQTT Client und Neuverbindung)
+        sensors: Liste mit Sensor-Objekten (init_sensors)
+    """
+    state = RTCState()
+    start = time.ticks_ms()
+    if woke_from_deepsleep() and state.load():
+        # Nach dem Tiefschlaf zählt die Wachzeit ab dem Neustart
+        start = 0
+        state.restore_filter(report_filter)
+        if controller is not None:
+            state.restore_controller(controller)
+        if boot.client is not None:
+            # publish_online in boot.py hat bereits Packet-IDs vergeben
+            boot.client.pid = max(boot.client.pid, state.pid)
+    if POWER_MODE == 'deep' and controller is not None:
+        # Erst nach dem Wiederherstellen freigeben, sonst schalten die
+        # Relais kurz auf den Startzustand aus boot.py
+        boot.hold_relays(False)
+    
+    readings = [None, None, None, None]
+    init_heap()
+    while True:
+        client = boot.client
+        try:
+            if client is None:
+                raise OSError('MQTT nicht verbunden')
+            # Keepalive und Befehle, die während des Schlafs eingetroffen sind
+            client.check_msg()
+        except OSError as e:
+            log.warning('MQTT Verbindungsfehler: {}', e)
+            boot.restart_and_reconnect()
+            client = boot.client
         
-        print('--- SENSORDATEN ---')
-        print('Temperatur:', temp_msg.decode())
-        print('Luftfeuchtigkeit:', humi_msg.decode())
-        print('Entfernung:', dist_msg.decode())
-        print('Bodenfeuchtigkeit:', moist_msg.decode())
+        readings[0], readings[1], _ = read_temperature_humidity(sensors)
+        readings[2] = read_distance(sensors, readings[0])
+        readings[3] = read_soil_moisture(sensors)
+        update_actuators(readings)
         
-        if MEMORY_MONITORING:
-            print('Freier Speicher:', gc.mem_free(), 'Bytes')
+        if client is None:
+            offline_buffer.push(time.time(), readings[0], readings[1], readings[2], readings[3])
+        else:
+            try:
+                if state.cycles:
+                    client.publish(AWAKE_TOPIC, b'awake_ms:%d cycle:%d' % (
+                        state.awake_ms, state.cycles), qos=MQTT_SENSOR_QOS)
+                publish_sensor_data(client, readings)
+                publish_actuator_states(client)
+                # Vor dem Schlafen die QoS-1 Bestätigungen abwarten
+                client.flush(POWER_FLUSH_TIMEOUT * 1000)
+            except OSError as e:
+                log.error('FEHLER beim Senden im Energiesparbetrieb: {}', e)
         
-        client.publish(TEMP_TOPIC, temp_msg)
-        client.publish(HUMI_TOPIC, humi_msg)
-        client.publish(DIST_TOPIC, dist_msg)
-        client.publish(MOIST_TOPIC, moist_msg)
+        if POWER_MODE == 'deep':
+            # RAM geht verloren: Rückstau in den Flash, Sitzung sauber
+            # beenden (der Broker behält sie, kein Last Will). Der Sprung
+            # der Uhr ist nach dem Neustart nicht mehr bekannt.
+            fix_offline_times()
+            offline_buffer.persist()
+            if client is not None:
+                try:
+                    client.disconnect()
+                except OSError:
+                    pass
+        else:
+            collect_garbage()
         
-        if DEBUG_MODE:
-            print('Daten erfolgreich an MQTT Topics gesendet')
+        state.cycles += 1
+        state.awake_ms = time.ticks_diff(time.ticks_ms(), start)
+        if client is not None:
+            state.pid = client.pid
+        state.store_filter(report_filter)
+        if controller is not None:
+            state.store_controller(controller)
+        state.save()
+        if POWER_MODE == 'deep' and controller is not None:
+            boot.hold_relays(True)
         
-    except Exception as e:
-        print('FEHLER beim Senden der MQTT-Daten:', e)
+        remaining = max(PUBLISH_INTERVAL * 1000 - state.awake_ms, 10)
+        log.debug('Zyklus {}: {} ms wach, schlafe {} ms', state.cycles, state.awake_ms, remaining)
+        powersave.sleep(POWER_MODE, remaining)
+        start = time.ticks_ms()
 
 # =====================================================
 # HAUPTPROGRAMM
@@ -264,88 +804,252 @@ def main():
     """
     sensors = init_sensors()
     if sensors is None:
-        print('KRITISCHER FEHLER: Sensoren konnten nicht initialisiert werden')
+        log.error('KRITISCHER FEHLER: Sensoren konnten nicht initialisiert werden')
         return
     
     # ===== INITIAL-MESSUNG =====
     if DEBUG_MODE:
-        print('\n=== ERSTE TESTMESSUNG ===')
+        log.debug('=== ERSTE TESTMESSUNG ===')
         
         try:
-            temperature, humidity = read_temperature_humidity(sensors)
-            distance = read_distance(sensors)
+            temperature, humidity, _ = read_temperature_humidity(sensors)
+            distance = read_distance(sensors, temperature)
             moisture = read_soil_moisture(sensors)
             
-            print('Test-Messung erfolgreich:')
-            print('- Temperatur:', temperature if temperature is not None else 'FEHLER')
-            print('- Luftfeuchtigkeit:', humidity if humidity is not None else 'FEHLER')
-            print('- Entfernung:', distance if distance is not None else 'FEHLER')
-            print('- Bodenfeuchtigkeit:', moisture if moisture is not None else 'FEHLER')
+            log.debug('Test-Messung erfolgreich:')
+            log.debug('- Temperatur: {}', temperature if temperature is not None else 'FEHLER')
+            log.debug('- Luftfeuchtigkeit: {}', humidity if humidity is not None else 'FEHLER')
+            log.debug('- Entfernung: {}', distance if distance is not None else 'FEHLER')
+            log.debug('- Bodenfeuchtigkeit: {}', moisture if moisture is not None else 'FEHLER')
             
         except Exception as e:
-            print('FEHLER bei Test-Messung:', e)
+            log.error('FEHLER bei Test-Messung: {}', e)
     
     # ===== MQTT CLIENT AUS BOOT.PY VERWENDEN =====
     try:
-        from boot import client
-        print('\n=== HAUPTSCHLEIFE GESTARTET ===')
-        print('Messintervall: {} Sekunden'.format(MESSAGE_INTERVAL))
+        import boot
+        client = boot.client
+        init_controller(boot)
         
     except ImportError:
-        print('FEHLER: MQTT Client aus boot.py nicht verfügbar')
+        log.error('FEHLER: MQTT Client aus boot.py nicht verfügbar')
+        return
+    
+    if POWER_MODE != 'on':
+        log.info('=== ENERGIESPARBETRIEB ({}) ===', POWER_MODE)
+        try:
+            run_power_save(boot, sensors)
+        except KeyboardInterrupt:
+            log.info('Programm durch Benutzer beendet')
         return
     
+    log.info('=== HAUPTSCHLEIFE GESTARTET ===')
+    log.info('Messintervalle: DHT22 {}s, Ultraschall {}s, Feuchtigkeit {}s, Senden {}s',
+             DHT_INTERVAL, ULTRASONIC_INTERVAL, MOISTURE_INTERVAL, PUBLISH_INTERVAL)
+    
+    # ===== MESSAUFGABEN =====
+    # Jeder Sensor hat sein eigenes Intervall, gesendet werden die
+    # jeweils zuletzt gemessenen Werte
+    readings = [None, None, None, None]
+    
+    def sample_dht():
+        # Misst, falls fällig, und plant sich zum nächsten Schritt des
+        # DHTReader (Intervall, Wiederholung oder Abkühlzeit) neu ein. Die
+        # Messung läuft nur einmal pro Einplanung, sie wird deshalb auch
+        # nach einem Fehler neu eingeplant.
+        delay_ms = DHT_RETRY_DELAY * 1000
+        try:
+            readings[0], readings[1], delay_ms = read_temperature_humidity(sensors)
+            update_actuators(readings)
+        finally:
+            if delay_ms is not None:
+                schedule_dht(delay_ms)
+    
+    def sample_distance():
+        # Letzte Temperatur für die Schallgeschwindigkeit
+        readings[2] = read_distance(sensors, readings[0])
+    
+    def sample_moisture():
+        readings[3] = read_soil_moisture(sensors)
+        update_actuators(readings)
+    
+    def publish():
+        log.debug('--- NEUE MESSUNG ---')
+        publish_sensor_data(client, readings)
+        collect_garbage()
+    
+    def mqtt_housekeeping():
+        # Keepalive-Ping und Wiederholung unbestätigter QoS-1 Nachrichten
+        client.check_msg()
+    
+    scheduler = Scheduler()
+    if SAMPLING_MODE == 'timer':
+        # Messungen über Hardware-Timer (siehe timersampler.py), die
+        # Hauptschleife wird nur noch für MQTT geweckt
+        sampler = TimerSampler(EVENT_QUEUE_SIZE, SAMPLING_FIRST_TIMER)
+        dht_slot = sampler.add(sample_dht)
+        
+        def schedule_dht(delay_ms):
+            sampler.start(dht_slot, delay_ms, periodic=False)
+        
+        sampler.every(ULTRASONIC_INTERVAL * 1000, sample_distance)
+        sampler.every(MOISTURE_INTERVAL * 1000, sample_moisture)
+        # Erste Messungen sofort, damit der erste Sendevorgang Werte hat
+        sample_dht()
+        sample_distance()
+        sample_moisture()
+    else:
+        sampler = None
+        
+        def schedule_dht(delay_ms):
+            scheduler.after(delay_ms, sample_dht)
+        
+        scheduler.after(0, sample_dht)
+        scheduler.every(ULTRASONIC_INTERVAL * 1000, sample_distance)
+        scheduler.every(MOISTURE_INTERVAL * 1000, sample_moisture)
+    # Bei gleicher Fälligkeit laufen die Aufgaben in dieser Reihenfolge,
+    # der erste Sendevorgang kommt also nach den ersten Messungen
+    scheduler.every(PUBLISH_INTERVAL * 1000, publish)
+    scheduler.every(max(min(MQTT_RETRY_TIMEOUT * 500, MQTT_KEEPALIVE * 100,
+                            MQTT_PING_TIMEOUT * 500), 100), mqtt_housekeeping)
+    
     # ===== HAUPTSCHLEIFE =====
-    last_message_time = 0
+    # Schläft in poll() bis zum nächsten Termin oder bis eine MQTT-Nachricht
+    # eintrifft, statt alle 100 ms nachzusehen
+    poller = None
+    init_heap()
     
     while True:
         try:
-            client.check_msg()
+            if poller is None:
+                if client is None:
+                    raise OSError('MQTT nicht verbunden')
+                poller = select.poll()
+                poller.register(client.sock, select.POLLIN)
             
-            current_time = time.ticks_ms()
+            if poller.poll(scheduler.next_delay()):
+                client.check_msg()
             
-            if time.ticks_diff(current_time, last_message_time) >= MESSAGE_INTERVAL * 1000:
-                if DEBUG_MODE:
-                    print('\n--- NEUE MESSUNG ---')
-                
-                # Sensoren auslesen
-                temperature, humidity = read_temperature_humidity(sensors)
-                distance = read_distance(sensors)
-                moisture = read_soil_moisture(sensors)
-                
-                # Daten via MQTT senden
-                publish_sensor_data(client, temperature, humidity, distance, moisture)
-                
-                last_message_time = current_time
-                
-                if MEMORY_MONITORING:
-                    gc.collect()
-            
-            time.sleep(0.1)
+            scheduler.run_due()
+            # Zustandsänderungen durch Messungen oder Befehle melden
+            publish_actuator_states(client)
             
         except KeyboardInterrupt:
-            print('\n\nProgramm durch Benutzer beendet')
-            
+            log.info('Programm durch Benutzer beendet')
+            if sampler is not None:
+                sampler.stop()
             break
             
         except OSError as e:
-            print('MQTT Verbindungsfehler:', e)
+            log.warning('MQTT Verbindungsfehler: {}', e)
+            poller = None
             try:
                 # Versuche Neuverbindung
-                from boot import restart_and_reconnect
-                restart_and_reconnect()
+                boot.restart_and_reconnect()
+                client = boot.client
             except:
-                print('Neuverbindung fehlgeschlagen - Programm beendet')
+                log.error('Neuverbindung fehlgeschlagen - Programm beendet')
                 break
                 
         except Exception as e:
-            print('UNERWARTETER FEHLER in Hauptschleife:', e)
+            log.error('UNERWARTETER FEHLER in Hauptschleife: {}', e)
             if DEBUG_MODE:
                 import sys
                 sys.print_exception(e)
             
             time.sleep(10)
 
+# =====================================================
+# HAUPTPROGRAMM (ASYNCIO)
+# =====================================================
+
+async def sample_task(interval, sample):
+    """
+    Ruft sample() alle interval Sekunden auf, jeder Sensor hat seinen
+    eigenen Task. Wartezeiten bei Wiederholungsversuchen blockieren
+    keine anderen Tasks.
+    """
+    while True:
+        start = time.ticks_ms()
+        await sample()
+        
+        remaining = interval * 1000 - time.ticks_diff(time.ticks_ms(), start)
+        await asyncio.sleep(max(remaining, 0) / 1000)
+
+async def publish_task(client, readings):
+    """
+    Sendet alle PUBLISH_INTERVAL Sekunden die zuletzt gemessenen Werte
+    """
+    while True:
+        await asyncio.sleep(PUBLISH_INTERVAL)
+        log.debug('--- NEUE MESSUNG ---')
+        await publish_sensor_data_async(client, readings)
+        collect_garbage()
+
+async def connection_task(client):
+    """
+    Überwacht die MQTT-Verbindung und verbindet bei Fehlern neu
+    """
+    from boot import reconnect_async
+    while True:
+        error = await client.wait_error()
+        log.warning('MQTT Verbindungsfehler: {}', error)
+        await reconnect_async(client)
+
+async def main_async():
+    """
+    Task-basierte Hauptfunktion: Empfang (im MQTT Client), Sensormessung
+    und Senden laufen nebenläufig, Aktor-Befehle warten nicht mehr auf
+    die Messung
+    """
+    sensors = init_sensors()
+    if sensors is None:
+        log.error('KRITISCHER FEHLER: Sensoren konnten nicht initialisiert werden')
+        return
+    
+    import boot
+    init_controller(boot)
+    client = await boot.connect_and_subscribe_async()
+    log.info('=== HAUPTSCHLEIFE (ASYNCIO) GESTARTET ===')
+    log.info('Messintervalle: DHT22 {}s, Ultraschall {}s, Feuchtigkeit {}s, Senden {}s',
+             DHT_INTERVAL, ULTRASONIC_INTERVAL, MOISTURE_INTERVAL, PUBLISH_INTERVAL)
+    
+    # Temperatur, Luftfeuchtigkeit, Entfernung, Bodenfeuchtigkeit
+    readings = [None, None, None, None]
+    
+    async def sample_dht():
+        # Wie in main(): schläft bis zum nächsten Schritt des DHTReader,
+        # ein Fehler beendet den Task nicht
+        while True:
+            delay_ms = DHT_RETRY_DELAY * 1000
+            try:
+                readings[0], readings[1], delay_ms = read_temperature_humidity(sensors)
+                update_actuators(readings)
+            except Exception as e:
+                log.error('FEHLER bei der DHT22-Messung: {}', e)
+            await publish_actuator_states_async(client)
+            if delay_ms is None:
+                return
+            await asyncio.sleep(delay_ms / 1000)
+    
+    async def sample_distance():
+        readings[2] = await read_distance_async(sensors, readings[0])
+    
+    async def sample_moisture():
+        readings[3] = read_soil_moisture(sensors)
+        update_actuators(readings)
+        # Meldet auch Änderungen durch MQTT-Befehle
+        await publish_actuator_states_async(client)
+    
+    init_heap()
+    await asyncio.gather(
+        sample_dht(),
+        sample_task(ULTRASONIC_INTERVAL, sample_distance),
+        sample_task(MOISTURE_INTERVAL, sample_moisture),
+        publish_task(client, readings),
+        connection_task(client),
+    )
+
 # =====================================================
 # PROGRAMM STARTEN
 # =====================================================
@@ -357,7 +1061,10 @@ if __name__ == "__main__":
     print('='*50)
     
     # Hauptprogramm ausführen
-    main()
+    if ASYNC_MODE:
+        asyncio.run(main_async())
+    else:
+        main()
     
     print('\nSENSOR SYSTEM BEENDET')
 else:
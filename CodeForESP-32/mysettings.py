@@ -5,7 +5,11 @@
 # =====================================================
 # HARDWARE PIN KONFIGURATION
 # =====================================================
-from machine import ADC, Pin
+try:
+    from machine import ADC, Pin
+except ImportError:
+    # Import auf dem Raspberry Pi (CodeForRaspberryPi/ingest.py), dort gibt es kein machine
+    ADC = None
 
 # === SENSOREN ===
 # DHT22 Temperatursensor Pin
@@ -16,10 +20,15 @@ DHT22PIN = 21
 ULTRASONIC_TRIGGER_PIN = 26
 ULTRASONIC_ECHO_PIN = 14
 ULTRASONIC_TIMEOUT_US = 10000  # Timeout in Mikrosekunden
+ULTRASONIC_BURST_COUNT = 5     # Einzelmessungen pro Entfernungswert (Median)
+ULTRASONIC_BURST_GAP_MS = 60   # Mindestabstand zwischen zwei Messungen laut Datenblatt
 
 # Bodenfeuchtigkeitssensor (analoger Sensor)
 MOISTURE_SENSOR_PIN = 34  
 
+# Weitere Beete: zusätzliche ADC-Pins anhängen (der erste Pin wird gesendet)
+MOISTURE_SENSOR_PINS = (MOISTURE_SENSOR_PIN,)
+
 # BMP280 Pins (nicht verwendet, war aber bereits im Code)
 BMP280_SCL_PIN = 22  
 BMP280_SDA_PIN = 21  
@@ -37,8 +46,18 @@ LUEFTER_PWM_DUTY_OFF = 18
 PUMPE_RELAIS_PIN = 19  
 
 # ADC Konfiguration für Feuchtigkeitssensor
-ADC_WIDTH = ADC.WIDTH_12BIT    # 12-bit Auflösung (0-4095)
-ADC_ATTENUATION = ADC.ATTN_11DB # Messbereich bis ~3.3V
+if ADC is not None:
+    ADC_WIDTH = ADC.WIDTH_12BIT    # 12-bit Auflösung (0-4095)
+    ADC_ATTENUATION = ADC.ATTN_11DB # Messbereich bis ~3.3V
+else:
+    ADC_WIDTH = 3
+    ADC_ATTENUATION = 3
+
+# Mehrfachmessung der Bodenfeuchtigkeit gegen ADC-Rauschen
+MOISTURE_SAMPLES = 15             # Einzelmessungen pro Kanal (max. ca. 64)
+MOISTURE_FILTER = 'median'        # 'median' oder 'trimmed' (getrimmter Mittelwert)
+MOISTURE_TRIM_PERCENT = 20        # Verworfener Anteil an jedem Ende bei 'trimmed'
+MOISTURE_BUDGET_US = 5000         # Maximale Abtastdauer pro Kanal (0 = unbegrenzt)
 
 # Bodenfeuchtigkeits-Schwellwerte für Interpretation
 MOISTURE_DRY_THRESHOLD = 2000     # Werte über diesem Wert = trocken
@@ -50,16 +69,63 @@ MOISTURE_WET_THRESHOLD = 1500     # Werte unter diesem Wert = sehr feucht
 
 # Messintervall zwischen Sensormessungen (in Sekunden)
 MESSAGE_INTERVAL = 10
+message_interval = MESSAGE_INTERVAL  # Rückwärtskompatibilität (main.py)
+
+# Eigene Intervalle pro Sensor und für das Senden (in Sekunden)
+PUBLISH_INTERVAL = MESSAGE_INTERVAL
+DHT_INTERVAL = 5            # DHT22: mindestens 2 Sekunden
+DHT_RETRY_DELAY = 2         # Wartezeit nach fehlgeschlagener DHT22-Messung
+DHT_MAX_AGE = 30            # Ältere DHT22-Werte werden als Fehler gesendet
+ULTRASONIC_INTERVAL = 1
+MOISTURE_INTERVAL = 1
+
+# Auslösung der Messungen: 'timer' über machine.Timer und
+# micropython.schedule (unabhängig von MQTT-Verkehr), 'loop' über den
+# Termin-Planer der Hauptschleife. Im ASYNC_MODE ohne Wirkung.
+SAMPLING_MODE = 'timer'
+SAMPLING_FIRST_TIMER = 0    # Hardware-Timer 0-2 für DHT22, Ultraschall, Feuchtigkeit
+EVENT_QUEUE_SIZE = 8        # Anstehende Timer-Ereignisse bis zur Ausführung
+
+# Energiesparbetrieb für Solar-/Akku-Boxen: 'on' (immer wach), 'light'
+# (Light-Sleep zwischen den Zyklen) oder 'deep' (Deep-Sleep, Neustart bei
+# jedem Zyklus, Zustand im RTC-Speicher). Pro Zyklus wird einmal
+# gemessen und gesendet, dann bis zum Ende von PUBLISH_INTERVAL geschlafen.
+# Mit EDGE_CONTROL halten die Relais im Deep-Sleep ihren Zustand.
+POWER_MODE = 'on'
+POWER_FLUSH_TIMEOUT = 5     # Sekunden, die vor dem Schlafen höchstens auf PUBACKs gewartet wird
 
 # WLAN Verbindungs-Timeout (in Sekunden)
 WLAN_TIMEOUT = 20
+WLAN_POLL_MS = 20           # Abfrageintervall für den Verbindungsstatus (in ms)
+
+# Schneller Start: Kanal/BSSID des Access Points und die IP-Adresse des
+# Brokers werden im Flash zwischengespeichert, der Ablauf des Starts
+# wird einmal auf BOOT_TOPIC gesendet
+FAST_BOOT = True
+FASTBOOT_WLAN_TIMEOUT = 3   # Sekunden für den gespeicherten Access Point, danach neue Suche
+FASTBOOT_CACHE_FILE = 'netcache.json'
+DNS_CACHE_TTL = 3600        # Sekunden bis MQTT_SERVER neu aufgelöst wird
+
+# Zeitserver, mit dem die Uhr nach der WLAN-Verbindung gestellt wird
+# (Zeitstempel der Binär-Frames und des Offline-Puffers)
+NTP_SERVER = 'pool.ntp.org'
 
 # MQTT Keep-Alive Intervall (in Sekunden)
+# Der Client sendet nach MQTT_KEEPALIVE/2 ohne Verkehr selbstständig ein PING
 MQTT_KEEPALIVE = 30
 
-# Neuverbindungs-Wartezeit bei Fehlern (in Sekunden)
+# Maximale Wartezeit auf die PING-Antwort, danach gilt die Verbindung als tot (in Sekunden)
+MQTT_PING_TIMEOUT = 5
+
+# Neuverbindungs-Wartezeit vor einem Neustart, wenn die schnelle
+# Neuverbindung fehlgeschlagen ist (in Sekunden)
 RECONNECT_DELAY = 30
 
+# Schnelle Neuverbindung mit exponentiellem Backoff (in Millisekunden)
+RECONNECT_MIN_BACKOFF_MS = 100
+RECONNECT_MAX_BACKOFF_MS = 10000
+RECONNECT_ATTEMPTS = 8
+
 # =====================================================
 # MQTT BROKER KONFIGURATION
 # =====================================================
@@ -73,6 +139,28 @@ MQTT_PORT = 1883
 MQTT_QOS_LEVEL = 1        
 MQTT_RETAIN_MESSAGES = True
 
+# Persistente Session: Broker behält Abos und QoS-1 Nachrichten über
+# Verbindungsabbrüche hinweg, erneutes Abonnieren entfällt
+MQTT_CLEAN_SESSION = False
+
+# QoS für Sensordaten (0 = ohne Bestätigung, 1 = mit PUBACK)
+MQTT_SENSOR_QOS = 1
+
+# Format der Sensordaten:
+# 'text'   = vier Text-Nachrichten pro Messung (TEMP_TOPIC, HUMI_TOPIC, ...)
+# 'packed' = ein 16-Byte Binär-Frame pro Messung auf PACKED_TOPIC
+#            (Aufbau siehe sensorframe.py, Decoder in CodeForRaspberryPi/framedecoder.py)
+PAYLOAD_FORMAT = 'text'
+
+# Maximale Anzahl unbestätigter QoS-1 Nachrichten (0 = blockierend auf PUBACK warten)
+MQTT_INFLIGHT_WINDOW = 8
+
+# Wartezeit bis eine unbestätigte QoS-1 Nachricht erneut gesendet wird (in Sekunden)
+MQTT_RETRY_TIMEOUT = 5
+
+# Bleibt das Fenster so lange voll, gilt die Verbindung als tot (in Sekunden)
+MQTT_WINDOW_TIMEOUT = 30
+
 # =====================================================
 # MQTT TOPICS FÜR SENSORDATEN
 # =====================================================
@@ -81,6 +169,11 @@ TEMP_TOPIC = b'DLN/test/temp'        # Temperatur vom DHT22
 HUMI_TOPIC = b'DLN/test/humi'        # Luftfeuchtigkeit vom DHT22  
 DIST_TOPIC = b'DLN/test/dist'        # Entfernung vom Ultraschallsensor
 MOIST_TOPIC = b'DLN/test/moist'      # Bodenfeuchtigkeit vom analogen Sensor
+PACKED_TOPIC = b'DLN/test/packed'    # Alle Werte als Binär-Frame (PAYLOAD_FORMAT = 'packed')
+STATS_TOPIC = b'DLN/test/stats'      # Gesendete/unterdrückte Messwerte (Report-by-Exception)
+AWAKE_TOPIC = b'DLN/test/awake'      # Wachzeit pro Zyklus im Energiesparbetrieb
+BOOT_TOPIC = b'DLN/test/boot'        # Ablauf des Starts (ms seit Reset je Phase)
+LOG_TOPIC = b'DLN/test/log'          # Neue Log-Zeilen aus dem Ringpuffer (siehe LOG_MQTT)
 
 # =====================================================
 # MQTT TOPICS FÜR AKTOREN 
@@ -88,6 +181,8 @@ MOIST_TOPIC = b'DLN/test/moist'      # Bodenfeuchtigkeit vom analogen Sensor
 
 LUEFTER_TOPIC = b'DLN/test/luefter'  # Lüfter-Steuerung
 PUMPE_TOPIC = b'DLN/test/pumpe'      # Pumpen-Steuerung 
+LUEFTER_STATE_TOPIC = b'DLN/test/luefter/state'  # Lüfter-Zustand (retained)
+PUMPE_STATE_TOPIC = b'DLN/test/pumpe/state'      # Pumpen-Zustand (retained)
 
 # =====================================================
 # MQTT SYSTEM TOPICS
@@ -103,8 +198,41 @@ STATUS_TOPIC = b'DLN/test/status'
 
 DEBUG_MODE = True
 
+# =====================================================
+# LOGGING
+# =====================================================
+# Stufen: 'debug', 'info', 'warning', 'error', 'off'
+# Alles ab LOG_LEVEL landet im Ringpuffer im RAM, abgeschaltete Stufen
+# kosten keine Formatierung und keinen Speicher. Mit 'debug' (Standard
+# bei DEBUG_MODE) formatiert jeder Messzyklus mehrere Zeilen, ohne neue
+# Objekte pro Sendevorgang läuft die Hauptschleife nur ab 'info' und
+# ohne MEMORY_MONITORING (siehe tests/test_alloc.py)
+LOG_LEVEL = 'debug' if DEBUG_MODE else 'info'
+LOG_BUFFER_SIZE = 2048          # Größe des Ringpuffers in Bytes
+
+# Ausgabe über UART/REPL erst ab dieser Stufe (print blockiert bei
+# 115200 Baud ca. 87 us pro Zeichen)
+LOG_UART_LEVEL = 'info'
+
+# Fehler zusätzlich im Flash speichern, bei LOG_FILE_SIZE Bytes wird die
+# Datei nach LOG_FILE + '.old' verschoben
+LOG_FILE = 'log.txt'
+LOG_FILE_LEVEL = 'error'
+LOG_FILE_SIZE = 8192
+
+# Neue Log-Zeilen mit jeder Messung auf LOG_TOPIC senden
+LOG_MQTT = False
+
+# Hauptprogramm mit asyncio (umqttasync) statt blockierender Hauptschleife
+ASYNC_MODE = False
+
 MEMORY_MONITORING = True
 
+# Speicherbereinigung: gesammelt wird nach jedem Sendevorgang und
+# zusätzlich nach GC_THRESHOLD neu angelegten Bytes (gc.threshold),
+# 0 = nur bei vollem Heap
+GC_THRESHOLD = 8192
+
 AUTO_RESTART_ON_ERROR = False
 
 MSG_DEVICE_ONLINE = " ist online"
@@ -112,6 +240,7 @@ MSG_DEVICE_OFFLINE = " ist offline"
 
 CMD_ON = b'on'
 CMD_OFF = b'off'
+CMD_AUTO = b'auto'                # Manuelle Übersteuerung beenden
 CMD_RECEIVED = b'received'
 
 ERROR_MSG_TEMP = b'temp:ERROR'
@@ -119,6 +248,86 @@ ERROR_MSG_HUMI = b'humi:ERROR'
 ERROR_MSG_DIST = b'distance:ERROR'
 ERROR_MSG_MOIST = b'moist:ERROR'
 
+# =====================================================
+# REPORT-BY-EXCEPTION
+# =====================================================
+
+# Ein Messwert wird nur gesendet, wenn er sich seit dem zuletzt gesendeten
+# Wert um mehr als max(ABS, REL * |letzter Wert|) geändert hat, beim
+# Wechsel zwischen Messwert und Fehler, oder spätestens nach
+# REPORT_MAX_SILENCE Sekunden (Heartbeat). REPORT_MAX_SILENCE = 0 sendet
+# wie bisher jeden Messwert.
+TEMP_DEADBAND_ABS = 0.2           # °C
+TEMP_DEADBAND_REL = 0.0
+HUMI_DEADBAND_ABS = 1.0           # %
+HUMI_DEADBAND_REL = 0.0
+DIST_DEADBAND_ABS = 0.5           # cm
+DIST_DEADBAND_REL = 0.01          # 1 % des letzten Werts
+MOIST_DEADBAND_ABS = 20           # ADC-Schritte
+MOIST_DEADBAND_REL = 0.0
+REPORT_MAX_SILENCE = 300          # Sekunden
+
+# Abstand, in dem die Zähler auf STATS_TOPIC gesendet werden (in Sekunden, 0 = aus)
+STATS_INTERVAL = 600
+
+# =====================================================
+# AKTOR-REGELUNG AUF DEM ESP-32
+# =====================================================
+
+# Lüfter und Pumpe werden direkt nach jeder Messung geschaltet (statt
+# über die Auto-Lüfter/Auto-Pumpe Knoten in Node-RED). Eingeschaltet wird
+# oberhalb von ON, ausgeschaltet erst unterhalb von OFF. Bei Sensorfehler
+# wird die Regel als "aus" gewertet.
+EDGE_CONTROL = True
+
+FAN_TEMP_ON = 35                  # °C
+FAN_TEMP_OFF = 33
+FAN_HUMI_ON = 40                  # %
+FAN_HUMI_OFF = 37
+PUMP_MOIST_ON = 2000              # ADC-Wert (hoch = trocken)
+PUMP_MOIST_OFF = 1800
+
+# Ein Befehl on/off auf LUEFTER_TOPIC/PUMPE_TOPIC übersteuert die Regelung
+# für diese Zeit (in Sekunden, 0 = bis zum Befehl auto)
+MANUAL_OVERRIDE_TIME = 1800
+
+# =====================================================
+# OFFLINE-PUFFER (STORE-AND-FORWARD)
+# =====================================================
+
+# Nicht gesendete Messwerte werden zwischengespeichert und nach der
+# Neuverbindung blockweise auf BACKLOG_TOPIC nachgeliefert
+# (eine Zeile "zeitstempel;temp;humi;dist;moist" pro Messung)
+BACKLOG_TOPIC = b'DLN/test/backlog'
+
+OFFLINE_BUFFER_SIZE = 64          # Datensätze im RAM
+OFFLINE_SPILL_FILE = 'offline.bin'
+OFFLINE_SPILL_SIZE = 4096         # Datensätze im Flash (20 Bytes pro Datensatz)
+BACKLOG_BATCH_SIZE = 32           # Datensätze pro MQTT-Nachricht
+BACKLOG_MAX_BATCHES = 2           # Nachrichten pro Messzyklus (Ratenbegrenzung)
+
+# =====================================================
+# INGEST-DIENST (RASPBERRY PI)
+# =====================================================
+
+# Einstellungen für CodeForRaspberryPi/ingest.py, auf dem ESP-32 unbenutzt
+INGEST_CLIENT_ID = b'smartgarden-ingest'
+INGEST_TOPIC = b'DLN/test/#'      # Abonnierte Sensor-Topics
+INGEST_BATCH_SIZE = 4096          # Werte pro Messreihe bis zum Schreiben
+INGEST_FLUSH_INTERVAL = 5         # Spätestens nach so vielen Sekunden schreiben
+INGEST_DATA_DIR = 'data'          # Zielverzeichnis auf dem Raspberry Pi
+
+# Zeitstempel kommen immer vom ESP-32. Werte ohne Zeitstempel (Uhr nicht
+# gestellt) oder mit Zeit außerhalb dieses Fensters um die Uhr des Pi
+# werden verworfen.
+INGEST_MAX_CLOCK_SKEW = 300       # Sekunden, die das Gerät vorgehen darf
+INGEST_MAX_AGE = 30 * 86400       # Älteste angenommene Messung (Rückstau)
+
+# Abfrage-Dienst für die Dashboard-Diagramme (CodeForRaspberryPi/query.py)
+QUERY_PORT = 8080
+QUERY_CACHE_SIZE = 64             # Zwischengespeicherte Abfrage-Ergebnisse
+QUERY_MAX_POINTS = 5000           # Obergrenze für den Parameter points
+
 # =====================================================
 # LIMITS
 # =====================================================
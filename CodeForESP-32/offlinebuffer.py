@@ -0,0 +1,237 @@
+from array import array
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+import log
+
+# Ein Datensatz: Zeitstempel (s) + Temperatur, Luftfeuchtigkeit,
+# Entfernung, Bodenfeuchtigkeit. Fehlende Werte werden als NaN gespeichert.
+FIELDS = 4
+RECORD_FMT = '<iffff'
+RECORD_SIZE = struct.calcsize(RECORD_FMT)
+NAN = float('nan')
+
+class FlashRing:
+    """
+    Ringpuffer fester Größe in einer Datei im Flash.
+    Die Datei hat einen 8-Byte Kopf (Start-Index, Anzahl) und danach
+    capacity Datensätze; sie wächst nie über diese Größe hinaus.
+    """
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
+        try:
+            with open(path, 'rb') as f:
+                self.head, self.count = struct.unpack('<II', f.read(8))
+            if self.head >= capacity or self.count > capacity:
+                raise ValueError('Ungültiger Kopf')
+        except (OSError, ValueError):
+            self.head = self.count = 0
+            with open(path, 'wb') as f:
+                f.write(struct.pack('<II', 0, 0))
+
+    def __len__(self):
+        return self.count
+
+    def _write_header(self, f):
+        f.seek(0)
+        f.write(struct.pack('<II', self.head, self.count))
+
+    def append(self, records):
+        """
+        Hängt gepackte Datensätze an, bei vollem Puffer werden die ältesten überschrieben
+        Args:
+            records: Liste von Bytes-Objekten mit je RECORD_SIZE Bytes
+        """
+        with open(self.path, 'r+b') as f:
+            for rec in records:
+                slot = (self.head + self.count) % self.capacity
+                f.seek(8 + slot * RECORD_SIZE)
+                f.write(rec)
+                if self.count < self.capacity:
+                    self.count += 1
+                else:
+                    self.head = (self.head + 1) % self.capacity
+            self._write_header(f)
+
+    def peek(self, n):
+        """
+        Returns: Liste der ältesten (bis zu n) Datensätze als Tupel
+        """
+        n = min(n, self.count)
+        out = []
+        with open(self.path, 'rb') as f:
+            for i in range(n):
+                f.seek(8 + ((self.head + i) % self.capacity) * RECORD_SIZE)
+                out.append(struct.unpack(RECORD_FMT, f.read(RECORD_SIZE)))
+        return out
+
+    def drop(self, n):
+        """
+        Entfernt die ältesten n Datensätze
+        """
+        n = min(n, self.count)
+        self.head = (self.head + n) % self.capacity
+        self.count -= n
+        with open(self.path, 'r+b') as f:
+            self._write_header(f)
+
+    def shift_times(self, before, delta):
+        """
+        Verschiebt alle Zeitstempel kleiner als before um delta Sekunden
+        """
+        with open(self.path, 'r+b') as f:
+            for i in range(self.count):
+                pos = 8 + ((self.head + i) % self.capacity) * RECORD_SIZE
+                f.seek(pos)
+                ts = struct.unpack('<i', f.read(4))[0]
+                if ts < before:
+                    f.seek(pos)
+                    f.write(struct.pack('<i', ts + delta))
+
+class OfflineBuffer:
+    """
+    Zwischenspeicher für Messwerte, die nicht gesendet werden konnten.
+
+    Die neuesten Werte liegen in einem vorab angelegten Ringpuffer im RAM
+    (array). Läuft er voll, werden die ältesten spill_chunk Datensätze in
+    einen FlashRing ausgelagert; ist auch dieser voll, gehen die ältesten
+    Werte verloren. Der Speicherbedarf ist damit unabhängig von der Dauer
+    eines Ausfalls begrenzt.
+    """
+    def __init__(self, capacity, spill_path=None, spill_capacity=0, spill_chunk=8):
+        self.capacity = capacity
+        self.ts = array('i', [0] * capacity)
+        self.values = array('f', [0.0] * (capacity * FIELDS))
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+        self.spill_chunk = min(spill_chunk, capacity)
+        self.flash = None
+        if spill_path and spill_capacity:
+            try:
+                self.flash = FlashRing(spill_path, spill_capacity)
+            except OSError as e:
+                log.warning('WARNUNG: Flash-Puffer nicht verfügbar: {}', e)
+
+    def __len__(self):
+        return self.count + (len(self.flash) if self.flash is not None else 0)
+
+    def push(self, ts, temp, humi, dist, moist):
+        """
+        Speichert einen Messwert-Satz, None wird als NaN abgelegt
+        """
+        if self.count == self.capacity:
+            self._spill(self.spill_chunk)
+        slot = (self.head + self.count) % self.capacity
+        self.ts[slot] = int(ts)
+        i = slot * FIELDS
+        values = self.values
+        values[i] = NAN if temp is None else temp
+        values[i + 1] = NAN if humi is None else humi
+        values[i + 2] = NAN if dist is None else dist
+        values[i + 3] = NAN if moist is None else moist
+        self.count += 1
+
+    def _spill(self, n):
+        # Älteste Datensätze aus dem RAM in den Flash verschieben (oder verwerfen)
+        if self.flash is not None:
+            self.flash.append([struct.pack(RECORD_FMT, *rec) for rec in self._peek_ram(n)])
+        else:
+            self.dropped += n
+        self.head = (self.head + n) % self.capacity
+        self.count -= n
+
+    def persist(self):
+        """
+        Verschiebt alle Datensätze aus dem RAM in den Flash, z.B. vor dem
+        Tiefschlaf (ohne Flash-Puffer bleiben sie im RAM)
+        """
+        if self.flash is not None and self.count:
+            self._spill(self.count)
+
+    def shift_times(self, before, delta):
+        """
+        Verschiebt alle Zeitstempel kleiner als before um delta Sekunden,
+        z.B. wenn die Uhr nach den Messungen erst gestellt wurde
+        """
+        if self.flash is not None:
+            self.flash.shift_times(before, delta)
+        for k in range(self.count):
+            slot = (self.head + k) % self.capacity
+            if self.ts[slot] < before:
+                self.ts[slot] += delta
+
+    def _peek_ram(self, n):
+        out = []
+        for k in range(min(n, self.count)):
+            slot = (self.head + k) % self.capacity
+            i = slot * FIELDS
+            v = self.values
+            out.append((self.ts[slot], v[i], v[i + 1], v[i + 2], v[i + 3]))
+        return out
+
+    def peek(self, n):
+        """
+        Returns: die ältesten (bis zu n) Datensätze, zuerst aus dem Flash
+        """
+        out = self.flash.peek(n) if self.flash is not None else []
+        if len(out) < n:
+            out.extend(self._peek_ram(n - len(out)))
+        return out
+
+    def drop(self, n):
+        """
+        Entfernt die ältesten n Datensätze (nach erfolgreichem Senden)
+        """
+        if self.flash is not None:
+            k = min(n, len(self.flash))
+            self.flash.drop(k)
+            n -= k
+        n = min(n, self.count)
+        self.head = (self.head + n) % self.capacity
+        self.count -= n
+
+    def next_batch(self, batch_size):
+        """
+        Baut aus den ältesten (bis zu batch_size) Datensätzen eine
+        MQTT-Nachricht mit einer Zeile "ts;temp;humi;dist;moist" je
+        Datensatz, fehlende Werte bleiben leer. Die Datensätze bleiben
+        gespeichert, bis drop() nach erfolgreichem Senden aufgerufen wird.
+        Returns: (payload, Anzahl Datensätze) oder None wenn leer
+        """
+        records = self.peek(batch_size)
+        if not records:
+            return None
+        out = bytearray()
+        for rec in records:
+            if out:
+                out += b'\n'
+            out += b'%d' % rec[0]
+            for k in range(1, FIELDS + 1):
+                out += b';'
+                if rec[k] == rec[k]:  # NaN ist ungleich sich selbst
+                    out += (b'%d' if k == FIELDS else b'%.1f') % rec[k]
+        return out, len(records)
+
+    def drain(self, client, topic, batch_size, max_batches, qos=0):
+        """
+        Sendet den Rückstau in Blöcken von batch_size Datensätzen, eine
+        MQTT-Nachricht pro Block. Pro Aufruf werden höchstens max_batches
+        Blöcke gesendet, so wird der Broker nach einem langen Ausfall
+        nicht geflutet.
+        Returns: Anzahl gesendeter Datensätze
+        """
+        sent = 0
+        for _ in range(max_batches):
+            batch = self.next_batch(batch_size)
+            if batch is None:
+                break
+            client.publish(topic, batch[0], qos=qos)
+            self.drop(batch[1])
+            sent += batch[1]
+        return sent
@@ -0,0 +1,160 @@
+import time
+import machine
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+# Zustand im RTC-Speicher: Kennung, Zyklen, Wachzeit des letzten Zyklus
+# (ms), letzte MQTT Packet-ID, die zuletzt gesendeten Messwerte
+# (NaN = Fehler/keiner), deren Sendezeitpunkte (Unix-Zeit, 0 = nie), die
+# Zähler des Report-by-Exception Filters samt letzter Statistik
+# (Unix-Zeit) und je Aktor die Schaltzustände (Bit 0 ein, Bit 1 manuell,
+# ab Bit 2 die Regeln) mit dem Ende der manuellen Übersteuerung (Unix-Zeit)
+STATE_MAGIC = 0x5347
+STATE_FMT = '<HIIHffffiiiiIIIBBii'
+ACTUATOR_SLOTS = 2
+NAN = float('nan')
+
+def woke_from_deepsleep():
+    """
+    Returns: True wenn das Gerät aus dem Tiefschlaf aufgewacht ist
+    """
+    return machine.reset_cause() == machine.DEEPSLEEP_RESET
+
+class RTCState:
+    """
+    Zustand, der den Tiefschlaf im RTC-Speicher überdauert.
+
+    Im Tiefschlaf geht der RAM verloren, der RTC-Speicher (machine.RTC().memory())
+    bleibt erhalten, solange das Gerät Strom hat. Gespeichert werden
+    Zähler, die zuletzt gesendeten Messwerte samt Sendezeitpunkt (damit
+    Report-by-Exception nach dem Aufwachen weiterläuft), die Packet-ID
+    der MQTT-Sitzung und der Zustand der Aktor-Regelung.
+    """
+    def __init__(self, rtc=None):
+        self.rtc = rtc or machine.RTC()
+        self.cycles = 0
+        self.awake_ms = 0
+        self.pid = 0
+        self.values = [None] * 4
+        self.sent_at = [0] * 4
+        self.sent = 0
+        self.suppressed = 0
+        self.stats_at = 0
+        self.actuators = [0] * ACTUATOR_SLOTS
+        self.manual_until = [0] * ACTUATOR_SLOTS
+
+    def load(self):
+        """
+        Liest den Zustand aus dem RTC-Speicher
+        Returns: True wenn ein gültiger Zustand vorhanden war
+        """
+        data = self.rtc.memory()
+        if len(data) != struct.calcsize(STATE_FMT):
+            return False
+        fields = struct.unpack(STATE_FMT, data)
+        if fields[0] != STATE_MAGIC:
+            return False
+        self.cycles, self.awake_ms, self.pid = fields[1:4]
+        self.values = [None if v != v else v for v in fields[4:8]]
+        self.sent_at = list(fields[8:12])
+        self.sent, self.suppressed, self.stats_at = fields[12:15]
+        self.actuators = list(fields[15:15 + ACTUATOR_SLOTS])
+        self.manual_until = list(fields[15 + ACTUATOR_SLOTS:])
+        return True
+
+    def save(self):
+        """
+        Schreibt den Zustand in den RTC-Speicher
+        """
+        values = [NAN if v is None else v for v in self.values]
+        self.rtc.memory(struct.pack(STATE_FMT, STATE_MAGIC, self.cycles, self.awake_ms,
+                                    self.pid, *(values + self.sent_at +
+                                                [self.sent, self.suppressed, self.stats_at] +
+                                                self.actuators + self.manual_until)))
+
+    def store_filter(self, report_filter):
+        """
+        Übernimmt die gesendeten Werte und Zähler eines ReportByException
+        Filters, die Sendezeitpunkte werden in Unix-Zeit umgerechnet
+        """
+        now = time.ticks_ms()
+        epoch = int(time.time())
+        for i in range(4):
+            self.values[i] = report_filter.last[i]
+            last_sent = report_filter.last_sent[i]
+            self.sent_at[i] = 0 if last_sent is None else \
+                epoch - time.ticks_diff(now, last_sent) // 1000
+        self.sent = report_filter.sent
+        self.suppressed = report_filter.suppressed
+        self.stats_at = epoch - time.ticks_diff(now, report_filter.last_stats) // 1000
+
+    def restore_filter(self, report_filter):
+        """
+        Stellt einen ReportByException Filter nach dem Aufwachen wieder her
+        """
+        now = time.ticks_ms()
+        epoch = int(time.time())
+        for i in range(4):
+            report_filter.last[i] = self.values[i]
+            age_ms = (epoch - self.sent_at[i]) * 1000
+            # Ältere Zeitpunkte passen nicht in den ticks-Bereich, der Wert
+            # gilt dann als nie gesendet
+            if self.sent_at[i] and age_ms < 0x10000000:
+                report_filter.last_sent[i] = time.ticks_add(now, -age_ms)
+        report_filter.sent = self.sent
+        report_filter.suppressed = self.suppressed
+        # Über ein Statistik-Intervall hinaus ist sie ohnehin fällig. Beim
+        # ersten Stellen der Uhr (clock.py) springt epoch, daher begrenzt.
+        age_ms = max(min((epoch - self.stats_at) * 1000, report_filter.stats_interval_ms), 0)
+        report_filter.last_stats = time.ticks_add(now, -age_ms)
+
+    def store_controller(self, controller):
+        """
+        Übernimmt die Schaltzustände und manuellen Übersteuerungen einer
+        controller.EdgeController Regelung
+        """
+        now = time.ticks_ms()
+        epoch = int(time.time())
+        for i in range(ACTUATOR_SLOTS):
+            if i >= len(controller.actuators):
+                break
+            actuator = controller.actuators[i]
+            flags = actuator.on | actuator.manual << 1
+            for j in range(len(actuator.demand)):
+                flags |= actuator.demand[j] << 2 + j
+            self.actuators[i] = flags
+            self.manual_until[i] = epoch + time.ticks_diff(actuator.manual_until, now) // 1000
+
+    def restore_controller(self, controller):
+        """
+        Stellt die Regelung nach dem Aufwachen wieder her und schaltet die
+        Aktoren auf den gespeicherten Zustand
+        """
+        now = time.ticks_ms()
+        epoch = int(time.time())
+        for i in range(ACTUATOR_SLOTS):
+            if i >= len(controller.actuators):
+                break
+            actuator = controller.actuators[i]
+            flags = self.actuators[i]
+            for j in range(len(actuator.demand)):
+                actuator.demand[j] = bool(flags >> 2 + j & 1)
+            actuator.manual = bool(flags & 2)
+            # Restzeit begrenzt, falls die Uhr inzwischen gestellt wurde
+            remaining = max(min(self.manual_until[i] - epoch, actuator.override_ms // 1000), -1)
+            actuator.manual_until = time.ticks_add(now, remaining * 1000)
+            actuator.restore(bool(flags & 1))
+
+def sleep(mode, ms):
+    """
+    Schläft ms Millisekunden
+    Args:
+        mode: 'light' (RAM und Verbindungen bleiben erhalten) oder 'deep'
+        (Neustart nach dem Aufwachen, kehrt nicht zurück)
+    """
+    if mode == 'deep':
+        machine.deepsleep(ms)
+    else:
+        machine.lightsleep(ms)
@@ -0,0 +1,84 @@
+import time
+try:
+    import uheapq as heapq
+except ImportError:
+    import heapq
+
+class Scheduler:
+    """
+    Einfacher Termin-Planer für periodische Aufgaben.
+
+    Die Fälligkeiten liegen in einem Heap, der nächste Termin ist also
+    immer heap[0]. Zeiten werden in ms relativ zu self.base geführt, damit
+    der Vergleich im Heap auch beim Überlauf von time.ticks_ms() stimmt.
+    """
+    def __init__(self):
+        self.heap = []
+        self.base = time.ticks_ms()
+        self.seq = 0
+
+    def _now(self):
+        return time.ticks_diff(time.ticks_ms(), self.base)
+
+    def _rebase(self):
+        # Bezugspunkt nachziehen, bevor die Werte den ticks-Bereich verlassen
+        now = self._now()
+        if now > 0x10000000:
+            for entry in self.heap:
+                entry[0] -= now
+            self.base = time.ticks_add(self.base, now)
+
+    def every(self, interval_ms, func, delay_ms=0):
+        """
+        Plant func() alle interval_ms Millisekunden ein
+        Args:
+            interval_ms: Abstand zwischen zwei Aufrufen
+            func: Funktion ohne Parameter
+            delay_ms: Wartezeit bis zum ersten Aufruf
+        """
+        self.seq += 1
+        # [fällig, Reihenfolge bei gleicher Fälligkeit, Intervall, Funktion]
+        heapq.heappush(self.heap, [self._now() + int(delay_ms), self.seq, int(interval_ms), func])
+
+    def after(self, delay_ms, func):
+        """
+        Plant func() einmalig nach delay_ms Millisekunden ein
+        """
+        self.seq += 1
+        # Intervall 0 = einmalige Aufgabe
+        heapq.heappush(self.heap, [self._now() + int(delay_ms), self.seq, 0, func])
+
+    def next_delay(self):
+        """
+        Returns: Millisekunden bis zum nächsten Termin (0 wenn bereits
+        fällig, -1 ohne Aufgaben), passend als Timeout für poll()
+        """
+        if not self.heap:
+            return -1
+        self._rebase()
+        return max(self.heap[0][0] - self._now(), 0)
+
+    def run_due(self):
+        """
+        Führt alle fälligen Aufgaben aus und plant periodische neu ein. Der nächste
+        Termin ergibt sich aus dem letzten, nicht aus der Ausführungszeit,
+        so gibt es keine Drift. Verpasste Termine werden übersprungen.
+        Returns: Anzahl ausgeführter Aufgaben
+        """
+        n = 0
+        heap = self.heap
+        now = self._now()
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            try:
+                entry[3]()
+            finally:
+                now = self._now()
+                if entry[2]:
+                    due = entry[0] + entry[2]
+                    if due <= now:
+                        due += ((now - due) // entry[2] + 1) * entry[2]
+                    entry[0] = due
+                    heapq.heappush(heap, entry)
+            n += 1
+        return n
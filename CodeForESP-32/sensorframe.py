@@ -0,0 +1,183 @@
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+# Kompaktes Binärformat für einen Messzyklus (16 Bytes, Little Endian).
+# Der passende Decoder für den Raspberry Pi liegt in
+# CodeForRaspberryPi/framedecoder.py, beide Seiten müssen FRAME_FMT teilen.
+#
+#   Offset  Typ     Feld
+#   0       uint8   Version (FRAME_VERSION)
+#   1       uint8   Gültigkeits-Bitmaske (VALID_*)
+#   2       uint16  Laufende Nummer (läuft bei 65535 über)
+#   4       uint32  Zeitstempel in Sekunden seit 2000-01-01 (MicroPython-Epoche),
+#                   nur mit VALID_TIME (Uhr per NTP gestellt, siehe clock.py)
+#   8       int16   Temperatur in 0.1 °C
+#   10      uint16  Luftfeuchtigkeit in 0.1 %
+#   12      uint16  Entfernung in mm
+#   14      uint16  Bodenfeuchtigkeit (roher ADC-Wert)
+#
+# Ungültige Messwerte werden als 0 übertragen und in der Bitmaske markiert.
+# Version 1 kannte VALID_TIME noch nicht, der Zeitstempel galt immer.
+FRAME_VERSION = 2
+FRAME_FMT = '<BBHIhHHH'
+FRAME_SIZE = struct.calcsize(FRAME_FMT)
+
+VALID_TEMP = 0x01
+VALID_HUMI = 0x02
+VALID_DIST = 0x04
+VALID_MOIST = 0x08
+VALID_TIME = 0x10
+
+class FrameEncoder:
+    """
+    Packt Messwerte in einen einmal angelegten Puffer, der für jeden
+    Frame wiederverwendet wird
+    """
+    def __init__(self):
+        self.buf = bytearray(FRAME_SIZE)
+        self.seq = 0
+
+    def encode(self, ts, temp, humi, dist, moist):
+        """
+        Erzeugt einen Frame aus einem Messwert-Satz
+        Args:
+            ts: Zeitstempel in Sekunden (time.time()) oder None, wenn die
+            Uhr nicht gestellt ist
+            temp: Temperatur in °C oder None
+            humi: Luftfeuchtigkeit in % oder None
+            dist: Entfernung in cm oder None
+            moist: Bodenfeuchtigkeit (ADC-Wert) oder None
+        Returns: bytearray mit FRAME_SIZE Bytes (wird beim nächsten Aufruf überschrieben)
+        """
+        valid = 0
+        t = h = d = m = 0
+        if ts is None:
+            ts = 0
+        else:
+            valid |= VALID_TIME
+        if temp is not None:
+            t = int(round(temp * 10))
+            valid |= VALID_TEMP
+        if humi is not None:
+            h = int(round(humi * 10))
+            valid |= VALID_HUMI
+        if dist is not None:
+            d = int(round(dist * 10))
+            valid |= VALID_DIST
+        if moist is not None:
+            m = int(moist)
+            valid |= VALID_MOIST
+        struct.pack_into(FRAME_FMT, self.buf, 0, FRAME_VERSION, valid,
+                         self.seq, int(ts), t, h, d, m)
+        self.seq = (self.seq + 1) & 0xffff
+        return self.buf
+
+# Zeitstempel hinter Text-Nachrichten: b'temp:21.5 @800000000' mit
+# Sekunden seit 2000-01-01 (time.time()). Node-RED liest mit parseFloat
+# nur die Zahl davor, CodeForRaspberryPi/ingest.py verwendet die Zeit.
+STAMP = b' @'
+STAMP_DIGITS = 10
+
+def _write_stamp(buf, i, ts):
+    """
+    Schreibt STAMP und ts ab Index i in buf
+    Returns: Index hinter der letzten Ziffer
+    """
+    ts = int(ts)
+    for c in STAMP:
+        buf[i] = c
+        i += 1
+    place = 1
+    while place * 10 <= ts:
+        place *= 10
+    while place:
+        digit = ts // place
+        buf[i] = 0x30 + digit
+        i += 1
+        ts -= digit * place
+        place //= 10
+    return i
+
+class TextField:
+    """
+    Text-Nachricht b'<prefix><Zahl><suffix>' (z.B. b'temp:21.5') in einem
+    einmal angelegten Puffer, mit gestellter Uhr gefolgt vom Zeitstempel
+    (STAMP).
+
+    b'temp:%.1f' % x legt bei jedem Aufruf ein neues bytes-Objekt an.
+    encode() schreibt die Ziffern stattdessen in den Puffer und liefert
+    eine der vorab angelegten memoryviews passender Länge zurück. Der
+    Inhalt gilt also nur bis zum nächsten Aufruf.
+    """
+    def __init__(self, prefix, decimals, suffix, error, digits=8):
+        """
+        prefix: Text vor der Zahl, z.B. b'temp:'
+        decimals: Anzahl Nachkommastellen (der Wert wird darauf gerundet)
+        suffix: Text nach der Zahl, z.B. b' cm'
+        error: Nachricht für None (Sensorfehler) oder zu große Werte
+        digits: Höchstzahl an Ziffern
+        """
+        self.decimals = decimals
+        self.scale = 10 ** decimals
+        self.limit = 10 ** digits
+        self.suffix = suffix
+        self.error = error
+        self.start = len(prefix)
+        # Vorzeichen und Dezimalpunkt zusätzlich zu den Ziffern
+        stamp = len(STAMP) + STAMP_DIGITS
+        self.buf = bytearray(self.start + digits + 2 + len(suffix) + stamp)
+        self.buf[:self.start] = prefix
+        mv = memoryview(self.buf)
+        self.views = [mv[:n] for n in range(len(self.buf) + 1)]
+        # Fehlernachricht mit Zeitstempel
+        self.error_buf = bytearray(len(error) + stamp)
+        self.error_buf[:len(error)] = error
+        mv = memoryview(self.error_buf)
+        self.error_views = [mv[:n] for n in range(len(self.error_buf) + 1)]
+
+    def _error(self, ts):
+        if ts is None:
+            return self.error
+        return self.error_views[_write_stamp(self.error_buf, len(self.error), ts)]
+
+    def encode(self, value, ts=None):
+        """
+        Args:
+            value: Messwert oder None (Sensorfehler)
+            ts: Zeitstempel in Sekunden (time.time()) oder None, wenn die
+            Uhr nicht gestellt ist
+        Returns: Nachricht als memoryview in den Puffer, für None die
+        Fehlernachricht
+        """
+        if value is None:
+            return self._error(ts)
+        n = round(value * self.scale)
+        if not -self.limit < n < self.limit:
+            return self._error(ts)
+        buf = self.buf
+        i = self.start
+        if n < 0:
+            buf[i] = 0x2d  # '-'
+            i += 1
+            n = -n
+        # Stellenwert der ersten Ziffer, mindestens eine Ziffer vor dem Punkt
+        place = self.scale
+        while place * 10 <= n:
+            place *= 10
+        while place:
+            digit = n // place
+            buf[i] = 0x30 + digit
+            i += 1
+            n -= digit * place
+            if place == self.scale and self.decimals:
+                buf[i] = 0x2e  # '.'
+                i += 1
+            place //= 10
+        for c in self.suffix:
+            buf[i] = c
+            i += 1
+        if ts is not None:
+            i = _write_stamp(buf, i, ts)
+        return self.views[i]
@@ -0,0 +1,50 @@
+# =====================================================
+# Attrappen für MicroPython (Host-Tests mit CPython)
+# =====================================================
+#
+# machine, dht und micropython gibt es nur auf dem ESP-32, sie werden
+# durch leere Klassen ersetzt. time bekommt die ticks-Funktionen (mit
+# Überlauf bei 2^30 wie auf dem Gerät). Die Einstellungen werden vor dem
+# ersten Import von main gesetzt, da main sie per from-Import übernimmt.
+
+import os
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+_MASK = 0x3fffffff
+if not hasattr(time, 'ticks_ms'):
+    time.ticks_ms = lambda: int(time.monotonic() * 1000) & _MASK
+    time.ticks_us = lambda: int(time.monotonic() * 1000000) & _MASK
+    time.ticks_diff = lambda a, b: ((a - b + 0x20000000) & _MASK) - 0x20000000
+    time.ticks_add = lambda a, b: (a + b) & _MASK
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    time.sleep_us = lambda us: time.sleep(us / 1000000)
+
+class _Hardware:
+    OUT = IN = PULL_UP = WIDTH_12BIT = ATTN_11DB = 0
+    def __init__(self, *args, **kwargs):
+        pass
+
+machine = types.ModuleType('machine')
+machine.Pin = machine.ADC = machine.RTC = machine.Timer = _Hardware
+machine.DEEPSLEEP_RESET = 4
+machine.reset_cause = lambda: 1
+dht = types.ModuleType('dht')
+dht.DHT22 = _Hardware
+micropython = types.ModuleType('micropython')
+micropython.const = lambda x: x
+for module in (machine, dht, micropython):
+    sys.modules.setdefault(module.__name__, module)
+
+import mysettings
+mysettings.LOG_LEVEL = 'info'
+mysettings.PAYLOAD_FORMAT = 'text'
+mysettings.REPORT_MAX_SILENCE = 0     # jeder Wert wird gesendet
+mysettings.STATS_INTERVAL = 0
+_tmp = tempfile.mkdtemp()
+mysettings.OFFLINE_SPILL_FILE = os.path.join(_tmp, 'offline.bin')
+mysettings.LOG_FILE = os.path.join(_tmp, 'log.txt')
@@ -0,0 +1,97 @@
+# =====================================================
+# Speicherbudget des Sendezyklus (Host-Test mit CPython)
+# =====================================================
+#
+# Läuft ohne ESP-32 (Attrappen in conftest.py), gesendet wird an einen
+# Client, der nur mitzählt.
+#
+#     python -m pytest CodeForESP-32/tests
+#
+# Gemessen wird mit tracemalloc, also der CPython-Heap. CPython legt
+# dabei auch Objekte an, die MicroPython nicht braucht (Ganzzahlen über
+# 256, Iteratoren), das Budget ist deshalb nicht 0. Es gilt wie auf dem
+# Gerät nur ohne Log-Ausgaben im Zyklus (LOG_LEVEL ab 'info').
+
+import os
+import tracemalloc
+
+import main
+
+# Bytes, die ein eingeschwungener Zyklus höchstens kurzzeitig belegt
+CYCLE_BUDGET = 256
+WARMUP_CYCLES = 100
+CYCLES = 200
+
+class FakeClient:
+    """
+    Nimmt publish_many/publish wie umqttsimple.MQTTClient entgegen und
+    merkt sich nur die letzten Nachrichten
+    """
+    def __init__(self):
+        self.calls = 0
+        self.msgs = None
+
+    def publish_many(self, msgs):
+        self.calls += 1
+        self.msgs = msgs
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        pass
+
+def _fill(readings, k):
+    # Jeder Zyklus mit anderen Werten, Bodenfeuchtigkeit > 256
+    readings[0] = 20.0 + k % 50 / 10
+    readings[1] = 40.0 + k % 30 / 10
+    readings[2] = 10.0 + k % 7 / 10
+    readings[3] = 1800 + k % 100
+
+def _cycles(client, readings, start, count):
+    for k in range(start, start + count):
+        _fill(readings, k)
+        main.publish_sensor_data(client, readings)
+
+def test_text_payloads():
+    client = FakeClient()
+    readings = [None] * 4
+    _fill(readings, 7)
+    main.publish_sensor_data(client, readings)
+    # Die Uhr des Hosts gilt als gestellt, jede Nachricht hat einen Zeitstempel
+    msgs = [bytes(m[1]).partition(b' @') for m in client.msgs]
+    assert [m[0] for m in msgs] == [
+        b'temp:20.7', b'humi:40.7', b'distance:10.0 cm', b'moist:1807']
+    assert all(m[2].isdigit() for m in msgs)
+
+def test_cycle_allocation_budget():
+    client = FakeClient()
+    readings = [None] * 4
+    # Erster Sendevorgang meldet den Start-Ablauf, danach eingeschwungen
+    _cycles(client, readings, 0, WARMUP_CYCLES)
+    
+    tracemalloc.start()
+    try:
+        # Die Zähler in deadband.py sind nach dem Aufwärmen über 256, bei
+        # CPython also eigene Objekte. Ein Zyklus unter tracemalloc, damit
+        # sie in beiden Aufnahmen stehen.
+        _cycles(client, readings, 0, 1)
+        before = tracemalloc.take_snapshot()
+        peak = 0
+        for k in range(CYCLES):
+            _fill(readings, k)
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            main.publish_sensor_data(client, readings)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    
+    # Nur was der Firmware-Code selbst angelegt hat, nicht der Test
+    code = tracemalloc.Filter(True, os.path.join(os.path.dirname(main.__file__), '*.py'))
+    growth = [d for d in after.filter_traces((code,)).compare_to(
+        before.filter_traces((code,)), 'lineno') if d.size_diff > 0]
+    
+    assert client.calls == WARMUP_CYCLES + 1 + CYCLES
+    assert len(client.msgs) == 4
+    # Nichts bleibt liegen, und pro Zyklus nur wenige kurzlebige Objekte
+    assert not growth, growth
+    assert peak <= CYCLE_BUDGET, peak
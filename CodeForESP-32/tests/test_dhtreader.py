@@ -0,0 +1,51 @@
+# =====================================================
+# DHTReader: Fehler einer Messung (Host-Test mit CPython)
+# =====================================================
+
+import time
+
+import dhtreader
+from dhtreader import DHTReader
+
+class FakeDHT:
+    """
+    dht.DHT22-Ersatz, wirft die Fehler aus errors der Reihe nach, danach
+    liefert er gültige Werte
+    """
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+
+    def measure(self):
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def temperature(self):
+        return 21.5
+
+    def humidity(self):
+        return 48.0
+
+def _due(reader):
+    # Nächsten Schritt sofort fällig machen, statt zu warten
+    reader.next_due = time.ticks_ms()
+
+def test_checksum_error_goes_to_retry():
+    # MicroPython meldet einen Prüfsummenfehler als Exception, nicht OSError
+    reader = DHTReader(FakeDHT([Exception('checksum error')]), 10000, retry_ms=2000)
+    assert reader.step() == 2000
+    assert reader.state == dhtreader.RETRY
+    assert reader.errors == 1
+    _due(reader)
+    assert reader.step() == 10000
+    assert reader.value()[:2] == (21.5, 48.0)
+
+def test_repeated_errors_wait_for_interval():
+    reader = DHTReader(FakeDHT([OSError(110), Exception('checksum error'), OSError(110)]),
+                       10000, retry_ms=2000, retries=3)
+    delays = []
+    for _ in range(3):
+        _due(reader)
+        delays.append(reader.step())
+    assert delays == [2000, 2000, 10000]
+    assert reader.state == dhtreader.COOLDOWN
+    assert reader.value() == (None, None, None)
@@ -0,0 +1,48 @@
+# =====================================================
+# Ingest: Zeit immer vom ESP-32, Fenster um die eigene Uhr
+# =====================================================
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'CodeForRaspberryPi'))
+
+import framedecoder
+import ingest
+import sensorframe
+from mysettings import BACKLOG_TOPIC, PACKED_TOPIC, TEMP_TOPIC
+
+def _ingest():
+    rows = []
+    sink = lambda device, series, ts, values: rows.extend(
+        (series, t, v) for t, v in zip(ts.tolist(), values.tolist()))
+    return ingest.Ingest(sink, batch_size=8, max_age=3600, max_skew=60), rows
+
+def _device_time(offset=0):
+    return int(time.time()) - framedecoder.EPOCH_OFFSET + offset
+
+def test_text_uses_device_time():
+    ing, rows = _ingest()
+    field = sensorframe.TextField(b'temp:', 1, b'', b'temp:ERROR')
+    ts = _device_time(-600)
+    ing.on_text(TEMP_TOPIC, bytes(field.encode(21.5, ts)))
+    # ohne Zeitstempel, vorgehende Uhr
+    ing.on_text(TEMP_TOPIC, bytes(field.encode(21.5)))
+    ing.on_text(TEMP_TOPIC, bytes(field.encode(21.5, _device_time(600))))
+    ing.flush()
+    assert rows == [('temp', ts + framedecoder.EPOCH_OFFSET, 21.5)]
+    assert ing.dropped == 2 and ing.rejected == 0
+
+def test_packed_and_backlog_outside_window_dropped():
+    ing, rows = _ingest()
+    encoder = sensorframe.FrameEncoder()
+    now = _device_time()
+    frames = b''.join(bytes(encoder.encode(ts, 20.0, None, None, None))
+                      for ts in (now, None, now + 600, now - 7200))
+    ing.on_packed(PACKED_TOPIC, frames)
+    ing.on_backlog(BACKLOG_TOPIC, '{};21.0;;;\n{};22.0;;;\n'.format(now - 7200, now - 60).encode())
+    ing.flush()
+    temps = [(t - framedecoder.EPOCH_OFFSET, v) for series, t, v in rows if series == 'temp']
+    assert temps == [(now, 20.0), (now - 60, 22.0)]
+    assert ing.dropped == 4
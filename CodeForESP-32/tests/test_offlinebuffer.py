@@ -0,0 +1,43 @@
+# =====================================================
+# Offline-Puffer: Zeitstempel vor dem Stellen der Uhr
+# =====================================================
+
+import os
+import tempfile
+import types
+
+import clock
+from offlinebuffer import OfflineBuffer
+
+def _times(buf):
+    return [rec[0] for rec in buf.peek(len(buf))]
+
+def test_shift_times_in_ram_and_flash():
+    path = os.path.join(tempfile.mkdtemp(), 'spill.bin')
+    buf = OfflineBuffer(4, path, 16, spill_chunk=2)
+    # Sekunden seit dem Einschalten, die letzten beiden schon mit Uhr
+    synced = clock.VALID_AFTER + 1000
+    for ts in (10, 20, 30, 40, 50, synced + 60, synced + 70):
+        buf.push(ts, 21.0, None, None, 1800)
+    assert len(buf.flash) == 4
+    buf.shift_times(clock.VALID_AFTER, synced)
+    assert _times(buf) == [synced + 10, synced + 20, synced + 30, synced + 40,
+                           synced + 50, synced + 60, synced + 70]
+    # Auch nach einem Neustart aus dem Flash
+    assert [rec[0] for rec in OfflineBuffer(4, path, 16).peek(4)] == [
+        synced + 10, synced + 20, synced + 30, synced + 40]
+
+def test_sync_records_offset(monkeypatch):
+    now = [120]
+    def settime():
+        now[0] = clock.VALID_AFTER + 5000
+    monkeypatch.setattr(clock, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    monkeypatch.setattr(clock, 'ntptime', types.SimpleNamespace(settime=settime))
+    monkeypatch.setattr(clock, 'synced', False)
+    monkeypatch.setattr(clock, 'offset', 0)
+    assert clock.sync()
+    assert clock.offset == clock.VALID_AFTER + 5000 - 120
+    # Nur einmal pro Start
+    now[0] += 60
+    assert clock.sync()
+    assert clock.offset == clock.VALID_AFTER + 5000 - 120
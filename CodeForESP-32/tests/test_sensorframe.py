@@ -0,0 +1,39 @@
+# =====================================================
+# Binär-Frame: Zeitstempel nur mit gestellter Uhr
+# =====================================================
+
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'CodeForRaspberryPi'))
+
+import framedecoder
+import sensorframe
+
+def test_frame_without_clock_has_no_time():
+    encoder = sensorframe.FrameEncoder()
+    frame = bytes(encoder.encode(None, 21.5, 48.0, 12.3, 1800))
+    reading, = framedecoder.decode(frame)
+    assert reading.ts is None
+    assert reading[2:] == (21.5, 48.0, 12.3, 1800)
+    assert framedecoder.decode_columns(frame)['ts'] == [None]
+
+def test_frame_with_clock():
+    encoder = sensorframe.FrameEncoder()
+    # 2025-05-08 in der MicroPython-Epoche
+    frame = bytes(encoder.encode(800000000, 21.5, None, None, None))
+    reading, = framedecoder.decode(frame)
+    assert reading.ts == 800000000 + framedecoder.EPOCH_OFFSET
+    assert reading.humi is None
+
+def test_version_1_time_always_valid():
+    frame = struct.pack(framedecoder.FRAME_FMT, 1, 0x01, 7, 800000000, 215, 0, 0, 0)
+    assert framedecoder.decode_columns(frame)['ts'] == [800000000 + framedecoder.EPOCH_OFFSET]
+
+def test_text_stamp():
+    field = sensorframe.TextField(b'distance:', 1, b' cm', b'distance:ERROR')
+    assert bytes(field.encode(12.3)) == b'distance:12.3 cm'
+    assert bytes(field.encode(12.3, 800000000)) == b'distance:12.3 cm @800000000'
+    assert bytes(field.encode(None, 7)) == b'distance:ERROR @7'
+    assert bytes(field.encode(None)) == b'distance:ERROR'
@@ -0,0 +1,28 @@
+# =====================================================
+# Zeitreihen-Speicher: Spalten nach einem Abbruch wieder ausrichten
+# =====================================================
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'CodeForRaspberryPi'))
+
+import tsstore
+
+DAY0 = 1750000000 // tsstore.DAY * tsstore.DAY
+
+def test_append_after_torn_write(tmp_path):
+    store = tsstore.TimeSeriesStore(str(tmp_path))
+    store.append('dev', 'temp', [DAY0 + 10, DAY0 + 20], [1.0, 2.0])
+    ts_path, val_path = store._day_paths(store._dir('dev', 'temp'), DAY0 // tsstore.DAY)
+    # Abbruch nach dem Zeitstempel, vor dem Wert, plus halber Satz
+    with open(ts_path, 'ab') as f:
+        f.write(np.array([DAY0 + 30], tsstore.TS_DTYPE).tobytes() + b'\0\0\0')
+
+    store.append('dev', 'temp', [DAY0 + 40], [4.0])
+    ts, values = store.read('dev', 'temp', DAY0, DAY0 + tsstore.DAY)
+    assert ts.tolist() == [DAY0 + 10, DAY0 + 20, DAY0 + 40]
+    assert values.tolist() == [1.0, 2.0, 4.0]
+    assert os.path.getsize(ts_path) == 3 * tsstore.TS_DTYPE.itemsize
@@ -0,0 +1,57 @@
+# =====================================================
+# asyncio MQTT Client: Fehler im Handler trennen nicht
+# =====================================================
+
+import asyncio
+
+import umqttasync
+
+class FakeWriter:
+    def __init__(self):
+        self.data = b''
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+def test_handler_error_keeps_connection():
+    calls = []
+    def handler(topic, msg):
+        calls.append(msg)
+        raise ValueError(msg)
+
+    async def run():
+        client = umqttasync.MQTTClient(b'test', 'localhost')
+        client.route(b'DLN/a/b', handler)
+        client.reader = asyncio.StreamReader()
+        client.writer = FakeWriter()
+        # Zwei PUBLISH mit QoS 1 (pid 9 und 10), danach Verbindungsende
+        client.reader.feed_data(b'\x32\x0d\x00\x07DLN/a/b\x00\x09on'
+                                b'\x32\x0e\x00\x07DLN/a/b\x00\x0aoff')
+        client.reader.feed_eof()
+        await client._receive()
+        return client
+
+    client = asyncio.run(run())
+    assert calls == [b'on', b'off']
+    # Beide Nachrichten bestätigt, erst das Verbindungsende ist ein Fehler
+    assert client.writer.data == b'\x40\x02\x00\x09\x40\x02\x00\x0a'
+    assert isinstance(client.error, EOFError)
+
+def test_full_window_times_out():
+    async def run():
+        client = umqttasync.MQTTClient(b'test', 'localhost', max_inflight=1,
+                                       window_timeout_ms=50)
+        client.writer = FakeWriter()
+        await client.publish(b'a/b', b'1', qos=1)
+        try:
+            await client.publish_many([(b'a/b', b'2', 1, False)])
+        except OSError as e:
+            return client, e.args[0]
+
+    client, err = asyncio.run(run())
+    assert err == 110
+    # Die zweite Nachricht wurde nie gesendet
+    assert client.writer.data.count(b'a/b') == 1
@@ -0,0 +1,77 @@
+# =====================================================
+# MQTT Client: Fenster für unbestätigte QoS-1 Nachrichten, Abos
+# =====================================================
+
+import pytest
+
+import umqttsimple
+
+class FakeSocket:
+    """
+    Broker, der jede QoS-1 Nachricht beim Schreiben bestätigt (ack=True)
+    oder nie. Merkt sich die Zahl unbestätigter Nachrichten pro write().
+    """
+    def __init__(self, client, ack):
+        self.client = client
+        self.ack = ack
+        self.rx = bytearray()
+        self.writes = []
+
+    def write(self, buf, n=None):
+        data = bytes(buf[:len(buf) if n is None else n])
+        self.writes.append((data, len(self.client.inflight)))
+        if self.ack:
+            for pid in list(self.client.inflight):
+                self.rx += bytes((0x40, 2, pid >> 8, pid & 0xff))
+        return len(data)
+
+    def setblocking(self, flag):
+        pass
+
+    def readinto(self, buf, n=None):
+        if not self.rx:
+            return None
+        n = min(n or len(buf), len(self.rx))
+        buf[:n] = self.rx[:n]
+        del self.rx[:n]
+        return n
+
+    def read(self, n):
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
+
+def _client(ack, **kw):
+    client = umqttsimple.MQTTClient(b'test', 'localhost', max_inflight=2, **kw)
+    client.sock = FakeSocket(client, ack)
+    return client
+
+def test_publish_many_respects_window():
+    client = _client(True)
+    client.publish_many([(b'a/b', b'%d' % i, 1, False) for i in range(5)])
+    # Nie mehr als zwei unbestätigte Nachrichten, die PUBACKs der letzten
+    # beiden holt erst der nächste check_msg ab
+    assert max(n for data, n in client.sock.writes) == 2
+    assert b''.join(data for data, n in client.sock.writes).count(b'a/b') == 5
+    assert sorted(client.inflight) == [4, 5]
+
+def test_full_window_resends_and_times_out():
+    client = _client(False, retry_ms=20, window_timeout_ms=200)
+    client.publish_many([(b'a/b', b'1', 1, False), (b'a/b', b'2', 1, False)])
+    with pytest.raises(OSError) as e:
+        client.publish(b'a/b', b'3', qos=1)
+    assert e.value.args[0] == 110
+    # Erneut gesendet mit DUP-Flag
+    assert any(data[0] == 0x3a for data, n in client.sock.writes)
+
+def test_rejected_filters_not_routed():
+    client = _client(False)
+    handler = lambda topic, msg: None
+    # SUBACK für pid 1: erstes Abo gewährt, die beiden anderen abgelehnt
+    client.sock.rx += b'\x90\x05\x00\x01\x00\x80\x80'
+    codes = client.subscribe_many([(b'a/b', 0, handler), (b'a/c', 0, handler),
+                                   (b'a/+/d', 0, handler)])
+    assert list(codes) == [0, 0x80, 0x80]
+    assert list(client.routes) == [b'a/b']
+    assert client.trie[0][b'a'][0][b'+'][0][b'd'][1] is None
+    assert list(client.subs) == [b'a/b']
@@ -0,0 +1,162 @@
+import time
+from array import array
+try:
+    from machine import Timer
+except ImportError:
+    Timer = None
+try:
+    from micropython import schedule
+except ImportError:
+    schedule = None
+
+import log
+
+class EventQueue:
+    """
+    Ringpuffer fester Größe für Ereignis-Nummern (0-255).
+
+    put() wird aus dem Timer-Interrupt aufgerufen und legt nichts an,
+    get() aus dem geplanten Callback. Jede Seite schreibt nur ihren
+    eigenen Index (tail bzw. head), deshalb ist keine Sperre nötig. Ist
+    der Puffer voll, wird das Ereignis verworfen und gezählt.
+    """
+    def __init__(self, size):
+        self.buf = array('B', [0] * (size + 1))
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return (self.tail - self.head) % len(self.buf)
+
+    def put(self, event):
+        tail = self.tail + 1
+        if tail == len(self.buf):
+            tail = 0
+        if tail == self.head:
+            self.dropped += 1
+            return False
+        self.buf[self.tail] = event
+        self.tail = tail
+        return True
+
+    def get(self):
+        """
+        Returns: nächstes Ereignis, -1 wenn der Puffer leer ist
+        """
+        if self.head == self.tail:
+            return -1
+        event = self.buf[self.head]
+        head = self.head + 1
+        self.head = 0 if head == len(self.buf) else head
+        return event
+
+class TimerSampler:
+    """
+    Löst Messaufgaben über machine.Timer aus statt über die Hauptschleife.
+
+    Der Timer-Interrupt stellt nur die Nummer der Aufgabe in eine
+    EventQueue und plant mit micropython.schedule einen einzigen
+    Durchlauf von run() ein, der alle anstehenden Aufgaben ausführt.
+    MicroPython führt geplante Callbacks auch während poll() und
+    blockierender Socket-Operationen aus, eine Messung wartet also nicht
+    auf die Hauptschleife und weckt sie auch nicht auf.
+
+    Timer und schedule können für Tests auf dem Host übergeben werden.
+    Die Verzögerung zwischen Interrupt und Start der Aufgabe wird pro
+    Aufgabe in latency_us gemessen (max_latency_us = Höchstwert).
+    """
+    def __init__(self, queue_size=8, first_timer=0, timer=None, schedule_func=None):
+        """
+        queue_size: Anzahl Ereignisse, die zwischen zwei Durchläufen anstehen können
+        first_timer: ID des ersten Hardware-Timers, jede Aufgabe belegt einen eigenen
+        timer: Ersatz für machine.Timer (Tests)
+        schedule_func: Ersatz für micropython.schedule (Tests)
+        """
+        self.queue = EventQueue(queue_size)
+        self.first_timer = first_timer
+        self.timer_class = timer or Timer
+        self.schedule = schedule_func or schedule
+        self.funcs = []
+        self.timers = []
+        self.callbacks = []
+        self.fired = array('i')
+        self.latency_us = array('i')
+        self.max_latency_us = 0
+        self.errors = 0
+        self.pending = False
+        # Gebundene Methode einmal anlegen, der Interrupt darf keinen Speicher anfordern
+        self._run_ref = self.run
+
+    def add(self, func):
+        """
+        Legt eine Aufgabe an, gestartet wird sie mit start()
+        Args:
+            func: Funktion ohne Parameter
+        Returns: Nummer der Aufgabe
+        """
+        slot = len(self.funcs)
+        self.funcs.append(func)
+        self.timers.append(self.timer_class(self.first_timer + slot))
+        self.callbacks.append(lambda timer: self._irq(slot))
+        self.fired.append(0)
+        self.latency_us.append(0)
+        return slot
+
+    def start(self, slot, period_ms, periodic=True):
+        """
+        Startet den Timer einer Aufgabe (neu)
+        Args:
+            period_ms: Intervall bzw. Verzögerung bei periodic=False
+        """
+        timer_class = self.timer_class
+        self.timers[slot].init(
+            mode=timer_class.PERIODIC if periodic else timer_class.ONE_SHOT,
+            period=max(int(period_ms), 1),
+            callback=self.callbacks[slot])
+
+    def every(self, interval_ms, func):
+        """
+        Führt func() alle interval_ms Millisekunden aus
+        Returns: Nummer der Aufgabe
+        """
+        slot = self.add(func)
+        self.start(slot, interval_ms)
+        return slot
+
+    def stop(self):
+        for timer in self.timers:
+            timer.deinit()
+
+    def _irq(self, slot):
+        # Läuft im Interrupt: nur Zeitstempel, Ereignis und ein schedule()
+        self.fired[slot] = time.ticks_us()
+        self.queue.put(slot)
+        if not self.pending:
+            self.pending = True
+            try:
+                self.schedule(self._run_ref, None)
+            except RuntimeError:
+                # schedule-Warteschlange voll, nächster Interrupt versucht es erneut
+                self.pending = False
+
+    def run(self, _=None):
+        """
+        Führt alle anstehenden Aufgaben aus (geplanter Callback). Fehler
+        werden hier abgefangen, sonst würden sie im gerade unterbrochenen
+        Code (z.B. der Hauptschleife) ausgelöst.
+        """
+        self.pending = False
+        while True:
+            slot = self.queue.get()
+            if slot < 0:
+                return
+            latency = time.ticks_diff(time.ticks_us(), self.fired[slot])
+            self.latency_us[slot] = latency
+            if latency > self.max_latency_us:
+                self.max_latency_us = latency
+            try:
+                self.funcs[slot]()
+            except Exception as e:
+                self.errors += 1
+                log.error('FEHLER in Messaufgabe {}: {}', slot, e)
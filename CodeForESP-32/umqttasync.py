@@ -0,0 +1,263 @@
+try:
+    import uasyncio as asyncio
+except:
+    import asyncio
+try:
+    import ustruct as struct
+except:
+    import struct
+try:
+    import urandom as random
+except:
+    import random
+from umqttsimple import MQTTClient as _MQTTClient, MQTTException, ticks_ms, ticks_diff
+
+# asyncio variant of umqttsimple.MQTTClient. Packet assembly, topic
+# routing and the QoS 1 in-flight table are shared with the blocking
+# client; all socket I/O goes through asyncio streams instead.
+#
+# connect() starts a receive task that dispatches incoming messages to the
+# routed handlers and matches PUBACK/SUBACK packets, so publish() never
+# waits for the broker unless the in-flight window is full. When the
+# connection fails, .error is set and all waiters raise OSError; call
+# reconnect() to bring it back up.
+class MQTTClient(_MQTTClient):
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.reader = None
+        self.writer = None
+        self.error = None
+        self.tasks = ()
+        self.subacks = {}
+        # Set by the receive task on every PUBACK, SUBACK and error
+        self.ev = asyncio.Event()
+
+    async def _write(self, n):
+        # The transport may keep a reference to the data, so it gets a
+        # copy of the shared packet buffer
+        self.writer.write(bytes(self.mv[:n]))
+        await self.writer.drain()
+        self.last_tx = ticks_ms()
+
+    async def _wait(self, cond):
+        while cond():
+            if self.error is not None:
+                raise OSError(self.error)
+            self.ev.clear()
+            await self.ev.wait()
+
+    async def _close(self):
+        for t in self.tasks:
+            t.cancel()
+        self.tasks = ()
+        if self.writer is not None:
+            try:
+                self.writer.close()
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+
+    async def connect(self, clean_session=True):
+        self.clean_session = clean_session
+        if self.ssl:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.server, self.port, ssl=self.ssl)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(self.server, self.port)
+        await self._write(self._pack_connect(clean_session))
+        resp = await self.reader.readexactly(4)
+        assert resp[0] == 0x20 and resp[1] == 0x02
+        if resp[3] != 0:
+            raise MQTTException(resp[3])
+        self.error = None
+        self.ping_sent = None
+        self.last_rx = ticks_ms()
+        self.tasks = (asyncio.create_task(self._receive()),
+                      asyncio.create_task(self._housekeeping()))
+        return resp[2] & 1
+
+    async def reconnect(self, attempts=0, min_ms=100, max_ms=30000):
+        delay = min_ms
+        n = 0
+        while 1:
+            await self._close()
+            try:
+                present = await self.connect(self.clean_session)
+                if not present and self.subs:
+                    topics = list(self.subs.values())
+                    self._report_rejected(topics, await self.subscribe_many(topics))
+                await self._resend(0)
+                return present
+            except (OSError, EOFError, MQTTException):
+                n += 1
+                if attempts and n >= attempts:
+                    raise
+            half = delay >> 1
+            await asyncio.sleep((half + random.getrandbits(16) % (half + 1)) / 1000)
+            delay = min(delay << 1, max_ms)
+
+    async def disconnect(self):
+        self.writer.write(b"\xe0\0")
+        await self.writer.drain()
+        await self._close()
+
+    async def ping(self):
+        self.writer.write(b"\xc0\0")
+        await self.writer.drain()
+        self.last_tx = ticks_ms()
+        if self.ping_sent is None:
+            self.ping_sent = self.last_tx
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        if isinstance(msg, str):
+            msg = msg.encode()
+        if qos == 1:
+            await self._wait_window()
+        self._reserve(len(topic) + len(msg) + 9)
+        n, pid = self._pack_publish(0, topic, msg, retain, qos)
+        try:
+            await self._write(n)
+        except OSError:
+            self._drop_inflight((pid,))
+            raise
+        if qos == 1 and not self.max_inflight:
+            await self._wait(lambda: pid in self.inflight)
+        elif qos == 2:
+            assert 0
+
+    async def publish_many(self, msgs):
+        sz = 0
+        for topic, msg, qos, retain in msgs:
+            assert qos < 2
+            sz += len(topic) + len(msg) + 9
+        self._reserve(sz)
+        n = 0
+        pids = []
+        try:
+            for topic, msg, qos, retain in msgs:
+                if qos and self.max_inflight and len(self.inflight) >= self.max_inflight:
+                    if n:
+                        await self._write(n)
+                        n = 0
+                    await self._wait_window()
+                n, pid = self._pack_publish(n, topic, msg, retain, qos)
+                if qos == 1:
+                    pids.append(pid)
+            await self._write(n)
+        except OSError:
+            self._drop_inflight(pids)
+            raise
+        if pids and not self.max_inflight:
+            await self._wait(lambda: any(pid in self.inflight for pid in pids))
+
+    # Resending while the window is full is left to _housekeeping
+    async def _wait_window(self):
+        if not self.max_inflight or len(self.inflight) < self.max_inflight:
+            return
+        try:
+            await asyncio.wait_for(
+                self._wait(lambda: len(self.inflight) >= self.max_inflight),
+                self.window_timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            raise OSError(110)  # ETIMEDOUT
+
+    async def _resend(self, age_ms):
+        now = ticks_ms()
+        for entry in self.inflight.values():
+            if ticks_diff(now, entry[0]) >= age_ms:
+                pkt = entry[1]
+                pkt[0] |= 0x08
+                self.writer.write(bytes(pkt))
+                entry[0] = self.last_tx = now
+        await self.writer.drain()
+
+    async def subscribe(self, topic, qos=0, handler=None):
+        if (await self.subscribe_many(((topic, qos, handler),)))[0] == 0x80:
+            raise MQTTException(0x80)
+
+    async def subscribe_many(self, topics):
+        n, pid = self._pack_subscribe(topics)
+        await self._write(n)
+        await self._wait(lambda: pid not in self.subacks)
+        codes = self.subacks.pop(pid)
+        self._drop_rejected(topics, codes)
+        return codes
+
+    # A failing route handler or callback is reported and the message
+    # still acknowledged; only socket and protocol errors end the
+    # connection in _receive
+    def _dispatch(self, topic, msg):
+        try:
+            super()._dispatch(topic, msg)
+        except Exception as e:
+            print("MQTT handler error:", bytes(topic), repr(e))
+
+    async def _recv_len(self):
+        n = 0
+        sh = 0
+        while 1:
+            b = (await self.reader.readexactly(1))[0]
+            n |= (b & 0x7f) << sh
+            if not b & 0x80:
+                return n
+            sh += 7
+
+    async def _receive(self):
+        reader = self.reader
+        try:
+            while 1:
+                op = (await reader.readexactly(1))[0]
+                sz = await self._recv_len()
+                data = await reader.readexactly(sz) if sz else b""
+                self.last_rx = ticks_ms()
+                if op == 0xd0:  # PINGRESP
+                    self._pingresp(self.last_rx)
+                elif op == 0x40:  # PUBACK
+                    self.inflight.pop(data[0] << 8 | data[1], None)
+                    self.ev.set()
+                elif op == 0x90:  # SUBACK
+                    self.subacks[data[0] << 8 | data[1]] = data[2:]
+                    self.ev.set()
+                elif op & 0xf0 == 0x30:
+                    pid = self._handle_publish(op, data, memoryview(data), sz)
+                    if op & 6 == 2:
+                        struct.pack_into("!H", self.ackbuf, 2, pid)
+                        self.writer.write(bytes(self.ackbuf))
+                        await self.writer.drain()
+                        self.last_tx = ticks_ms()
+                    elif op & 6 == 4:
+                        assert 0
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+            self.ev.set()
+
+    # Periodic work while connected: keepalive pings, dead link detection
+    # and resending unacknowledged QoS 1 packets
+    async def _housekeeping(self):
+        period = self.retry_ms // 2
+        if self.keepalive:
+            period = min(period, self.keepalive * 100, self.ping_timeout_ms // 2)
+        period = max(period, 100) / 1000
+        try:
+            while 1:
+                await asyncio.sleep(period)
+                if self._ping_due(ticks_ms()):
+                    await self.ping()
+                if self.inflight:
+                    await self._resend(self.retry_ms)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+            self.ev.set()
+
+    # Wait until the connection has failed, return the error
+    async def wait_error(self):
+        while self.error is None:
+            self.ev.clear()
+            await self.ev.wait()
+        return self.error
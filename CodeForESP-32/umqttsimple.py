@@ -2,16 +2,97 @@ try:
     import usocket as socket
 except:
     import socket
-import ustruct as struct
-from ubinascii import hexlify
+try:
+    import urandom as random
+except:
+    import random
+try:
+    import ustruct as struct
+except:
+    import struct
+try:
+    from ubinascii import hexlify
+except:
+    from binascii import hexlify
+import time
+try:
+    from time import ticks_ms, ticks_diff, sleep_ms
+except ImportError:
+    # CPython has no ticks API
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+    def sleep_ms(ms):
+        time.sleep(ms / 1000)
 
 class MQTTException(Exception):
     pass
 
+# CPython sockets have no read()/write()/readinto(buf, n). This adapter
+# maps them onto send/recv so the client also runs on a host. Reads are
+# served from one large recv buffer, so parsing a packet costs no extra
+# syscalls; pending() tells how much is buffered (select() can't see it).
+class _HostSocket:
+
+    def __init__(self, s, size=16384):
+        self.s = s
+        self.rbuf = bytearray(size)
+        self.rmv = memoryview(self.rbuf)
+        self.r = self.w = 0
+
+    def fileno(self):
+        return self.s.fileno()
+
+    def pending(self):
+        return self.w - self.r
+
+    def setblocking(self, flag):
+        self.s.setblocking(flag)
+
+    def close(self):
+        self.s.close()
+
+    def write(self, buf, n=None):
+        if n is None:
+            n = len(buf)
+        self.s.sendall(memoryview(buf)[:n])
+        return n
+
+    def readinto(self, buf, n=None):
+        if n is None:
+            n = len(buf)
+        if self.r == self.w:
+            try:
+                self.w = self.s.recv_into(self.rbuf)
+            except BlockingIOError:
+                return None
+            self.r = 0
+            if not self.w:
+                return 0
+        n = min(n, self.w - self.r)
+        buf[:n] = self.rmv[self.r:self.r + n]
+        self.r += n
+        return n
+
+    def read(self, n):
+        b = bytearray(n)
+        mv = memoryview(b)
+        got = 0
+        while got < n:
+            r = self.readinto(mv[got:], n - got)
+            if not r:
+                break
+            got += r
+        return bytes(b[:got])
+
 class MQTTClient:
 
     def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0,
-                 ssl=False, ssl_params={}):
+                 ssl=False, ssl_params={}, buf_size=128, max_inflight=0, retry_ms=5000,
+                 rx_size=128, ping_timeout_ms=0, window_timeout_ms=30000):
         if port == 0:
             port = 8883 if ssl else 1883
         self.client_id = client_id
@@ -22,30 +103,181 @@ class MQTTClient:
         self.ssl_params = ssl_params
         self.pid = 0
         self.cb = None
+        self.zero_copy = False
+        # Topic router: exact filters in a dict, wildcard filters in a
+        # trie of [children, handler] nodes keyed by topic level
+        self.routes = {}
+        self.trie = [{}, None]
         self.user = user
         self.pswd = password
         self.keepalive = keepalive
+        self.clean_session = True
+        # Subscriptions by filter, renewed by reconnect() if the broker
+        # did not keep the session
+        self.subs = {}
         self.lw_topic = None
         self.lw_msg = None
         self.lw_qos = 0
         self.lw_retain = False
+        # Outgoing packets are assembled here and sent with a single write
+        self.buf = bytearray(buf_size)
+        self.mv = memoryview(self.buf)
+        self.ackbuf = bytearray(b"\x40\x02\0\0")
+        # QoS 1 in-flight window: pid -> [last send ticks, packet copy].
+        # With max_inflight == 0 publish blocks until its PUBACK arrives.
+        self.inflight = {}
+        self.max_inflight = max_inflight
+        self.retry_ms = retry_ms
+        # A full window that does not drain within this time means the
+        # link is dead: publish raises OSError(ETIMEDOUT)
+        self.window_timeout_ms = window_timeout_ms
+        # Incoming packets are read into these buffers with readinto
+        self.hdr = bytearray(4)
+        # Slicing a bytearray copies it, partial reads must go through a view
+        self.hdrmv = memoryview(self.hdr)
+        self.rxbuf = bytearray(rx_size)
+        self.rxmv = memoryview(self.rxbuf)
+        # Keepalive: ping after keepalive/2 without traffic in either
+        # direction, link is dead if PINGRESP takes longer than
+        # ping_timeout_ms (default keepalive/2)
+        self.ping_timeout_ms = ping_timeout_ms or keepalive * 500
+        self.last_tx = self.last_rx = ticks_ms()
+        self.ping_sent = None
+        # Rolling broker RTT samples from PINGREQ/PINGRESP in ms
+        self.rtt = [0] * 8
+        self.rtt_i = 0
+        self.rtt_n = 0
 
-    def _send_str(self, s):
-        self.sock.write(struct.pack("!H", len(s)))
-        self.sock.write(s)
+    def _reserve(self, n):
+        # Grow the packet buffer once if a packet does not fit; it is
+        # then reused for all following packets.
+        if n > len(self.buf):
+            self.buf = bytearray(n)
+            self.mv = memoryview(self.buf)
+        return self.buf
+
+    def _put_len(self, i, sz):
+        buf = self.buf
+        while sz > 0x7f:
+            buf[i] = (sz & 0x7f) | 0x80
+            sz >>= 7
+            i += 1
+        buf[i] = sz
+        return i + 1
+
+    def _put_str(self, i, s):
+        if isinstance(s, str):
+            s = s.encode()
+        n = len(s)
+        self.buf[i] = n >> 8
+        self.buf[i + 1] = n & 0xff
+        i += 2
+        self.mv[i:i + n] = s
+        return i + n
+
+    def _write(self, n):
+        self.sock.write(self.buf, n)
+        self.last_tx = ticks_ms()
+
+    def _next_pid(self):
+        self.pid = self.pid % 65535 + 1
+        return self.pid
+
+    def _readinto(self, mv, n):
+        got = self.sock.readinto(mv, n)
+        while got < n:
+            r = self.sock.readinto(mv[got:], n - got)
+            if not r:
+                raise OSError(-1)
+            got += r
 
     def _recv_len(self):
         n = 0
         sh = 0
+        hdr = self.hdr
         while 1:
-            b = self.sock.read(1)[0]
+            self._readinto(self.hdrmv, 1)
+            b = hdr[0]
             n |= (b & 0x7f) << sh
             if not b & 0x80:
                 return n
             sh += 7
 
-    def set_callback(self, f):
+    # With zero_copy=True the callback receives memoryview slices of the
+    # receive buffer instead of new bytes objects. They are only valid
+    # until the callback returns.
+    def set_callback(self, f, zero_copy=False):
         self.cb = f
+        self.zero_copy = zero_copy
+
+    # Register handler(topic, msg) for a topic filter. Exact filters are
+    # looked up in a dict, filters with + or # are compiled into the trie.
+    # Messages without a matching route go to the set_callback() callback.
+    def route(self, topic_filter, handler):
+        if isinstance(topic_filter, str):
+            topic_filter = topic_filter.encode()
+        if b"+" not in topic_filter and b"#" not in topic_filter:
+            self.routes[topic_filter] = handler
+            return
+        node = self.trie
+        for level in topic_filter.split(b"/"):
+            child = node[0].get(level)
+            if child is None:
+                child = node[0][level] = [{}, None]
+            node = child
+        node[1] = handler
+
+    # Remove the handler registered for a topic filter with route()
+    def unroute(self, topic_filter):
+        if isinstance(topic_filter, str):
+            topic_filter = topic_filter.encode()
+        if b"+" not in topic_filter and b"#" not in topic_filter:
+            self.routes.pop(topic_filter, None)
+            return
+        node = self.trie
+        for level in topic_filter.split(b"/"):
+            node = node[0].get(level)
+            if node is None:
+                return
+        node[1] = None
+
+    def _match(self, node, levels, i, topic, msg):
+        children = node[0]
+        # Wildcards do not match a first level starting with $
+        wild = i or levels[0][:1] != b"$"
+        hit = 0
+        if wild:
+            child = children.get(b"#")
+            if child is not None and child[1] is not None:
+                child[1](topic, msg)
+                hit = 1
+        if i == len(levels):
+            if node[1] is not None:
+                node[1](topic, msg)
+                hit = 1
+            return hit
+        if wild:
+            child = children.get(b"+")
+            if child is not None:
+                hit |= self._match(child, levels, i + 1, topic, msg)
+        child = children.get(levels[i])
+        if child is not None:
+            hit |= self._match(child, levels, i + 1, topic, msg)
+        return hit
+
+    def _dispatch(self, topic, msg):
+        hit = 0
+        if self.routes:
+            key = topic if isinstance(topic, bytes) else bytes(topic)
+            handler = self.routes.get(key)
+            if handler is not None:
+                handler(topic, msg)
+                hit = 1
+        if self.trie[0]:
+            key = topic if isinstance(topic, bytes) else bytes(topic)
+            hit |= self._match(self.trie, key.split(b"/"), 0, topic, msg)
+        if not hit and self.cb is not None:
+            self.cb(topic, msg)
 
     def set_last_will(self, topic, msg, retain=False, qos=0):
         assert 0 <= qos <= 2
@@ -56,51 +288,81 @@ class MQTTClient:
         self.lw_retain = retain
 
     def connect(self, clean_session=True):
+        self.clean_session = clean_session
+        self.ping_sent = None
         self.sock = socket.socket()
         addr = socket.getaddrinfo(self.server, self.port)[0][-1]
         self.sock.connect(addr)
+        if not hasattr(self.sock, "readinto"):
+            self.sock = _HostSocket(self.sock)
         if self.ssl:
             import ussl
             self.sock = ussl.wrap_socket(self.sock, **self.ssl_params)
-        premsg = bytearray(b"\x10\0\0\0\0\0")
-        msg = bytearray(b"\x04MQTT\x04\x02\0\0")
+        self._write(self._pack_connect(clean_session))
+        resp = self.sock.read(4)
+        assert resp[0] == 0x20 and resp[1] == 0x02
+        if resp[3] != 0:
+            raise MQTTException(resp[3])
+        return resp[2] & 1
 
+    # Write the CONNECT packet to buf, return its length
+    def _pack_connect(self, clean_session):
         sz = 10 + 2 + len(self.client_id)
-        msg[6] = clean_session << 1
+        flags = clean_session << 1
         if self.user is not None:
             sz += 2 + len(self.user) + 2 + len(self.pswd)
-            msg[6] |= 0xC0
-        if self.keepalive:
-            assert self.keepalive < 65536
-            msg[7] |= self.keepalive >> 8
-            msg[8] |= self.keepalive & 0x00FF
+            flags |= 0xC0
         if self.lw_topic:
             sz += 2 + len(self.lw_topic) + 2 + len(self.lw_msg)
-            msg[6] |= 0x4 | (self.lw_qos & 0x1) << 3 | (self.lw_qos & 0x2) << 3
-            msg[6] |= self.lw_retain << 5
+            flags |= 0x4 | (self.lw_qos & 0x1) << 3 | (self.lw_qos & 0x2) << 3
+            flags |= self.lw_retain << 5
+        assert self.keepalive < 65536
 
-        i = 1
-        while sz > 0x7f:
-            premsg[i] = (sz & 0x7f) | 0x80
-            sz >>= 7
-            i += 1
-        premsg[i] = sz
-
-        self.sock.write(premsg, i + 2)
-        self.sock.write(msg)
-        #print(hex(len(msg)), hexlify(msg, ":"))
-        self._send_str(self.client_id)
+        buf = self._reserve(sz + 5)
+        buf[0] = 0x10
+        i = self._put_len(1, sz)
+        self.mv[i:i + 7] = b"\0\x04MQTT\x04"
+        buf[i + 7] = flags
+        buf[i + 8] = self.keepalive >> 8
+        buf[i + 9] = self.keepalive & 0x00FF
+        i = self._put_str(i + 10, self.client_id)
         if self.lw_topic:
-            self._send_str(self.lw_topic)
-            self._send_str(self.lw_msg)
+            i = self._put_str(i, self.lw_topic)
+            i = self._put_str(i, self.lw_msg)
         if self.user is not None:
-            self._send_str(self.user)
-            self._send_str(self.pswd)
-        resp = self.sock.read(4)
-        assert resp[0] == 0x20 and resp[1] == 0x02
-        if resp[3] != 0:
-            raise MQTTException(resp[3])
-        return resp[2] & 1
+            i = self._put_str(i, self.user)
+            i = self._put_str(i, self.pswd)
+        #print(hex(i), hexlify(self.mv[:i], ":"))
+        return i
+
+    # Re-establish a lost connection in-process. Retries use jittered
+    # exponential backoff between min_ms and max_ms; attempts=0 retries
+    # forever. Subscriptions are only renewed if the broker reports no
+    # session present (see connect(clean_session=False)). Unacknowledged
+    # QoS 1 packets are resent with DUP set. Returns the session-present
+    # flag.
+    def reconnect(self, attempts=0, min_ms=100, max_ms=30000):
+        delay = min_ms
+        n = 0
+        while 1:
+            try:
+                self.sock.close()
+            except:
+                pass
+            try:
+                present = self.connect(self.clean_session)
+                if not present and self.subs:
+                    topics = list(self.subs.values())
+                    self._report_rejected(topics, self.subscribe_many(topics))
+                self._resend(0)
+                return present
+            except (OSError, MQTTException):
+                n += 1
+                if attempts and n >= attempts:
+                    raise
+            half = delay >> 1
+            sleep_ms(half + random.getrandbits(16) % (half + 1))
+            delay = min(delay << 1, max_ms)
 
     def disconnect(self):
         self.sock.write(b"\xe0\0")
@@ -108,100 +370,302 @@ class MQTTClient:
 
     def ping(self):
         self.sock.write(b"\xc0\0")
+        self.last_tx = ticks_ms()
+        if self.ping_sent is None:
+            self.ping_sent = self.last_tx
 
-    def publish(self, topic, msg, retain=False, qos=0):
-        pkt = bytearray(b"\x30\0\0\0")
-        pkt[0] |= qos << 1 | retain
+    # Keepalive scheduler: returns True if a PINGREQ is due, raises
+    # OSError(ETIMEDOUT) if the outstanding one was not answered in time.
+    def _ping_due(self, now):
+        if not self.keepalive:
+            return False
+        if self.ping_sent is not None:
+            if ticks_diff(now, self.ping_sent) >= self.ping_timeout_ms:
+                self.ping_sent = None
+                raise OSError(110)  # ETIMEDOUT
+            return False
+        idle = self.keepalive * 500
+        return (ticks_diff(now, self.last_tx) >= idle or
+                ticks_diff(now, self.last_rx) >= idle)
+
+    def _pingresp(self, now):
+        if self.ping_sent is not None:
+            self.rtt[self.rtt_i] = ticks_diff(now, self.ping_sent)
+            self.rtt_i = (self.rtt_i + 1) % len(self.rtt)
+            self.rtt_n = min(self.rtt_n + 1, len(self.rtt))
+            self.ping_sent = None
+
+    # Rolling broker RTT statistics over the last PINGRESPs:
+    # (min, mean, max, samples) in ms, or None before the first one
+    def rtt_stats(self):
+        n = self.rtt_n
+        if not n:
+            return None
+        samples = self.rtt[:n]
+        return min(samples), sum(samples) // n, max(samples), n
+
+    def _pack_publish(self, i, topic, msg, retain, qos):
+        # Write one PUBLISH packet at buf[i:], return (end, pid).
+        # QoS 1 packets are copied into the in-flight table for resending.
         sz = 2 + len(topic) + len(msg)
         if qos > 0:
             sz += 2
         assert sz < 2097152
-        i = 1
-        while sz > 0x7f:
-            pkt[i] = (sz & 0x7f) | 0x80
-            sz >>= 7
-            i += 1
-        pkt[i] = sz
-        #print(hex(len(pkt)), hexlify(pkt, ":"))
-        self.sock.write(pkt, i + 1)
-        self._send_str(topic)
+        buf = self.buf
+        start = i
+        buf[i] = 0x30 | qos << 1 | retain
+        i = self._put_len(i + 1, sz)
+        i = self._put_str(i, topic)
+        pid = 0
         if qos > 0:
-            self.pid += 1
-            pid = self.pid
-            struct.pack_into("!H", pkt, 0, pid)
-            self.sock.write(pkt, 2)
-        self.sock.write(msg)
+            pid = self._next_pid()
+            struct.pack_into("!H", buf, i, pid)
+            i += 2
+        self.mv[i:i + len(msg)] = msg
+        i += len(msg)
+        if qos == 1:
+            self.inflight[pid] = [ticks_ms(), bytearray(self.mv[start:i])]
+        return i, pid
+
+    # A packet whose write failed is not resent after reconnect(): the
+    # caller got the exception and keeps (e.g. buffers) the data itself.
+    def _drop_inflight(self, pids):
+        for pid in pids:
+            self.inflight.pop(pid, None)
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        if isinstance(msg, str):
+            msg = msg.encode()
         if qos == 1:
-            while 1:
-                op = self.wait_msg()
-                if op == 0x40:
-                    sz = self.sock.read(1)
-                    assert sz == b"\x02"
-                    rcv_pid = self.sock.read(2)
-                    rcv_pid = rcv_pid[0] << 8 | rcv_pid[1]
-                    if pid == rcv_pid:
-                        return
+            self._wait_window()
+        self._reserve(len(topic) + len(msg) + 9)
+        n, pid = self._pack_publish(0, topic, msg, retain, qos)
+        #print(hex(n), hexlify(self.mv[:n], ":"))
+        try:
+            self._write(n)
+        except OSError:
+            self._drop_inflight((pid,))
+            raise
+        if qos == 1 and not self.max_inflight:
+            self._wait_puback([pid])
         elif qos == 2:
             assert 0
 
-    def subscribe(self, topic, qos=0):
-        assert self.cb is not None, "Subscribe callback is not set"
-        pkt = bytearray(b"\x82\0\0\0")
-        self.pid += 1
-        struct.pack_into("!BH", pkt, 1, 2 + 2 + len(topic) + 1, self.pid)
-        #print(hex(len(pkt)), hexlify(pkt, ":"))
-        self.sock.write(pkt)
-        self._send_str(topic)
-        self.sock.write(qos.to_bytes(1, "little"))
+    # Publish several messages with a single socket write. msgs is a
+    # sequence of (topic, msg, qos, retain) tuples with bytes payloads.
+    # All PUBLISH frames are packed back to back into the client buffer;
+    # with QoS 1 the PUBACKs are collected after the flush. If the
+    # in-flight window fills up on the way, the frames packed so far are
+    # sent first and the rest waits for PUBACKs.
+    def publish_many(self, msgs):
+        sz = 0
+        for topic, msg, qos, retain in msgs:
+            assert qos < 2
+            sz += len(topic) + len(msg) + 9
+        self._reserve(sz)
+        n = 0
+        pids = []
+        try:
+            for topic, msg, qos, retain in msgs:
+                if qos and self.max_inflight and len(self.inflight) >= self.max_inflight:
+                    if n:
+                        self._write(n)
+                        n = 0
+                    self._wait_window()
+                n, pid = self._pack_publish(n, topic, msg, retain, qos)
+                if qos == 1:
+                    pids.append(pid)
+            self._write(n)
+        except OSError:
+            self._drop_inflight(pids)
+            raise
+        if pids and not self.max_inflight:
+            self._wait_puback(pids)
+
+    # PUBACKs are matched in wait_msg, which drops the pid from the
+    # in-flight table.
+    def _wait_puback(self, pids):
+        for pid in pids:
+            while pid in self.inflight:
+                self.wait_msg()
+
+    # Block until one more QoS 1 packet fits into the in-flight window.
+    # Polls like flush(timeout_ms), so unacknowledged packets are resent
+    # meanwhile; raises OSError(ETIMEDOUT) after window_timeout_ms.
+    def _wait_window(self):
+        if not self.max_inflight or len(self.inflight) < self.max_inflight:
+            return
+        start = ticks_ms()
+        while len(self.inflight) >= self.max_inflight:
+            if ticks_diff(ticks_ms(), start) >= self.window_timeout_ms:
+                raise OSError(110)  # ETIMEDOUT
+            if self.check_msg() is None:
+                sleep_ms(10)
+
+    # Resend unacknowledged QoS 1 packets older than age_ms with DUP set.
+    def _resend(self, age_ms):
+        now = ticks_ms()
+        for entry in self.inflight.values():
+            if ticks_diff(now, entry[0]) >= age_ms:
+                pkt = entry[1]
+                pkt[0] |= 0x08
+                self.sock.write(pkt)
+                entry[0] = self.last_tx = now
+
+    def subscribe(self, topic, qos=0, handler=None):
+        if self.subscribe_many(((topic, qos, handler),))[0] == 0x80:
+            raise MQTTException(0x80)
+
+    # Subscribe to several filters with one SUBSCRIBE packet and wait for
+    # the single SUBACK. topics is a sequence of (topic, qos) or
+    # (topic, qos, handler) tuples. Returns the SUBACK return codes in the
+    # same order: the granted QoS, or 0x80 for each rejected filter.
+    # Rejected filters lose their handler and are not renewed by
+    # reconnect().
+    def subscribe_many(self, topics):
+        n, pid = self._pack_subscribe(topics)
+        self._write(n)
         while 1:
             op = self.wait_msg()
             if op == 0x90:
-                resp = self.sock.read(4)
-                #print(resp)
-                assert resp[1] == pkt[2] and resp[2] == pkt[3]
-                if resp[3] == 0x80:
-                    raise MQTTException(resp[3])
-                return
+                sz = self._recv_len()
+                self._readinto(self.hdrmv, 2)
+                assert self.hdr[0] << 8 | self.hdr[1] == pid
+                codes = self.sock.read(sz - 2)
+                #print(codes)
+                assert len(codes) == len(topics)
+                self._drop_rejected(topics, codes)
+                return codes
+
+    # Handlers are routed before SUBSCRIBE is sent, since the broker may
+    # deliver retained messages ahead of the SUBACK. Undo that for the
+    # filters the broker rejected.
+    def _drop_rejected(self, topics, codes):
+        for t, code in zip(topics, codes):
+            if code == 0x80:
+                self.subs.pop(t[0], None)
+                if len(t) > 2 and t[2] is not None:
+                    self.unroute(t[0])
+
+    # reconnect() has no caller to return the SUBACK codes to
+    def _report_rejected(self, topics, codes):
+        for t, code in zip(topics, codes):
+            if code == 0x80:
+                print("MQTT subscribe rejected:", t[0])
+
+    # Register handlers and remember the filters without sending SUBSCRIBE,
+    # for a session the broker kept (connect() returned session present).
+    # topics as for subscribe_many.
+    def resume(self, topics):
+        for t in topics:
+            if len(t) > 2 and t[2] is not None:
+                self.route(t[0], t[2])
+            self.subs[t[0]] = t
+
+    # Block until all in-flight QoS 1 packets are acknowledged, e.g.
+    # before closing the connection. With timeout_ms, poll (resending
+    # as check_msg does) and raise OSError(ETIMEDOUT) if packets are
+    # still unacknowledged after that time.
+    def flush(self, timeout_ms=0):
+        if not timeout_ms:
+            while self.inflight:
+                self.wait_msg()
+            return
+        start = ticks_ms()
+        while self.inflight:
+            if ticks_diff(ticks_ms(), start) >= timeout_ms:
+                raise OSError(110)  # ETIMEDOUT
+            if self.check_msg() is None:
+                sleep_ms(10)
+
+    # Register handlers, remember the filters and write the SUBSCRIBE
+    # packet to buf, return (length, pid)
+    def _pack_subscribe(self, topics):
+        sz = 2
+        for t in topics:
+            handler = t[2] if len(t) > 2 else None
+            if handler is not None:
+                self.route(t[0], handler)
+            assert self.cb is not None or handler is not None, "Subscribe callback is not set"
+            self.subs[t[0]] = t
+            sz += 2 + len(t[0]) + 1
+        buf = self._reserve(sz + 5)
+        pid = self._next_pid()
+        buf[0] = 0x82
+        i = self._put_len(1, sz)
+        struct.pack_into("!H", buf, i, pid)
+        i += 2
+        for t in topics:
+            i = self._put_str(i, t[0])
+            buf[i] = t[1]
+            i += 1
+        #print(hex(i), hexlify(self.mv[:i], ":"))
+        return i, pid
 
     # Wait for a single incoming MQTT message and process it.
-    # Subscribed messages are delivered to a callback previously
-    # set by .set_callback() method. Other (internal) MQTT
+    # Subscribed messages are delivered to the handler registered
+    # with .route() or to a callback previously set by the
+    # .set_callback() method. Other (internal) MQTT
     # messages processed internally.
     def wait_msg(self):
-        res = self.sock.read(1)
+        hdr = self.hdr
+        res = self.sock.readinto(hdr, 1)
         self.sock.setblocking(True)
         if res is None:
             return None
-        if res == b"":
+        if res == 0:
             raise OSError(-1)
-        if res == b"\xd0":  # PINGRESP
-            sz = self.sock.read(1)[0]
-            assert sz == 0
+        self.last_rx = ticks_ms()
+        op = hdr[0]
+        if op == 0xd0:  # PINGRESP
+            self._readinto(self.hdrmv, 1)
+            assert hdr[0] == 0
+            self._pingresp(self.last_rx)
             return None
-        op = res[0]
+        if op == 0x40:  # PUBACK
+            self._readinto(self.hdrmv, 3)
+            assert hdr[0] == 0x02
+            self.inflight.pop(hdr[1] << 8 | hdr[2], None)
+            return op
         if op & 0xf0 != 0x30:
             return op
         sz = self._recv_len()
-        topic_len = self.sock.read(2)
-        topic_len = (topic_len[0] << 8) | topic_len[1]
-        topic = self.sock.read(topic_len)
-        sz -= topic_len + 2
-        if op & 6:
-            pid = self.sock.read(2)
-            pid = pid[0] << 8 | pid[1]
-            sz -= 2
-        msg = self.sock.read(sz)
-        self.cb(topic, msg)
+        if sz > len(self.rxbuf):
+            self.rxbuf = bytearray(sz)
+            self.rxmv = memoryview(self.rxbuf)
+        self._readinto(self.rxmv, sz)
+        pid = self._handle_publish(op, self.rxbuf, self.rxmv, sz)
         if op & 6 == 2:
-            pkt = bytearray(b"\x40\x02\0\0")
-            struct.pack_into("!H", pkt, 2, pid)
-            self.sock.write(pkt)
+            struct.pack_into("!H", self.ackbuf, 2, pid)
+            self.sock.write(self.ackbuf)
+            self.last_tx = ticks_ms()
         elif op & 6 == 4:
             assert 0
 
+    # Dispatch a PUBLISH whose variable header and payload are in
+    # buf[:sz] (mv is a memoryview of buf), return its packet id
+    def _handle_publish(self, op, buf, mv, sz):
+        i = 2 + (buf[0] << 8 | buf[1])
+        topic = mv[2:i]
+        pid = 0
+        if op & 6:
+            pid = buf[i] << 8 | buf[i + 1]
+            i += 2
+        msg = mv[i:sz]
+        if self.zero_copy:
+            self._dispatch(topic, msg)
+        else:
+            self._dispatch(bytes(topic), bytes(msg))
+        return pid
+
     # Checks whether a pending message from server is available.
     # If not, returns immediately with None. Otherwise, does
-    # the same processing as wait_msg.
+    # the same processing as wait_msg. Also sends keepalive pings
+    # and resends unacknowledged QoS 1 packets when due.
     def check_msg(self):
+        if self._ping_due(ticks_ms()):
+            self.ping()
+        if self.inflight:
+            self._resend(self.retry_ms)
         self.sock.setblocking(False)
         return self.wait_msg()
@@ -0,0 +1,95 @@
+"""
+Decoder für das kompakte Binärformat der ESP-32 Messwerte
+
+Gegenstück zu CodeForESP-32/sensorframe.py (PAYLOAD_FORMAT = 'packed').
+Ein Payload kann einen einzelnen Frame oder beliebig viele aneinander-
+gehängte Frames enthalten (z.B. eine mitgeschnittene Datei); alle Frames
+werden in einem Durchlauf mit struct.iter_unpack entpackt.
+
+Beispiel:
+    from framedecoder import decode, decode_columns
+    readings = decode(msg.payload)
+    cols = decode_columns(open('mitschnitt.bin', 'rb').read())
+"""
+import struct
+from collections import namedtuple
+
+# Muss mit CodeForESP-32/sensorframe.py übereinstimmen. Frames der
+# Version 1 haben kein VALID_TIME, ihr Zeitstempel gilt immer.
+FRAME_VERSION = 2
+VERSIONS = (1, FRAME_VERSION)
+FRAME_FMT = '<BBHIhHHH'
+FRAME_SIZE = struct.calcsize(FRAME_FMT)
+
+VALID_TEMP = 0x01
+VALID_HUMI = 0x02
+VALID_DIST = 0x04
+VALID_MOIST = 0x08
+VALID_TIME = 0x10
+
+# MicroPython auf dem ESP-32 zählt Sekunden ab 2000-01-01
+EPOCH_OFFSET = 946684800
+
+FIELDS = ('seq', 'ts', 'temp', 'humi', 'dist', 'moist')
+
+Reading = namedtuple('Reading', FIELDS)
+Reading.__doc__ = """
+Ein dekodierter Messzyklus. ts ist ein Unix-Zeitstempel (None, wenn die
+Uhr des ESP-32 nicht gestellt war), temp in °C, humi in %, dist in cm,
+moist als roher ADC-Wert; ungültige Werte sind None.
+"""
+
+def _unpack(payload):
+    """
+    Entpackt alle Frames und prüft Länge und Version
+    Returns: Liste der Roh-Tupel aus struct.iter_unpack
+    """
+    if len(payload) % FRAME_SIZE:
+        raise ValueError('Payload-Länge {} ist kein Vielfaches von {}'.format(
+            len(payload), FRAME_SIZE))
+    rows = list(struct.iter_unpack(FRAME_FMT, payload))
+    for row in rows:
+        if row[0] not in VERSIONS:
+            raise ValueError('Unbekannte Frame-Version {}'.format(row[0]))
+    return rows
+
+def decode(payload):
+    """
+    Dekodiert einen oder mehrere Frames
+    Args:
+        payload: bytes/bytearray/memoryview mit n * FRAME_SIZE Bytes
+    Returns: Liste von Reading
+    """
+    out = []
+    for version, valid, seq, ts, t, h, d, m in _unpack(payload):
+        out.append(Reading(
+            seq,
+            ts + EPOCH_OFFSET if version == 1 or valid & VALID_TIME else None,
+            t / 10 if valid & VALID_TEMP else None,
+            h / 10 if valid & VALID_HUMI else None,
+            d / 10 if valid & VALID_DIST else None,
+            m if valid & VALID_MOIST else None,
+        ))
+    return out
+
+def decode_columns(payload):
+    """
+    Dekodiert viele Frames spaltenweise, für große Mitschnitte schneller
+    als decode(), da pro Spalte nur eine List-Comprehension läuft
+    Args:
+        payload: bytes/bytearray/memoryview mit n * FRAME_SIZE Bytes
+    Returns: Dictionary Feldname -> Liste (Länge n), ungültige Werte sind None
+    """
+    rows = _unpack(payload)
+    if not rows:
+        return {name: [] for name in FIELDS}
+    version, valid, seq, ts, t, h, d, m = zip(*rows)
+    return {
+        'seq': list(seq),
+        'ts': [x + EPOCH_OFFSET if r == 1 or v & VALID_TIME else None
+               for x, v, r in zip(ts, valid, version)],
+        'temp': [x / 10 if v & VALID_TEMP else None for x, v in zip(t, valid)],
+        'humi': [x / 10 if v & VALID_HUMI else None for x, v in zip(h, valid)],
+        'dist': [x / 10 if v & VALID_DIST else None for x, v in zip(d, valid)],
+        'moist': [x if v & VALID_MOIST else None for x, v in zip(m, valid)],
+    }
@@ -0,0 +1,338 @@
+"""
+Ingest-Dienst für die Sensordaten des ESP-32
+
+Läuft auf dem Raspberry Pi (CPython + NumPy) und verwendet denselben
+MQTT Client (umqttsimple) und dieselbe Konfiguration (mysettings.py) wie
+der ESP-32. Alle Sensor-Topics werden mit einem Abo (INGEST_TOPIC)
+empfangen und ohne Node-RED Funktionsknoten dekodiert:
+
+- Text-Nachrichten "temp:23.5 @<ts>", "humi:41.0 @<ts>",
+  "distance:12.3 cm @<ts>", "moist:1789 @<ts>" sowie die ERROR_MSG_*
+  Platzhalter (werden als NaN abgelegt)
+- Binär-Frames auf PACKED_TOPIC (siehe framedecoder.py)
+- Rückstau-Blöcke auf BACKLOG_TOPIC ("ts;temp;humi;dist;moist" pro Zeile)
+
+Die Zeit jedes Werts ist immer der Zeitstempel des ESP-32, nie die
+Empfangszeit: mit der persistenten Session liefert der Broker nach einem
+Neustart des Dienstes viele Nachrichten auf einmal aus. Werte ohne
+Zeitstempel (Uhr des ESP-32 nicht gestellt) oder außerhalb des Fensters
+INGEST_MAX_AGE / INGEST_MAX_CLOCK_SKEW um die eigene Uhr werden verworfen.
+
+Die Werte landen pro Gerät und Messreihe in NumPy-Spaltenpuffern und
+werden gesammelt an eine Senke übergeben, sobald ein Puffer voll ist
+(INGEST_BATCH_SIZE) oder spätestens alle INGEST_FLUSH_INTERVAL Sekunden.
+Standard-Senke ist der Zeitreihen-Speicher tsstore.TimeSeriesStore.
+
+Aufruf:
+    python3 ingest.py [Zielverzeichnis]
+"""
+import os
+import select
+import sys
+import time
+
+import numpy as np
+
+# umqttsimple.py und mysettings.py liegen im Code-Verzeichnis des ESP-32
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'CodeForESP-32'))
+
+from umqttsimple import MQTTClient
+from framedecoder import EPOCH_OFFSET, decode_columns
+from sensorframe import STAMP
+from tsstore import TimeSeriesStore
+
+from mysettings import (
+    # MQTT Konfiguration
+    MQTT_SERVER,
+    MQTT_PORT,
+    MQTT_KEEPALIVE,
+
+    # Topics
+    TEMP_TOPIC,
+    HUMI_TOPIC,
+    DIST_TOPIC,
+    MOIST_TOPIC,
+    PACKED_TOPIC,
+    BACKLOG_TOPIC,
+
+    # Fehler-Nachrichten
+    ERROR_MSG_TEMP,
+    ERROR_MSG_HUMI,
+    ERROR_MSG_DIST,
+    ERROR_MSG_MOIST,
+
+    # Ingest
+    INGEST_CLIENT_ID,
+    INGEST_TOPIC,
+    INGEST_BATCH_SIZE,
+    INGEST_FLUSH_INTERVAL,
+    INGEST_DATA_DIR,
+    INGEST_MAX_CLOCK_SKEW,
+    INGEST_MAX_AGE,
+)
+
+SERIES = ('temp', 'humi', 'dist', 'moist')
+
+# Topic -> (Messreihe, Präfix, Suffix, Fehler-Nachricht) der Text-Nachrichten
+TEXT_TOPICS = {
+    TEMP_TOPIC: ('temp', b'temp:', b'', ERROR_MSG_TEMP),
+    HUMI_TOPIC: ('humi', b'humi:', b'', ERROR_MSG_HUMI),
+    DIST_TOPIC: ('dist', b'distance:', b' cm', ERROR_MSG_DIST),
+    MOIST_TOPIC: ('moist', b'moist:', b'', ERROR_MSG_MOIST),
+}
+
+NAN = float('nan')
+
+def device_of(topic):
+    """
+    Returns: Gerätename = Topic ohne letzte Ebene (z.B. 'DLN/test')
+    """
+    return topic[:topic.rfind(b'/')].decode()
+
+def parse_text(msg, prefix, suffix, error_msg):
+    """
+    Dekodiert eine Text-Nachricht wie b'distance:12.3 cm @800000000'
+    Returns: (Unix-Zeit oder None ohne Zeitstempel, Messwert als float),
+    NaN für den Fehler-Platzhalter
+    Raises: ValueError bei unbekanntem Format
+    """
+    body, sep, stamp = msg.rpartition(STAMP)
+    if sep:
+        ts = int(stamp) + EPOCH_OFFSET
+    else:
+        body, ts = msg, None
+    if body == error_msg:
+        return ts, NAN
+    if not body.startswith(prefix) or not body.endswith(suffix):
+        raise ValueError(msg)
+    return ts, float(body[len(prefix):len(body) - len(suffix)])
+
+def parse_backlog(msg):
+    """
+    Dekodiert einen Rückstau-Block aus offlinebuffer.OfflineBuffer
+    Returns: (Zeitstempel, [temp, humi, dist, moist]) als NumPy-Arrays, leere Felder als NaN
+    """
+    rows = [line.split(b';') for line in msg.split(b'\n') if line]
+    ts = np.array([int(row[0]) for row in rows], np.float64) + EPOCH_OFFSET
+    columns = [np.array([float(row[k]) if row[k] else NAN for row in rows], np.float32)
+               for k in range(1, len(SERIES) + 1)]
+    return ts, columns
+
+class ColumnBuffer:
+    """
+    Vorab angelegte Spalten (Zeitstempel, Wert) einer Messreihe
+    """
+    def __init__(self, capacity):
+        self.ts = np.empty(capacity, np.float64)
+        self.values = np.empty(capacity, np.float32)
+        self.n = 0
+
+    def space(self):
+        return len(self.ts) - self.n
+
+class Ingest:
+    """
+    Sammelt dekodierte Messwerte und übergibt sie blockweise an sink
+
+    sink(device, series, ts, values) erhält NumPy-Arrays (Unix-Zeit in
+    Sekunden als float64, Werte als float32). Die Arrays sind Sichten auf
+    die Puffer und nur während des Aufrufs gültig.
+    """
+    def __init__(self, sink, batch_size=INGEST_BATCH_SIZE, flush_interval=INGEST_FLUSH_INTERVAL,
+                 max_age=INGEST_MAX_AGE, max_skew=INGEST_MAX_CLOCK_SKEW):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self.max_skew = max_skew
+        self.buffers = {}
+        self.last_flush = time.monotonic()
+        self.received = 0
+        # Nachrichten mit unbekanntem Format
+        self.rejected = 0
+        # Werte ohne Zeitstempel oder mit Zeit außerhalb des Fensters
+        self.dropped = 0
+
+    def _buffer(self, device, series):
+        key = (device, series)
+        buf = self.buffers.get(key)
+        if buf is None:
+            buf = self.buffers[key] = ColumnBuffer(self.batch_size)
+        return buf
+
+    def _flush_buffer(self, key, buf):
+        if buf.n:
+            self.sink(key[0], key[1], buf.ts[:buf.n], buf.values[:buf.n])
+            buf.n = 0
+
+    def add(self, device, series, ts, value):
+        """
+        Hängt einen einzelnen Wert an, ein voller Puffer wird sofort geschrieben
+        """
+        buf = self._buffer(device, series)
+        buf.ts[buf.n] = ts
+        buf.values[buf.n] = value
+        buf.n += 1
+        if buf.n == len(buf.ts):
+            self._flush_buffer((device, series), buf)
+
+    def add_many(self, device, series, ts, values):
+        """
+        Hängt Arrays von Werten an (Binär-Frames, Rückstau)
+        """
+        buf = self._buffer(device, series)
+        i = 0
+        while i < len(ts):
+            k = min(buf.space(), len(ts) - i)
+            buf.ts[buf.n:buf.n + k] = ts[i:i + k]
+            buf.values[buf.n:buf.n + k] = values[i:i + k]
+            buf.n += k
+            i += k
+            if not buf.space():
+                self._flush_buffer((device, series), buf)
+
+    def flush(self):
+        """
+        Schreibt alle Puffer an die Senke
+        """
+        for key, buf in self.buffers.items():
+            self._flush_buffer(key, buf)
+        self.last_flush = time.monotonic()
+
+    def in_window(self, ts):
+        """
+        Args:
+            ts: Unix-Zeit (float oder NumPy-Array, NaN = ohne Zeitstempel)
+        Returns: True bzw. Maske für Zeiten zwischen jetzt - max_age und
+        jetzt + max_skew
+        """
+        now = time.time()
+        return (ts >= now - self.max_age) & (ts <= now + self.max_skew)
+
+    def time_to_flush(self):
+        """
+        Returns: Sekunden bis zum nächsten zeitgesteuerten Schreiben
+        """
+        return max(self.last_flush + self.flush_interval - time.monotonic(), 0)
+
+    # ===== MQTT Handler =====
+
+    def on_text(self, topic, msg):
+        self.received += 1
+        series, prefix, suffix, error_msg = TEXT_TOPICS[topic]
+        try:
+            ts, value = parse_text(msg, prefix, suffix, error_msg)
+        except ValueError:
+            self.rejected += 1
+            return
+        if ts is None or not self.in_window(ts):
+            self.dropped += 1
+            return
+        self.add(device_of(topic), series, ts, value)
+
+    def on_packed(self, topic, msg):
+        self.received += 1
+        try:
+            cols = decode_columns(msg)
+        except ValueError:
+            self.rejected += 1
+            return
+        # Frames ohne gestellte Uhr auf dem ESP-32 haben keine Zeit
+        ts = np.array([NAN if t is None else t for t in cols['ts']], np.float64)
+        keep = self.in_window(ts)
+        n = int(keep.sum())
+        self.dropped += len(ts) - n
+        if not n:
+            return
+        device = device_of(topic)
+        ts = ts[keep]
+        for series in SERIES:
+            values = np.array([NAN if v is None else v for v in cols[series]], np.float32)
+            self.add_many(device, series, ts, values[keep])
+
+    def on_backlog(self, topic, msg):
+        self.received += 1
+        try:
+            ts, columns = parse_backlog(msg)
+        except (ValueError, IndexError):
+            self.rejected += 1
+            return
+        keep = self.in_window(ts)
+        n = int(keep.sum())
+        self.dropped += len(ts) - n
+        if not n:
+            return
+        device = device_of(topic)
+        for series, values in zip(SERIES, columns):
+            self.add_many(device, series, ts[keep], values[keep])
+
+    def on_other(self, topic, msg):
+        # Aktor-, Status- und sonstige Topics unter INGEST_TOPIC
+        pass
+
+def create_client(ingest):
+    """
+    Erzeugt den MQTT Client und leitet die Sensor-Topics an ingest weiter
+    Returns: MQTT Client Objekt (noch nicht verbunden)
+    """
+    client = MQTTClient(
+        client_id=INGEST_CLIENT_ID,
+        server=MQTT_SERVER,
+        port=MQTT_PORT,
+        keepalive=MQTT_KEEPALIVE,
+        rx_size=4096
+    )
+    for topic in TEXT_TOPICS:
+        client.route(topic, ingest.on_text)
+    client.route(PACKED_TOPIC, ingest.on_packed)
+    client.route(BACKLOG_TOPIC, ingest.on_backlog)
+    client.set_callback(ingest.on_other)
+    return client
+
+def run(client, ingest):
+    """
+    Empfangsschleife: wartet mit select() auf Daten oder den nächsten
+    Schreibzeitpunkt, bei Verbindungsfehlern wird neu verbunden
+    """
+    last_report = time.monotonic()
+    last_count = 0
+    while True:
+        try:
+            sock = client.sock
+            if not sock.pending():
+                select.select((sock,), (), (), min(ingest.time_to_flush(), 1.0))
+            client.check_msg()
+
+        except OSError as e:
+            print('MQTT Verbindungsfehler:', e)
+            ingest.flush()
+            client.reconnect()
+            print('MQTT Verbindung wiederhergestellt')
+
+        if not ingest.time_to_flush():
+            ingest.flush()
+            now = time.monotonic()
+            print('{} Nachrichten ({:.0f}/s), {} verworfen, {} Werte ohne gültige Zeit'.format(
+                ingest.received, (ingest.received - last_count) / (now - last_report),
+                ingest.rejected, ingest.dropped))
+            last_report = now
+            last_count = ingest.received
+
+def main(directory=INGEST_DATA_DIR):
+    ingest = Ingest(TimeSeriesStore(directory))
+    client = create_client(ingest)
+
+    # Persistente Session: der Broker puffert QoS-1 Nachrichten, solange der Dienst nicht läuft
+    client.connect(clean_session=False)
+    client.subscribe(INGEST_TOPIC, qos=1)
+    print('Ingest verbunden mit {}, abonniert: {}'.format(MQTT_SERVER, INGEST_TOPIC.decode()))
+
+    try:
+        run(client, ingest)
+    except KeyboardInterrupt:
+        print('\nIngest beendet')
+    finally:
+        ingest.flush()
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
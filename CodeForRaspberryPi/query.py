@@ -0,0 +1,268 @@
+"""
+HTTP-Abfrage-Dienst für die Dashboard-Diagramme
+
+Liefert eine Messreihe aus dem Zeitreihen-Speicher (tsstore.py), auf die
+gewünschte Punktzahl reduziert mit Largest-Triangle-Three-Buckets (LTTB).
+Als Quelle wird der gröbste Rollup gewählt, der im Zeitraum noch
+mindestens so viele Intervalle wie Punkte hat, nur kurze Zeiträume
+werden aus den Rohdaten gelesen. Ergebnisse liegen in einem LRU-Cache,
+der Schlüssel enthält die Version der Messreihe (TimeSeriesStore.version),
+neue Daten machen alte Einträge also automatisch ungültig.
+
+Aufruf:
+    python3 query.py [Datenverzeichnis]
+
+Abfragen:
+    GET /series?series=Temperatur&last=30d&points=800
+    GET /series?device=DLN/test&series=temp&start=1700000000&end=1700086400
+    GET /                                   (Geräte und Messreihen)
+
+Antwort: {"device", "series", "source", "data": [{"x": ms, "y": wert}, ...]},
+data kann direkt in ein Node-RED ui_chart übernommen werden.
+"""
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'CodeForESP-32'))
+
+from tsstore import ROLLUPS, TimeSeriesStore
+
+from mysettings import (
+    INGEST_DATA_DIR,
+    QUERY_PORT,
+    QUERY_CACHE_SIZE,
+    QUERY_MAX_POINTS,
+)
+
+DEFAULT_DEVICE = 'DLN/test'
+DEFAULT_POINTS = 800
+
+# Namen der Dashboard-Diagramme -> Messreihe im Speicher
+SERIES_ALIASES = {
+    'Temperatur': 'temp',
+    'Luftfeuchtigkeit': 'humi',
+    'Distanz': 'dist',
+    'Bodenfeuchtigkeit': 'moist',
+}
+
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_duration(text):
+    """
+    Wandelt '30d', '12h', '90m' oder Sekunden in Sekunden um
+    """
+    if text[-1:] in UNITS:
+        return float(text[:-1]) * UNITS[text[-1]]
+    return float(text)
+
+def parse_finite(text, parse=float):
+    """
+    Returns: parse(text) als endliche Zahl
+    Raises: ValueError bei ungültigen Werten (auch nan/inf)
+    """
+    value = parse(text)
+    if not math.isfinite(value):
+        raise ValueError(text)
+    return value
+
+def lttb(x, y, n):
+    """
+    Reduziert eine Kurve mit Largest-Triangle-Three-Buckets auf n Punkte.
+    Erster und letzter Punkt bleiben erhalten, aus jedem Intervall
+    dazwischen wird der Punkt gewählt, der mit dem zuletzt gewählten Punkt
+    und dem Mittelwert des nächsten Intervalls das größte Dreieck bildet.
+    Args:
+        x, y: NumPy-Arrays gleicher Länge, x aufsteigend
+        n: Gewünschte Punktzahl
+    Returns: (x, y) mit höchstens n Punkten
+    """
+    size = len(x)
+    if n >= size or n < 3:
+        return x, y
+    edges = (np.arange(n - 1) * ((size - 2) / (n - 2))).astype(np.int64) + 1
+    edges[-1] = size - 1
+    picked = np.empty(n, np.int64)
+    picked[0] = 0
+    picked[-1] = size - 1
+    a = 0
+    for i in range(n - 2):
+        lo = edges[i]
+        hi = edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[hi:edges[i + 2]].mean()
+            next_y = y[hi:edges[i + 2]].mean()
+        else:
+            next_x = x[-1]
+            next_y = y[-1]
+        ax = x[a]
+        ay = y[a]
+        area = np.abs((ax - next_x) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y - ay))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return x[picked], y[picked]
+
+class LRUCache:
+    """
+    Einfacher LRU-Cache mit fester Größe, threadsicher
+    """
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+class QueryService:
+    """
+    Beantwortet Abfragen auf einen TimeSeriesStore
+    """
+    def __init__(self, store, cache_size=QUERY_CACHE_SIZE):
+        self.store = store
+        self.cache = LRUCache(cache_size)
+
+    def choose_source(self, start, end, points):
+        """
+        Returns: Name des gröbsten Rollups mit mindestens points Intervallen
+        im Zeitraum, None für Rohdaten
+        """
+        for name, width in reversed(ROLLUPS):
+            if (end - start) / width >= points:
+                return name
+        return None
+
+    def load(self, device, series, start, end, points):
+        """
+        Liest und reduziert eine Messreihe
+        Returns: (Quelle, ts, values) mit höchstens points Werten
+        """
+        source = self.choose_source(start, end, points)
+        if source is None:
+            ts, values = self.store.read(device, series, start, end)
+            ok = ~np.isnan(values)
+            ts = ts[ok]
+            values = values[ok].astype(np.float64)
+        else:
+            rec = self.store.read_rollup(device, series, source, start, end)
+            ts = rec['ts']
+            values = rec['sum'] / rec['n']
+        ts, values = lttb(ts, values, points)
+        return source or 'raw', ts, values
+
+    def query(self, device, series, start, end, points):
+        """
+        Returns: JSON-Antwort als Bytes (aus dem Cache, falls vorhanden)
+        """
+        key = (device, series, start, end, points, self.store.version(device, series))
+        body = self.cache.get(key)
+        if body is None:
+            source, ts, values = self.load(device, series, start, end, points)
+            body = json.dumps({
+                'device': device,
+                'series': series,
+                'source': source,
+                'data': [{'x': int(t * 1000), 'y': round(float(v), 2)}
+                         for t, v in zip(ts, values)],
+            }, separators=(',', ':')).encode()
+            self.cache.put(key, body)
+        return body
+
+    def handle(self, path, args):
+        """
+        Wertet eine HTTP-Anfrage aus
+        Returns: JSON-Antwort als Bytes
+        Raises: ValueError/KeyError bei ungültigen Parametern
+        """
+        if path == '/':
+            return json.dumps({device: self.store.series(device)
+                               for device in self.store.devices()}).encode()
+        if path != '/series':
+            raise KeyError(path)
+
+        device = args.get('device', DEFAULT_DEVICE)
+        if 'series' not in args:
+            raise ValueError('series fehlt')
+        series = SERIES_ALIASES.get(args['series'], args['series'])
+        if series not in self.store.series(device):
+            raise KeyError(series)
+        # lttb behält immer den ersten und letzten Punkt, darunter
+        # würden die Rohdaten ungekürzt ausgeliefert
+        points = max(min(int(args.get('points', DEFAULT_POINTS)), QUERY_MAX_POINTS), 3)
+        if 'last' in args:
+            span = parse_finite(args['last'], parse_duration)
+            if span <= 0:
+                raise ValueError(args['last'])
+            # Ende auf die Punktbreite runden, damit wiederholte Abfragen
+            # des Dashboards den Cache treffen
+            step = max(span / points, 1)
+            end = (time.time() // step + 1) * step
+            start = end - span
+        else:
+            if 'start' not in args:
+                raise ValueError('start oder last fehlt')
+            start = parse_finite(args['start'])
+            end = parse_finite(args['end']) if 'end' in args else time.time()
+        return self.query(device, series, start, end, points)
+
+class QueryHandler(BaseHTTPRequestHandler):
+
+    service = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        args = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            body = self.service.handle(url.path, args)
+            status = 200
+        except KeyError as e:
+            body = json.dumps({'error': 'nicht gefunden: {}'.format(e)}).encode()
+            status = 404
+        except ValueError as e:
+            body = json.dumps({'error': 'ungültiger Parameter: {}'.format(e)}).encode()
+            status = 400
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main(directory=INGEST_DATA_DIR, port=QUERY_PORT):
+    QueryHandler.service = QueryService(TimeSeriesStore(directory))
+    server = ThreadingHTTPServer(('', port), QueryHandler)
+    print('Abfrage-Dienst auf Port {}, Daten aus {}'.format(port, directory))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('\nAbfrage-Dienst beendet')
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
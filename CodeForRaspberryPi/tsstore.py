@@ -0,0 +1,298 @@
+"""
+Spaltenorientierter Zeitreihen-Speicher für die Sensordaten
+
+Aufbau auf der Platte (alles Little Endian, feste Satzlänge):
+
+    <root>/<gerät>/<reihe>/<YYYY-MM-DD>.ts   float64  Unix-Zeit in Sekunden
+    <root>/<gerät>/<reihe>/<YYYY-MM-DD>.val  float32  Messwert (NaN = Sensorfehler)
+    <root>/<gerät>/<reihe>/rollup.1m|1h|1d   ROLLUP_DTYPE (Beginn, n, min, max, summe)
+
+Rohdaten werden nur angehängt und sind pro Tag (UTC) nach Zeit sortiert.
+Die Rollups werden beim Anhängen fortgeschrieben, NaN-Werte zählen
+nicht mit. Abfragen öffnen die Dateien per np.memmap und suchen den
+Bereich binär (searchsorted), gelesen werden also nur die Seiten, die
+im abgefragten Zeitraum liegen. Ein lesender Prozess (z.B. query.py)
+kann parallel zum schreibenden Ingest-Dienst laufen.
+"""
+import os
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+TS_DTYPE = np.dtype('<f8')
+VALUE_DTYPE = np.dtype('<f4')
+ROLLUP_DTYPE = np.dtype([
+    ('ts', '<f8'),    # Beginn des Intervalls (Unix-Zeit)
+    ('n', '<u4'),     # Anzahl gültiger Werte
+    ('min', '<f4'),
+    ('max', '<f4'),
+    ('sum', '<f8'),   # mean = sum / n
+])
+
+# Name und Breite (Sekunden) der vorberechneten Rollups
+ROLLUPS = (('1m', 60), ('1h', 3600), ('1d', 86400))
+
+DAY = 86400
+
+def _count(path, dtype):
+    """
+    Returns: Anzahl vollständiger Sätze in einer Spaltendatei (0 wenn sie fehlt)
+    """
+    try:
+        return os.path.getsize(path) // dtype.itemsize
+    except OSError:
+        return 0
+
+def _truncate(path, n, dtype):
+    """
+    Kürzt eine Spaltendatei auf n Sätze, falls sie länger ist
+    """
+    try:
+        if os.path.getsize(path) > n * dtype.itemsize:
+            os.truncate(path, n * dtype.itemsize)
+    except OSError:
+        pass
+
+def _map(path, dtype):
+    """
+    Öffnet eine Spaltendatei lesend per memmap
+    Returns: Array (leer wenn die Datei fehlt), ein unvollständiger
+    letzter Satz wird ignoriert
+    """
+    n = _count(path, dtype)
+    if not n:
+        return np.empty(0, dtype)
+    return np.memmap(path, dtype, 'r', shape=(n,))
+
+def _replace(path, data):
+    """
+    Schreibt eine Datei vollständig neu, Leser sehen alt oder neu
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data.tobytes())
+    os.replace(tmp, path)
+
+def _append(path, data):
+    with open(path, 'ab') as f:
+        f.write(data.tobytes())
+
+def _combine(rec):
+    """
+    Fasst nach ts sortierte Rollup-Sätze mit gleichem Beginn zusammen
+    """
+    starts = np.flatnonzero(np.r_[True, rec['ts'][1:] != rec['ts'][:-1]])
+    if len(starts) == len(rec):
+        return rec
+    out = np.empty(len(starts), ROLLUP_DTYPE)
+    out['ts'] = rec['ts'][starts]
+    out['n'] = np.add.reduceat(rec['n'], starts)
+    out['min'] = np.minimum.reduceat(rec['min'], starts)
+    out['max'] = np.maximum.reduceat(rec['max'], starts)
+    out['sum'] = np.add.reduceat(rec['sum'], starts)
+    return out
+
+def aggregate(ts, values, width):
+    """
+    Berechnet Rollup-Sätze für nach Zeit sortierte Rohdaten
+    Args:
+        ts: Zeitstempel (float64, sortiert)
+        values: Messwerte (NaN wird übersprungen)
+        width: Intervallbreite in Sekunden
+    Returns: Array mit ROLLUP_DTYPE, ein Satz pro belegtem Intervall
+    """
+    ok = ~np.isnan(values)
+    ts = ts[ok]
+    values = values[ok]
+    if not len(ts):
+        return np.empty(0, ROLLUP_DTYPE)
+    bucket = np.floor(ts / width) * width
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    rec = np.empty(len(starts), ROLLUP_DTYPE)
+    rec['ts'] = bucket[starts]
+    rec['n'] = np.diff(np.r_[starts, len(ts)])
+    rec['min'] = np.minimum.reduceat(values, starts)
+    rec['max'] = np.maximum.reduceat(values, starts)
+    rec['sum'] = np.add.reduceat(values.astype(np.float64), starts)
+    return rec
+
+class TimeSeriesStore:
+    """
+    Speicher für die Messreihen aller Geräte unterhalb von root.
+    Kann direkt als Senke für ingest.Ingest verwendet werden.
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def _dir(self, device, series):
+        return os.path.join(self.root, quote(device, safe=''), series)
+
+    # ===== Schreiben =====
+
+    def __call__(self, device, series, ts, values):
+        self.append(device, series, ts, values)
+
+    def append(self, device, series, ts, values):
+        """
+        Hängt Messwerte an und schreibt die Rollups fort
+        Args:
+            device: Gerätename (z.B. 'DLN/test')
+            series: Messreihe ('temp', 'humi', 'dist', 'moist')
+            ts: Unix-Zeitstempel in Sekunden
+            values: Messwerte, NaN für ungültige Werte
+        """
+        ts = np.asarray(ts, TS_DTYPE)
+        values = np.asarray(values, VALUE_DTYPE)
+        if not len(ts):
+            return
+        if np.any(ts[1:] < ts[:-1]):
+            order = np.argsort(ts, kind='stable')
+            ts = ts[order]
+            values = values[order]
+
+        path = self._dir(device, series)
+        os.makedirs(path, exist_ok=True)
+
+        # Rohdaten tageweise aufteilen
+        days = np.floor(ts / DAY).astype(np.int64)
+        cuts = np.flatnonzero(days[1:] != days[:-1]) + 1
+        for i, j in zip(np.r_[0, cuts], np.r_[cuts, len(ts)]):
+            self._append_day(path, int(days[i]), ts[i:j], values[i:j])
+
+        for name, width in ROLLUPS:
+            rec = aggregate(ts, values, width)
+            if len(rec):
+                self._merge_rollup(os.path.join(path, 'rollup.' + name), rec)
+
+        # Änderungszeit des Verzeichnisses dient Lesern als Versionsnummer
+        os.utime(path)
+
+    def _day_paths(self, path, day):
+        name = np.datetime_as_string(np.datetime64(day, 'D'))
+        base = os.path.join(path, name)
+        return base + '.ts', base + '.val'
+
+    def _append_day(self, path, day, ts, values):
+        ts_path, val_path = self._day_paths(path, day)
+        # Ein Abbruch zwischen den beiden _append hinterlässt eine längere
+        # Spalte oder einen halben Satz: beide auf die gemeinsame Länge
+        # kürzen, sonst gehören ab hier Zeit und Wert nicht mehr zusammen
+        n = min(_count(ts_path, TS_DTYPE), _count(val_path, VALUE_DTYPE))
+        _truncate(ts_path, n, TS_DTYPE)
+        _truncate(val_path, n, VALUE_DTYPE)
+        old_ts = _map(ts_path, TS_DTYPE)
+        if len(old_ts) and ts[0] < old_ts[-1]:
+            # Verspätete Werte (z.B. Rückstau aus dem Offline-Puffer):
+            # Tagesdatei sortiert neu schreiben, kommt selten vor
+            old_values = _map(val_path, VALUE_DTYPE)
+            all_ts = np.concatenate((old_ts, ts))
+            all_values = np.concatenate((old_values, values))
+            order = np.argsort(all_ts, kind='stable')
+            del old_ts, old_values
+            _replace(ts_path, all_ts[order])
+            _replace(val_path, all_values[order])
+        else:
+            # Normalfall: nur anhängen. Zeitstempel zuerst, Leser
+            # verwenden die kürzere der beiden Spalten.
+            _append(ts_path, ts)
+            _append(val_path, values)
+
+    def _merge_rollup(self, path, rec):
+        old = _map(path, ROLLUP_DTYPE)
+        if not len(old) or rec['ts'][0] >= old['ts'][-1]:
+            if len(old) and rec['ts'][0] == old['ts'][-1]:
+                # Letztes Intervall ist noch offen: an Ort und Stelle ergänzen
+                last = _combine(np.concatenate((old[-1:], rec[:1])))
+                del old
+                with open(path, 'r+b') as f:
+                    f.seek(-ROLLUP_DTYPE.itemsize, 2)
+                    f.write(last.tobytes())
+                rec = rec[1:]
+            _append(path, rec)
+        else:
+            merged = np.concatenate((old, rec))
+            del old
+            merged = _combine(merged[np.argsort(merged['ts'], kind='stable')])
+            _replace(path, merged)
+
+    # ===== Lesen =====
+
+    def devices(self):
+        """
+        Returns: Liste der gespeicherten Geräte
+        """
+        try:
+            return sorted(unquote(d) for d in os.listdir(self.root))
+        except OSError:
+            return []
+
+    def series(self, device):
+        """
+        Returns: Liste der Messreihen eines Geräts
+        """
+        try:
+            return sorted(os.listdir(os.path.join(self.root, quote(device, safe=''))))
+        except OSError:
+            return []
+
+    def version(self, device, series):
+        """
+        Returns: Kennung, die sich bei jedem append() der Messreihe ändert
+        (auch über Prozessgrenzen hinweg), None wenn die Reihe fehlt
+        """
+        try:
+            return os.stat(self._dir(device, series)).st_mtime_ns
+        except OSError:
+            return None
+
+    def read(self, device, series, start, end):
+        """
+        Liest Rohdaten im Zeitraum [start, end)
+        Args:
+            start, end: Unix-Zeit in Sekunden
+        Returns: (ts, values) als NumPy-Arrays
+        """
+        path = self._dir(device, series)
+        first = np.datetime64(int(start // DAY), 'D')
+        last = np.datetime64(int(np.ceil(end / DAY)), 'D')
+        try:
+            names = os.listdir(path)
+        except OSError:
+            names = ()
+        # Nur vorhandene Tagesdateien im Zeitraum öffnen
+        days = sorted(np.datetime64(name[:-3], 'D') for name in names if name.endswith('.ts'))
+        ts_parts = []
+        value_parts = []
+        for day in days:
+            if day < first or day >= last:
+                continue
+            ts_path, val_path = self._day_paths(path, day)
+            ts = _map(ts_path, TS_DTYPE)
+            values = _map(val_path, VALUE_DTYPE)
+            n = min(len(ts), len(values))
+            if not n:
+                continue
+            ts = ts[:n]
+            i = np.searchsorted(ts, start, 'left')
+            j = np.searchsorted(ts, end, 'left')
+            if i < j:
+                ts_parts.append(np.array(ts[i:j]))
+                value_parts.append(np.array(values[i:j]))
+        if not ts_parts:
+            return np.empty(0, TS_DTYPE), np.empty(0, VALUE_DTYPE)
+        return np.concatenate(ts_parts), np.concatenate(value_parts)
+
+    def read_rollup(self, device, series, name, start, end):
+        """
+        Liest vorberechnete Rollups, deren Intervall in [start, end) beginnt
+        Args:
+            name: '1m', '1h' oder '1d' (siehe ROLLUPS)
+        Returns: Array mit ROLLUP_DTYPE
+        """
+        rec = _map(os.path.join(self._dir(device, series), 'rollup.' + name), ROLLUP_DTYPE)
+        if not len(rec):
+            return rec
+        starts = rec['ts']
+        i = np.searchsorted(starts, start, 'left')
+        j = np.searchsorted(starts, end, 'left')
+        return np.array(rec[i:j])